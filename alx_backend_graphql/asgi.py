@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql.settings')
+# serve /graphql with the async view (see GRAPHENE["ASYNC_VIEW"])
+os.environ.setdefault('GRAPHQL_ASYNC_VIEW', '1')
 
 application = get_asgi_application()
@@ -53,7 +53,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'alx_backend_graphql_crm.urls'
+ROOT_URLCONF = 'alx_backend_graphql.urls'
 
 TEMPLATES = [
     {
@@ -71,24 +71,95 @@ TEMPLATES = [
     },
 ]
 
-WSGI_APPLICATION = 'alx_backend_graphql_crm.wsgi.application'
+WSGI_APPLICATION = 'alx_backend_graphql.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.getenv('POSTGRES_DB', 'crm_db'),
-        'USER': os.getenv('POSTGRES_USER', 'crm_user'),
-        'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'crm_pass'),
-        'HOST': 'db',
-        'PORT': 5432,
+# Connections are kept open for CONN_MAX_AGE seconds and checked before
+# reuse. Django 4.2 has no driver-level pool; behind PgBouncer in
+# transaction mode set POSTGRES_PGBOUNCER=1, which disables server-side
+# cursors. GraphQL queries and reporting reads use the "replica" alias when
+# POSTGRES_REPLICA_HOST is set (see crm/routers.py).
+# CRM_DATABASE=sqlite runs on two SQLite files standing in for primary and
+# replica; `python manage.py sync_sqlite_replica` copies one onto the other.
+
+if os.getenv('CRM_DATABASE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        },
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db_replica.sqlite3',
+            'TEST': {'MIRROR': 'default'},
+        },
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'crm_db'),
+            'USER': os.getenv('POSTGRES_USER', 'crm_user'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'crm_pass'),
+            'HOST': os.getenv('POSTGRES_HOST', 'db'),
+            'PORT': int(os.getenv('POSTGRES_PORT', 5432)),
+            'CONN_MAX_AGE': int(os.getenv('POSTGRES_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv('POSTGRES_PGBOUNCER') == '1',
+            'OPTIONS': {'connect_timeout': 5},
+        }
+    }
+    if os.getenv('POSTGRES_REPLICA_HOST'):
+        DATABASES['replica'] = dict(
+            DATABASES['default'],
+            HOST=os.getenv('POSTGRES_REPLICA_HOST'),
+            PORT=int(os.getenv('POSTGRES_REPLICA_PORT', 5432)),
+            TEST={'MIRROR': 'default'},
+        )
+
+DATABASE_ROUTERS = ['crm.routers.ReplicaRouter']
+
+# Reads of a client that just ran a mutation stay on the primary for
+# STICKY_SECONDS (read-your-writes); the marker is kept in CACHE
+CRM_DB_ROUTING = {
+    'REPLICA': 'replica',
+    'STICKY_SECONDS': 5,
+    'CACHE': 'default',
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/ref/settings/#caches
+
+# Idempotency claims, query budgets, replica stickiness, persisted queries
+# and response cache tag versions must be shared by every web and worker
+# process, so deployments point CRM_CACHE_URL at Redis. Without it (or with
+# CRM_CACHE_URL=locmem://) each process keeps its own cache, which is only
+# fit for development and tests.
+
+CRM_CACHE_URL = os.getenv('CRM_CACHE_URL', 'locmem://')
+CRM_SHARED_CACHE = not CRM_CACHE_URL.startswith('locmem://')
+
+if CRM_SHARED_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CRM_CACHE_URL,
+            'KEY_PREFIX': 'crm',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'crm',
+        },
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -131,5 +202,145 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 GRAPHENE = {
-    "SCHEMA": "alx_backend_graphql_crm.schema.schema"
-}
\ No newline at end of file
+    "SCHEMA": "alx_backend_graphql.schema.schema",
+    # parsed and validated documents kept per process
+    "DOCUMENT_CACHE_SIZE": 256,
+    # automatic persisted queries, registered for TIMEOUT seconds once
+    # valid; set ALLOW_LIST to an operation manifest (JSON object of
+    # sha256 -> query) to reject ad-hoc documents
+    "PERSISTED_QUERIES": {
+        "CACHE": "default",
+        "TIMEOUT": 86400,
+        "ALLOW_LIST": os.getenv("GRAPHQL_ALLOW_LIST"),
+    },
+    # cached `data` of query operations, invalidated by model signals;
+    # BACKEND is "locmem" (per process) or "django" (the CACHE alias)
+    "RESPONSE_CACHE": {
+        "ENABLED": True,
+        "BACKEND": "django" if CRM_SHARED_CACHE else "locmem",
+        "CACHE": "default",
+        "TIMEOUT": 60,
+        # per root field TTLs in seconds; 0 disables caching for the field
+        "FIELD_TIMEOUTS": {"hello": 3600},
+        # seconds after an invalidation during which results read from the
+        # replica are not stored, as it may not have the write yet
+        "REPLICA_LAG": 5,
+    },
+    # static cost limits: a field costs its weight (1 for object fields,
+    # 0 for scalars) plus its selection times first/last/limit
+    "QUERY_COST": {
+        "MAX_COST": int(os.getenv("GRAPHQL_MAX_COST", 50000)),
+        "MAX_DEPTH": 12,
+        # size assumed for lists without a `limit` argument
+        "DEFAULT_LIST_SIZE": 100,
+        "FIELD_WEIGHTS": {
+            "Query.revenueByPeriod": 10,
+            "Query.topCustomers": 10,
+            "Query.topProducts": 10,
+        },
+        # token buckets per client, named in the CLIENT_HEADER request
+        # header; other clients get "default", keyed by address
+        "CLIENT_HEADER": "X-GraphQL-Client",
+        "BUDGET_CACHE": "default",
+        "BUDGETS": {
+            "default": {"CAPACITY": 100000, "REFILL_RATE": 1000},
+            "crm-cron": {"CAPACITY": 200000, "REFILL_RATE": 2000},
+            "dashboard": {"CAPACITY": 500000, "REFILL_RATE": 5000},
+        },
+    },
+    # POST requests sending the HEADER run once per key (scoped to client
+    # and user): duplicates wait for the first one, up to WAIT_TIMEOUT
+    # seconds, and get its response replayed for TTL seconds. CACHE must be
+    # shared by all workers to catch duplicates across processes
+    "IDEMPOTENCY": {
+        "ENABLED": True,
+        "HEADER": "Idempotency-Key",
+        "CACHE": "default",
+        "TTL": 86400,
+        # a claim left by a crashed request expires after this many seconds
+        "LOCK_TIMEOUT": 60,
+        "WAIT_TIMEOUT": 30,
+        "POLL_INTERVAL": 0.05,
+    },
+    "MIDDLEWARE": ["crm.tracing.TracingMiddleware"],
+    # operation and root field timings: per-process histograms written to
+    # STATS_DIR (see the graphql_trace_stats command), and per-resolver
+    # Apollo tracing in `extensions` for requests sending the HEADER
+    "TRACING": {
+        "ENABLED": True,
+        "HEADER": "X-GraphQL-Trace",
+        "STATS_DIR": os.getenv("GRAPHQL_STATS_DIR", "/tmp/crm_graphql_stats"),
+        "FLUSH_INTERVAL": 10,
+    },
+    # operations accepted in one batched request (a JSON array); a batch
+    # shares its loaders, and its queries run concurrently under ASGI
+    "MAX_BATCH_SIZE": 20,
+    # serve /graphql with the async view; asgi.py turns this on
+    "ASYNC_VIEW": os.getenv("GRAPHQL_ASYNC_VIEW") == "1",
+    # threads (and database connections) for resolvers of async requests
+    "ASYNC_THREAD_POOL_SIZE": int(os.getenv("GRAPHQL_ASYNC_THREAD_POOL_SIZE", 8)),
+}
+
+# Rows per INSERT for the bulk import mutations
+CRM_BULK_CHUNK_SIZE = int(os.getenv('CRM_BULK_CHUNK_SIZE', 500))
+
+# Order reminder pipeline (crm/cron_jobs/send_order_reminders.py)
+CRM_REMINDERS = {
+    'LOOKBACK_DAYS': 7,
+    # rows fetched per database round trip
+    'CHUNK_SIZE': 2000,
+    # customers per send_order_reminder_batch task
+    'BATCH_SIZE': 100,
+    # batches outstanding before the producer waits for the oldest
+    'MAX_IN_FLIGHT': 4,
+    'RESULT_TIMEOUT': 300,
+}
+
+# Batch jobs fanned out over primary key ranges (crm/batch.py)
+CRM_BATCH = {
+    # rows per chunk task
+    'CHUNK_SIZE': int(os.getenv('CRM_BATCH_CHUNK_SIZE', 5000)),
+    # retries of a chunk failing with a database error, with exponential
+    # backoff starting at RETRY_BACKOFF seconds
+    'MAX_RETRIES': 3,
+    'RETRY_BACKOFF': 5,
+}
+
+# Write-behind event log (crm/events.py): events are queued and written
+# by a background thread in batches of BATCH_SIZE, at least every
+# FLUSH_INTERVAL seconds
+CRM_EVENTS = {
+    'SINKS': [
+        'crm.events.TextLogSink',
+        'crm.events.JSONLinesSink',
+        'crm.events.DatabaseSink',
+    ],
+    'PATH': os.getenv('CRM_EVENTS_PATH', '/tmp/crm_events.ndjson'),
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'BACKUP_COUNT': 5,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 1.0,
+    # events beyond this are dropped instead of blocking the caller
+    'QUEUE_SIZE': 10000,
+}
+
+# In-process benchmark suite (manage.py benchmark_graphql); the baseline
+# is only comparable on the same machine and generate_crm_data dataset
+CRM_BENCHMARK = {
+    'BASELINE': os.getenv('CRM_BENCHMARK_BASELINE', str(BASE_DIR / 'benchmarks' / 'baseline.json')),
+    # slowdown reported as a regression, as a fraction of the baseline
+    'TOLERANCE': 0.2,
+    # latency changes smaller than this are timer noise
+    'MIN_DELTA_MS': 1.0,
+}
+
+# /metrics: every web and Celery worker process writes its counters to DIR,
+# which must be shared by the processes of one host
+CRM_METRICS = {
+    'DIR': os.getenv('CRM_METRICS_DIR', '/tmp/crm_metrics'),
+    'FLUSH_INTERVAL': 5,
+    # bearer token required by /metrics when set
+    'TOKEN': os.getenv('CRM_METRICS_TOKEN'),
+    # distinct operation names labelled before the rest count as "other"
+    'MAX_OPERATIONS': 500,
+}
@@ -16,11 +16,15 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
+from crm.conf import graphene_option
+from crm.views import AsyncCRMGraphQLView, CRMGraphQLView, metrics_view
+
+graphql_view = AsyncCRMGraphQLView if graphene_option("ASYNC_VIEW") else CRMGraphQLView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("graphql", csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path("graphql", csrf_exempt(graphql_view.as_view(graphiql=True))),
+    path("metrics", metrics_view),
 ]
 
@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from .filters import OrderFilter
+from .models import Customer, Order, OrderLine, Product
+from .rollups import day_bounds
+
+TRUNCATE = {"day": TruncDay, "week": TruncWeek, "month": TruncMonth}
+MAX_LIMIT = 100
+
+
+def filter_orders(filters, start=None, end=None, request=None):
+    """
+    Orders matching `OrderFilter` and the inclusive `start`..`end` day range.
+
+    The filtered ids are applied as a subquery so joins made by filters
+    such as `product_name` cannot count an order twice.
+    """
+    filterset = OrderFilter(data=filters, queryset=Order.objects.all(), request=request)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.form.errors.as_json())
+    orders = Order.objects.filter(pk__in=filterset.qs.values("pk"))
+    if start or end:
+        low, high = day_bounds(start or end, (end or start) + timedelta(days=1))
+        if start:
+            orders = orders.filter(order_date__gte=low)
+        if end:
+            orders = orders.filter(order_date__lt=high)
+    return orders
+
+
+def revenue_by_period(orders, granularity="day"):
+    return list(
+        orders.annotate(period=TRUNCATE[granularity]("order_date"))
+        .values("period")
+        .annotate(orders=Count("id"), revenue=Sum("total_amount"))
+        .order_by("period")
+    )
+
+
+def top_customers(orders, limit=10, by="revenue"):
+    """
+    Customers with the highest revenue (or order count) among `orders`.
+    """
+    limit = min(limit, MAX_LIMIT)
+    rows = list(
+        orders.values("customer_id")
+        .annotate(orders=Count("id"), revenue=Sum("total_amount"))
+        .order_by(f"-{by}", "customer_id")[:limit]
+    )
+    customers = Customer.objects.in_bulk([row["customer_id"] for row in rows])
+    return [dict(row, customer=customers[row["customer_id"]]) for row in rows]
+
+
+def top_products(orders, limit=10):
+    """
+    Products with the highest revenue among `orders`, with the units sold:
+    quantities times the unit prices snapshotted on the order lines.
+    """
+    limit = min(limit, MAX_LIMIT)
+    rows = list(
+        OrderLine.objects.filter(order__in=orders)
+        .values("product_id")
+        .annotate(units=Sum("quantity"), revenue=Sum(F("quantity") * F("unit_price")))
+        .order_by("-revenue", "product_id")[:limit]
+    )
+    products = Product.objects.in_bulk([row["product_id"] for row in rows])
+    return [dict(row, product=products[row["product_id"]]) for row in rows]
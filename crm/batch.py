@@ -0,0 +1,170 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from .inventory import restock_batch
+from .models import BatchChunk, Order, Product, RollupDirtyDay
+from .response_cache import invalidate_models
+from .rollups import advance_watermarks, rebuild_dirty_days
+
+JOBS = {}
+
+
+def batch_option(name, default=None):
+    return getattr(settings, "CRM_BATCH", {}).get(name, default)
+
+
+def register(job_class):
+    JOBS[job_class.name] = job_class()
+    return job_class
+
+
+def get_job(name):
+    try:
+        return JOBS[name]
+    except KeyError:
+        raise ValueError(f"Unknown batch job: {name}")
+
+
+def id_ranges(queryset, chunk_size):
+    """
+    Split `queryset` into `(after, upto)` primary key ranges holding
+    `chunk_size` of its rows each (the last one may hold fewer), with one
+    index seek per range. Rows created afterwards are not covered.
+    """
+    top = queryset.aggregate(top=Max("pk"))["top"]
+    if top is None:
+        return []
+    pks = queryset.order_by("pk").values_list("pk", flat=True)
+    ranges = []
+    after = 0
+    while True:
+        boundary = list(pks.filter(pk__gt=after)[chunk_size - 1:chunk_size])
+        if not boundary or boundary[0] >= top:
+            ranges.append((after, top))
+            return ranges
+        ranges.append((after, boundary[0]))
+        after = boundary[0]
+
+
+class BatchJob:
+    """
+    Work split over primary key ranges of `queryset`.
+
+    `process` handles one range inside a transaction and returns a JSON
+    result; `merge` combines the results of every range. `prepare` runs
+    once before the ranges are planned.
+    """
+
+    name = None
+
+    def prepare(self, **options):
+        pass
+
+    def queryset(self, **options):
+        raise NotImplementedError
+
+    def process(self, after, upto, **options):
+        raise NotImplementedError
+
+    def merge(self, results, **options):
+        merged = {}
+        for result in results:
+            for key, value in result.items():
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+
+def plan(name, chunk_size=None, **options):
+    job = get_job(name)
+    job.prepare(**options)
+    return id_ranges(job.queryset(**options), chunk_size or batch_option("CHUNK_SIZE", 5000))
+
+
+def run_chunk(name, job_id, after, upto, options):
+    """
+    Process one range of job `job_id` at most once: the chunk's result is
+    stored in the same transaction as its work, and a retry or concurrent
+    duplicate of a finished chunk returns the stored result.
+    """
+    job = get_job(name)
+    chunks = BatchChunk.objects.filter(job_id=job_id, after=after)
+    done = chunks.values_list("result", flat=True).first()
+    if done is not None:
+        return done
+    try:
+        with transaction.atomic():
+            result = job.process(after, upto, **options)
+            BatchChunk.objects.create(
+                job_id=job_id, job=name, after=after, upto=upto, result=result
+            )
+    except IntegrityError:
+        # a duplicate delivery finished first; this attempt was rolled back
+        return chunks.values_list("result", flat=True).get()
+    return result
+
+
+def merge_chunks(name, job_id, results, options):
+    result = get_job(name).merge(results, **options)
+    BatchChunk.objects.filter(job_id=job_id).delete()
+    return result
+
+
+def run_inline(name, job_id, chunk_size=None, **options):
+    """
+    Run every chunk of a job in this process, one transaction per chunk.
+    """
+    results = [
+        run_chunk(name, job_id, after, upto, options)
+        for after, upto in plan(name, chunk_size, **options)
+    ]
+    return merge_chunks(name, job_id, results, options)
+
+
+# ---------- Jobs ----------
+@register
+class RestockJob(BatchJob):
+    name = "restock"
+
+    def queryset(self, threshold=10, **options):
+        return Product.objects.filter(stock__lt=threshold)
+
+    def process(self, after, upto, threshold=10, increment=10):
+        return {"restocked": len(restock_batch(threshold, increment, after=after, upto=upto))}
+
+
+@register
+class RollupJob(BatchJob):
+    """
+    Rebuild the queued rollup days; the CRM report reads the result.
+    """
+
+    name = "rollups"
+
+    def prepare(self, **options):
+        advance_watermarks()
+
+    def queryset(self, **options):
+        return RollupDirtyDay.objects.all()
+
+    def process(self, after, upto, **options):
+        return {"days": rebuild_dirty_days(RollupDirtyDay.objects.filter(pk__gt=after, pk__lte=upto))}
+
+
+@register
+class OrderTotalsJob(BatchJob):
+    """
+    Recompute `total_amount` from the order lines.
+    """
+
+    name = "order_totals"
+
+    def queryset(self, **options):
+        return Order.objects.all()
+
+    def process(self, after, upto, **options):
+        return {"updated": Order.objects.filter(pk__gt=after, pk__lte=upto).recalculate_totals()}
+
+    def merge(self, results, **options):
+        invalidate_models(Order)
+        return super().merge(results)
@@ -0,0 +1,391 @@
+import json
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import timedelta
+from statistics import mean, median
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max, Min
+from django.test import RequestFactory
+
+from .models import Customer, Order, Product
+from .rollups import breakdown, summarize
+from .tracing import SQLTimer
+from .views import CRMGraphQLView
+
+WORKLOADS = {}
+
+
+def benchmark_option(name, default=None):
+    return getattr(settings, "CRM_BENCHMARK", {}).get(name, default)
+
+
+def register(workload_class):
+    WORKLOADS[workload_class.name] = workload_class()
+    return workload_class
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class BenchmarkError(Exception):
+    """
+    A workload operation failed, so its timings would be meaningless.
+    """
+
+
+class BenchmarkView(CRMGraphQLView):
+    # a benchmark would soon exhaust any query budget
+    token_buckets = None
+
+
+class UncachedBenchmarkView(BenchmarkView):
+    response_cache = None
+
+
+class GraphQLClient:
+    """
+    Sends operations straight to a CRMGraphQLView in this process. Query
+    budgets are off, and so is the response cache unless `response_cache`
+    is set, so repeated operations measure execution rather than hits.
+    """
+
+    def __init__(self, response_cache=False):
+        self.view = (BenchmarkView if response_cache else UncachedBenchmarkView).as_view()
+        self.factory = RequestFactory()
+
+    def execute(self, query, variables=None):
+        request = self.factory.post(
+            "/graphql",
+            json.dumps({"query": query, "variables": variables or {}}),
+            content_type="application/json",
+        )
+        response = self.view(request)
+        body = json.loads(response.content)
+        if response.status_code != 200 or body.get("errors"):
+            raise BenchmarkError(body.get("errors") or response.status_code)
+        return body["data"]
+
+
+class Dataset:
+    """
+    Row counts and id samples of the database under test, drawn with
+    `rng` so every run picks the same arguments from the same data.
+    """
+
+    def __init__(self, rng, sample_size=500):
+        self.counts = {
+            "customers": Customer.objects.count(),
+            "products": Product.objects.count(),
+            "orders": Order.objects.count(),
+        }
+        self.customer_ids = self.sample(Customer.objects.all(), rng, sample_size)
+        # enough stock that reservations in write workloads succeed
+        self.product_ids = self.sample(Product.objects.filter(stock__gte=10), rng, sample_size)
+        span = Order.objects.aggregate(first=Min("order_date"), last=Max("order_date"))
+        self.first_day = span["first"].date() if span["first"] else None
+        self.last_day = span["last"].date() if span["last"] else None
+
+    def sample(self, queryset, rng, size):
+        bounds = queryset.aggregate(low=Min("pk"), high=Max("pk"))
+        if bounds["low"] is None:
+            return []
+        candidates = range(bounds["low"], bounds["high"] + 1)
+        picked = rng.sample(candidates, min(size, len(candidates)))
+        return sorted(queryset.filter(pk__in=picked).values_list("pk", flat=True))
+
+    def day(self, rng):
+        return self.first_day + (self.last_day - self.first_day) * rng.random()
+
+
+class Workload:
+    """
+    One representative operation. `writes` workloads run in a transaction
+    that is rolled back after every operation, so the dataset and the
+    baseline it was measured against stay comparable.
+    """
+
+    name = None
+    writes = False
+
+    def ready(self, dataset):
+        return dataset.counts["orders"] > 0
+
+    def run(self, client, dataset, rng):
+        raise NotImplementedError
+
+
+class GraphQLWorkload(Workload):
+    query = None
+
+    def variables(self, dataset, rng):
+        return {}
+
+    def run(self, client, dataset, rng):
+        return client.execute(self.query, self.variables(dataset, rng))
+
+
+def measure(workload, client, dataset, rng, iterations, warmup=5, memory_iterations=5):
+    """
+    Run `workload` `warmup` times untimed, then `iterations` times and
+    return its latency percentiles in milliseconds and mean SQL queries
+    per operation, plus the median peak of memory allocated by an
+    operation over `memory_iterations` runs under tracemalloc.
+    """
+    timer = SQLTimer()
+    latencies, queries = [], []
+
+    def run_once():
+        with transaction.atomic() if workload.writes else ExitStack():
+            workload.run(client, dataset, rng)
+            if workload.writes:
+                transaction.set_rollback(True)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        for index in range(warmup + iterations):
+            count = timer.count
+            start = time.perf_counter()
+            run_once()
+            elapsed = time.perf_counter() - start
+            if index >= warmup:
+                latencies.append(elapsed * 1000)
+                queries.append(timer.count - count)
+
+    peaks = []
+    if memory_iterations:
+        tracemalloc.start()
+        try:
+            for _ in range(memory_iterations):
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                run_once()
+                peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(latencies, 0.5), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(mean(latencies), 3),
+        "queries": round(mean(queries), 2),
+        "peak_kib": round(median(peaks) / 1024, 1) if peaks else None,
+    }
+
+
+def compare(result, baseline, tolerance, min_delta_ms=1.0):
+    """
+    Return the regressions of `result` against the `baseline` result of
+    the same workload: latencies or peak memory more than `tolerance`
+    above it (and latencies by at least `min_delta_ms`, below which timer
+    noise dominates), or any increase in queries per operation.
+    """
+    regressions = []
+    for key in ("p50_ms", "p99_ms"):
+        before, after = baseline.get(key), result[key]
+        if before and after > before * (1 + tolerance) and after - before >= min_delta_ms:
+            regressions.append(f"{key} {before} -> {after}")
+    if baseline.get("queries") is not None and result["queries"] > baseline["queries"]:
+        regressions.append(f"queries {baseline['queries']} -> {result['queries']}")
+    before, after = baseline.get("peak_kib"), result["peak_kib"]
+    if before and after and after > before * (1 + tolerance):
+        regressions.append(f"peak_kib {before} -> {after}")
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, report):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+# ---------- Workloads ----------
+ORDER_FIELDS = """
+    id
+    totalAmount
+    orderDate
+    customer { name email }
+    lines { quantity unitPrice product { name } }
+"""
+
+
+@register
+class AllOrdersWorkload(GraphQLWorkload):
+    """
+    A page of orders with their customer and lines, deep into the table.
+    """
+
+    name = "all_orders"
+    query = (
+        "query AllOrders($offset: Int) { allOrders(first: 50, offset: $offset) "
+        "{ edges { node {" + ORDER_FIELDS + "} } } }"
+    )
+
+    def variables(self, dataset, rng):
+        return {"offset": rng.randrange(max(min(dataset.counts["orders"], 10000) - 50, 1))}
+
+
+@register
+class OrdersKeysetWorkload(GraphQLWorkload):
+    name = "all_orders_keyset"
+    query = (
+        "query OrdersKeyset { allOrdersKeyset(first: 50) "
+        "{ edges { cursor node {" + ORDER_FIELDS + "} } } }"
+    )
+
+
+@register
+class FilterOrdersWorkload(GraphQLWorkload):
+    name = "filter_orders"
+    query = (
+        "query FilterOrders($from: Date, $min: Decimal, $customer: String) { "
+        "allOrders(first: 20, orderDate_Gte: $from, totalAmount_Gte: $min, customerName: $customer) "
+        "{ edges { node { id totalAmount customer { name } } } } }"
+    )
+
+    def variables(self, dataset, rng):
+        return {
+            "from": dataset.day(rng).isoformat(),
+            "min": rng.choice(["10", "50", "200", "1000"]),
+            "customer": rng.choice(["ali", "smith", "kim", "an"]),
+        }
+
+
+@register
+class FilterProductsWorkload(GraphQLWorkload):
+    name = "filter_products"
+    query = (
+        "query FilterProducts($name: String, $max: Decimal) { "
+        "allProducts(first: 20, name: $name, price_Lte: $max, stock_Lte: 50) "
+        "{ edges { node { id name price stock } } } }"
+    )
+
+    def ready(self, dataset):
+        return dataset.counts["products"] > 0
+
+    def variables(self, dataset, rng):
+        return {"name": rng.choice(["pro", "smart", "phone", "lamp"]), "max": rng.choice(["20", "100", "500"])}
+
+
+@register
+class BulkCreateCustomersWorkload(GraphQLWorkload):
+    name = "bulk_create_customers"
+    writes = True
+    query = (
+        "mutation BulkCreateCustomers($input: [CustomerInput]!) { "
+        "bulkCreateCustomers(input: $input) { customers { id } errors } }"
+    )
+
+    def ready(self, dataset):
+        return True
+
+    def variables(self, dataset, rng):
+        return {
+            "input": [
+                {
+                    "name": "Benchmark Customer",
+                    "email": f"benchmark.{rng.getrandbits(64):x}@example.com",
+                    "phone": "+1555000" + str(rng.randrange(1000, 10000)),
+                }
+                for _ in range(50)
+            ]
+        }
+
+
+@register
+class BulkCreateOrdersWorkload(GraphQLWorkload):
+    name = "bulk_create_orders"
+    writes = True
+    query = (
+        "mutation BulkCreateOrders($input: [OrderInput]!) { "
+        "bulkCreateOrders(input: $input) { orders { id totalAmount } errors } }"
+    )
+
+    def ready(self, dataset):
+        return bool(dataset.customer_ids and len(dataset.product_ids) >= 3)
+
+    def variables(self, dataset, rng):
+        return {
+            "input": [
+                {
+                    "customerId": str(rng.choice(dataset.customer_ids)),
+                    "productIds": [str(pk) for pk in rng.sample(dataset.product_ids, 3)],
+                }
+                for _ in range(20)
+            ]
+        }
+
+
+@register
+class CreateOrderWorkload(GraphQLWorkload):
+    """
+    A single checkout: stock reservation, order, lines and links.
+    """
+
+    name = "create_order"
+    writes = True
+    query = (
+        "mutation CreateOrder($customerId: ID!, $lines: [OrderLineInput]) { "
+        "createOrder(customerId: $customerId, lines: $lines) { order { id totalAmount } } }"
+    )
+
+    def ready(self, dataset):
+        return bool(dataset.customer_ids and len(dataset.product_ids) >= 3)
+
+    def variables(self, dataset, rng):
+        return {
+            "customerId": str(rng.choice(dataset.customer_ids)),
+            "lines": [
+                {"productId": str(pk), "quantity": rng.randint(1, 3)}
+                for pk in rng.sample(dataset.product_ids, 3)
+            ],
+        }
+
+
+@register
+class AnalyticsWorkload(GraphQLWorkload):
+    """
+    The dashboard aggregates over a random window of up to 90 days.
+    """
+
+    name = "analytics"
+    query = (
+        "query Analytics($from: Date, $to: Date) { "
+        "revenueByPeriod(granularity: WEEK, from: $from, to: $to) { period orders revenue } "
+        "topCustomers(limit: 10, from: $from, to: $to) { orders revenue customer { name } } "
+        "topProducts(limit: 10, from: $from, to: $to) { units revenue product { name } } }"
+    )
+
+    def variables(self, dataset, rng):
+        start = dataset.day(rng)
+        end = min(start + timedelta(days=rng.randint(7, 90)), dataset.last_day)
+        return {"from": start.isoformat(), "to": end.isoformat()}
+
+
+@register
+class RollupReportWorkload(Workload):
+    """
+    The reads of the scheduled CRM report, from the daily rollups.
+    """
+
+    name = "rollup_report"
+
+    def run(self, client, dataset, rng):
+        summarize()
+        breakdown("week")
@@ -0,0 +1,368 @@
+import csv
+import io
+import re
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .inventory import reserve_stock
+from .models import Customer, Order, OrderLine, Product
+from .response_cache import invalidate_models
+
+PRODUCT_STAGING = "crm_product_staging"
+ORDER_STAGING = "crm_order_staging"
+
+
+def get_chunk_size(chunk_size=None):
+    return chunk_size or getattr(settings, "CRM_BULK_CHUNK_SIZE", 500)
+
+
+def chunked(items, size):
+    """
+    Yield lists of at most `size` items from any iterable, without reading
+    more than one chunk ahead.
+    """
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def parse_ids(value):
+    """
+    Parse a list of ids, or a string of ids separated by `;`, `,` or spaces.
+    """
+    if isinstance(value, str):
+        value = [part for part in re.split(r"[;,\s]+", value) if part]
+    return [int(pk) for pk in value or []]
+
+
+def parse_order_date(value):
+    """
+    Parse an optional order date given as a datetime or an ISO 8601 string;
+    naive values are taken in the current time zone.
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError(f"Invalid order date: {value}")
+        value = parsed
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+
+def insert_chunks(insert, objs, chunk_size, savepoint_per_chunk, errors):
+    """
+    Call `insert` on objs chunk by chunk and return what it saved.
+
+    With `savepoint_per_chunk` each chunk runs in its own savepoint and a
+    failing chunk, including one `insert` rejects with ValidationError,
+    only adds one error per row instead of aborting the import.
+    """
+    created = []
+    for chunk in chunked(objs, chunk_size):
+        if not savepoint_per_chunk:
+            created.extend(insert(chunk))
+            continue
+        try:
+            with transaction.atomic():
+                created.extend(insert(chunk))
+        except (DatabaseError, ValidationError) as e:
+            errors.extend(str(e) for _ in chunk)
+    return created
+
+
+def bulk_create_customers(rows, chunk_size=None, savepoint_per_chunk=False):
+    """
+    Validate and insert customer rows with one lookup for existing emails
+    and one INSERT per chunk.
+
+    Returns `(created, errors)`, with the same error messages the row by row
+    implementation produced.
+    """
+    emails = {row["email"] for row in rows}
+    seen = set(Customer.objects.filter(email__in=emails).values_list("email", flat=True))
+
+    objs, errors = [], []
+    for row in rows:
+        try:
+            if row["email"] in seen:
+                raise ValidationError(f"Email {row['email']} already exists")
+            obj = Customer(name=row["name"], email=row["email"], phone=row.get("phone"))
+            # uniqueness was settled by the set lookups above
+            obj.full_clean(validate_unique=False)
+        except ValidationError as e:
+            errors.append(str(e))
+            continue
+        seen.add(row["email"])
+        objs.append(obj)
+
+    created = insert_chunks(
+        Customer.objects.bulk_create, objs, get_chunk_size(chunk_size), savepoint_per_chunk, errors
+    )
+    invalidate_models(Customer)
+    return created, errors
+
+
+def build_product(name, price, stock=0):
+    """
+    Return an unsaved Product, raising ValidationError for invalid input.
+    """
+    try:
+        price_decimal = Decimal(price)
+    except (TypeError, ValueError, InvalidOperation):
+        raise ValidationError("Invalid price format. Use a numeric string like '999.99'.")
+
+    if price_decimal <= 0:
+        raise ValidationError("Price must be positive")
+    if stock < 0:
+        raise ValidationError("Stock cannot be negative")
+    return Product(name=name, price=price_decimal, stock=stock)
+
+
+def bulk_create_products(rows, chunk_size=None, savepoint_per_chunk=False):
+    """
+    Validate product rows in memory and insert them with one INSERT per chunk.
+    """
+    objs, errors = [], []
+    for row in rows:
+        try:
+            objs.append(build_product(row["name"], row["price"], int(row.get("stock") or 0)))
+        except (ValidationError, ValueError) as e:
+            errors.append(str(e))
+
+    created = insert_chunks(
+        Product.objects.bulk_create, objs, get_chunk_size(chunk_size), savepoint_per_chunk, errors
+    )
+    invalidate_models(Product)
+    return created, errors
+
+
+def insert_orders(lines):
+    """
+    Insert `(order, {product_id: price})` pairs: one INSERT for the orders,
+    one for their lines (one unit of each product at its current price) and
+    one for the order/product links. Totals are set by the caller.
+    """
+    orders = Order.objects.bulk_create([order for order, _ in lines])
+    OrderLine.objects.bulk_create(
+        OrderLine(order_id=order.pk, product_id=product_id, quantity=1, unit_price=price)
+        for order, prices in lines
+        for product_id, price in prices.items()
+    )
+    Order.products.through.objects.bulk_create(
+        Order.products.through(order_id=order.pk, product_id=product_id)
+        for order, prices in lines
+        for product_id in prices
+    )
+    return orders
+
+
+def reserve_and_insert_orders(lines):
+    """
+    Take one unit of every product of the chunk's orders out of stock with
+    `reserve_stock`, all or nothing, then `insert_orders`.
+    """
+    reserve_stock(Counter(product_id for _, prices in lines for product_id in prices))
+    return insert_orders(lines)
+
+
+def bulk_create_orders(rows, chunk_size=None, savepoint_per_chunk=False, reserve=False):
+    """
+    Validate order rows against one customer and one product lookup and
+    insert them chunk by chunk with `insert_orders`.
+
+    With `reserve`, as for the BulkCreateOrders mutation, each chunk's
+    stock is reserved like a checkout and a chunk with a short product
+    fails as a whole. Imports of past orders leave stock alone.
+    """
+    parsed, errors = [], []
+    for row in rows:
+        try:
+            order_date = parse_order_date(row.get("order_date"))
+            parsed.append((order_date, int(row["customer_id"]), parse_ids(row["product_ids"])))
+        except ValidationError as e:
+            errors.append(str(e))
+        except (TypeError, ValueError):
+            errors.append(str(ValidationError("Invalid customer or product IDs")))
+
+    customer_ids = set(
+        Customer.objects.filter(pk__in={customer_id for _, customer_id, _ in parsed})
+        .values_list("pk", flat=True)
+    )
+    prices = dict(
+        Product.objects.filter(pk__in={pk for _, _, ids in parsed for pk in ids})
+        .values_list("pk", "price")
+    )
+
+    lines = []
+    for order_date, customer_id, product_ids in parsed:
+        order_prices = {pk: prices[pk] for pk in product_ids if pk in prices}
+        if customer_id not in customer_ids:
+            errors.append(str(ValidationError("Invalid customer ID")))
+        elif not order_prices:
+            errors.append(str(ValidationError("Invalid product IDs")))
+        else:
+            order = Order(
+                customer_id=customer_id,
+                order_date=order_date or timezone.now(),
+                total_amount=sum(order_prices.values(), Decimal("0")),
+            )
+            lines.append((order, order_prices))
+
+    created = insert_chunks(
+        reserve_and_insert_orders if reserve else insert_orders,
+        lines,
+        get_chunk_size(chunk_size),
+        savepoint_per_chunk,
+        errors,
+    )
+    invalidate_models(Order)
+    return created, errors
+
+
+# ---------- PostgreSQL COPY ingestion ----------
+def copy_rows(cursor, table, columns, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+    )
+
+
+def copy_products(rows, chunk_size):
+    """
+    Stream product rows through COPY into a staging table and upsert them:
+    rows with an `id` update that product, rows without one are inserted
+    and rows whose `id` matches no product are reported as errors.
+
+    Returns `(inserted, updated, errors)`.
+    """
+    table = Product._meta.db_table
+    inserted = updated = 0
+    errors = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMP TABLE {PRODUCT_STAGING} "
+            "(id bigint, name varchar(100), price numeric(10, 2), stock integer) ON COMMIT DROP"
+        )
+        for chunk in chunked(rows, chunk_size):
+            valid = []
+            for row in chunk:
+                try:
+                    pk = int(row["id"]) if row.get("id") else None
+                    product = build_product(row["name"], row["price"], int(row.get("stock") or 0))
+                except (ValidationError, ValueError) as e:
+                    errors.append(str(e))
+                    continue
+                valid.append((pk, product.name, product.price, product.stock))
+
+            cursor.execute(f"TRUNCATE {PRODUCT_STAGING}")
+            copy_rows(cursor, PRODUCT_STAGING, ("id", "name", "price", "stock"), valid)
+            cursor.execute(
+                f"UPDATE {table} AS p SET name = s.name, price = s.price, stock = s.stock "
+                f"FROM {PRODUCT_STAGING} AS s WHERE s.id = p.id"
+            )
+            updated += cursor.rowcount
+            cursor.execute(
+                f"SELECT s.id FROM {PRODUCT_STAGING} AS s WHERE s.id IS NOT NULL "
+                f"AND NOT EXISTS (SELECT 1 FROM {table} p WHERE p.id = s.id)"
+            )
+            errors.extend(
+                str(ValidationError(f"Product {pk} does not exist")) for (pk,) in cursor.fetchall()
+            )
+            cursor.execute(
+                f"INSERT INTO {table} (name, price, stock, created_at) "
+                f"SELECT name, price, stock, now() FROM {PRODUCT_STAGING} WHERE id IS NULL"
+            )
+            inserted += cursor.rowcount
+        invalidate_models(Product)
+    return inserted, updated, errors
+
+
+def copy_orders(rows, chunk_size):
+    """
+    Stream order rows through COPY into a staging table, then create the
+    orders, their lines (one unit of each product at its current price),
+    their product links and their totals with set-based statements. Like
+    `bulk_create_orders` without `reserve`, it leaves stock alone.
+
+    Rows without an `order_date` are dated now. Returns
+    `(inserted, skipped, errors)`; skipped rows reference a missing
+    customer or no existing product.
+    """
+    order_table = Order._meta.db_table
+    line_table = OrderLine._meta.db_table
+    link_table = Order.products.through._meta.db_table
+    customer_table = Customer._meta.db_table
+    product_table = Product._meta.db_table
+    inserted = skipped = 0
+    errors = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMP TABLE {ORDER_STAGING} "
+            "(order_id bigint, customer_id bigint, product_ids bigint[], order_date timestamptz) "
+            "ON COMMIT DROP"
+        )
+        for chunk in chunked(rows, chunk_size):
+            valid = []
+            for row in chunk:
+                try:
+                    order_date = parse_order_date(row.get("order_date"))
+                    product_ids = parse_ids(row["product_ids"])
+                    valid.append(
+                        (
+                            int(row["customer_id"]),
+                            "{%s}" % ",".join(map(str, product_ids)),
+                            order_date.isoformat() if order_date else None,
+                        )
+                    )
+                except ValidationError as e:
+                    errors.append(str(e))
+                except (TypeError, ValueError):
+                    errors.append(str(ValidationError("Invalid customer or product IDs")))
+
+            cursor.execute(f"TRUNCATE {ORDER_STAGING}")
+            copy_rows(cursor, ORDER_STAGING, ("customer_id", "product_ids", "order_date"), valid)
+            cursor.execute(
+                f"UPDATE {ORDER_STAGING} AS s "
+                f"SET order_id = nextval(pg_get_serial_sequence('{order_table}', 'id')) "
+                f"WHERE EXISTS (SELECT 1 FROM {customer_table} c WHERE c.id = s.customer_id) "
+                f"AND EXISTS (SELECT 1 FROM {product_table} p WHERE p.id = ANY(s.product_ids))"
+            )
+            inserted += cursor.rowcount
+            skipped += len(valid) - cursor.rowcount
+            cursor.execute(
+                f"INSERT INTO {order_table} (id, customer_id, order_date, total_amount) "
+                f"SELECT order_id, customer_id, COALESCE(order_date, now()), 0 FROM {ORDER_STAGING} "
+                "WHERE order_id IS NOT NULL"
+            )
+            cursor.execute(
+                f"INSERT INTO {line_table} (order_id, product_id, quantity, unit_price) "
+                f"SELECT DISTINCT s.order_id, p.id, 1, p.price FROM {ORDER_STAGING} s "
+                f"JOIN {product_table} p ON p.id = ANY(s.product_ids) "
+                "WHERE s.order_id IS NOT NULL"
+            )
+            cursor.execute(
+                f"INSERT INTO {link_table} (order_id, product_id) "
+                f"SELECT l.order_id, l.product_id FROM {line_table} l "
+                f"JOIN {ORDER_STAGING} s ON s.order_id = l.order_id"
+            )
+            cursor.execute(
+                f"UPDATE {order_table} AS o SET total_amount = t.total FROM ("
+                f"SELECT l.order_id, SUM(l.quantity * l.unit_price) AS total FROM {line_table} l "
+                f"JOIN {ORDER_STAGING} s ON s.order_id = l.order_id "
+                "GROUP BY l.order_id) AS t WHERE o.id = t.order_id"
+            )
+        invalidate_models(Order)
+    return inserted, skipped, errors
@@ -0,0 +1,8 @@
+from django.conf import settings
+
+
+def graphene_option(name, default=None):
+    """
+    Read one of the CRM's GraphQL options from the `GRAPHENE` settings dict.
+    """
+    return getattr(settings, "GRAPHENE", {}).get(name, default)
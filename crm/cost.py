@@ -0,0 +1,298 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLList,
+    InlineFragmentNode,
+    OperationDefinitionNode,
+    ValidationRule,
+    VariableNode,
+    get_named_type,
+    get_nullable_type,
+    is_leaf_type,
+)
+
+from .conf import graphene_option
+
+BUDGET_KEY_PREFIX = "crm:cost-budget:"
+BUDGET_LOCK_SUFFIX = ":lock"
+
+# relay plumbing: free, and already multiplied by the connection's page size
+PASS_THROUGH_FIELDS = {"edges", "node", "pageInfo"}
+
+
+def cost_option(name, default=None):
+    return graphene_option("QUERY_COST", {}).get(name, default)
+
+
+def operation_key(operation):
+    return operation.name.value if operation.name else "anonymous"
+
+
+def get_fragments(document):
+    return {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+
+
+def iter_fields(schema, selection_set, parent_type, fragments):
+    """
+    Yield `(field_node, owner_type)` for a selection set, flattening
+    fragment spreads and inline fragments.
+    """
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection, parent_type
+            continue
+        if isinstance(selection, FragmentSpreadNode):
+            fragment = fragments.get(selection.name.value)
+            if fragment is None:
+                continue
+        elif isinstance(selection, InlineFragmentNode):
+            fragment = selection
+        else:
+            continue
+        owner = parent_type
+        if fragment.type_condition is not None:
+            owner = schema.get_type(fragment.type_condition.name.value) or parent_type
+        yield from iter_fields(schema, fragment.selection_set, owner, fragments)
+
+
+def field_weight(owner, name, field_def, weights):
+    """
+    Configured weight of `Type.field`; otherwise 0 for scalars and relay
+    plumbing and 1 for every field that resolves objects.
+    """
+    key = f"{owner.name}.{name}"
+    if key in weights:
+        return weights[key]
+    if name in PASS_THROUGH_FIELDS or is_leaf_type(get_named_type(field_def.type)):
+        return 0
+    return 1
+
+
+def argument_value(node, name, variables):
+    for argument in node.arguments:
+        if argument.name.value != name:
+            continue
+        if isinstance(argument.value, VariableNode):
+            value = variables.get(argument.value.name.value)
+            return value if isinstance(value, int) else None
+        try:
+            return int(argument.value.value)
+        except (AttributeError, TypeError, ValueError):
+            return None
+    return None
+
+
+def page_size(node, names, variables, default):
+    """
+    Largest positive value among the `names` arguments, else `default`.
+    Zero and negative sizes, which execution rejects or ignores, are
+    priced like absent ones so they can never lower an estimate.
+    """
+    sizes = [argument_value(node, name, variables) for name in names]
+    sizes = [size for size in sizes if size is not None and size > 0]
+    return max(sizes) if sizes else default
+
+
+def multiplier(node, field_def, variables):
+    """
+    How many times the field's selection is resolved: the connection's
+    `first`/`last` (or the relay max limit), a list's `limit` (or
+    DEFAULT_LIST_SIZE), else 1.
+    """
+    name = node.name.value
+    if name in PASS_THROUGH_FIELDS:
+        return 1
+    if "first" in field_def.args or "last" in field_def.args:
+        return page_size(
+            node, ("first", "last"), variables, graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+        )
+    if isinstance(get_nullable_type(field_def.type), GraphQLList):
+        return page_size(node, ("limit",), variables, cost_option("DEFAULT_LIST_SIZE", 100))
+    return 1
+
+
+def estimate_cost(schema, selection_set, parent_type, fragments, variables=None, weights=None):
+    """
+    Static cost of a selection set: each field's weight plus the cost of
+    its own selection times its `multiplier`.
+    """
+    variables = variables or {}
+    weights = cost_option("FIELD_WEIGHTS", {}) if weights is None else weights
+    total = 0
+    for node, owner in iter_fields(schema, selection_set, parent_type, fragments):
+        field_def = getattr(owner, "fields", {}).get(node.name.value)
+        if field_def is None:
+            continue
+        total += field_weight(owner, node.name.value, field_def, weights)
+        if node.selection_set:
+            child = estimate_cost(
+                schema,
+                node.selection_set,
+                get_named_type(field_def.type),
+                fragments,
+                variables,
+                weights,
+            )
+            total += multiplier(node, field_def, variables) * child
+    return total
+
+
+def actual_cost(schema, selection_set, parent_type, fragments, data, weights=None):
+    """
+    Cost of the same selection priced against the returned `data`, where
+    every list counts the items it actually holds.
+    """
+    weights = cost_option("FIELD_WEIGHTS", {}) if weights is None else weights
+    if isinstance(data, list):
+        return sum(
+            actual_cost(schema, selection_set, parent_type, fragments, item, weights)
+            for item in data
+        )
+    if not isinstance(data, dict):
+        return 0
+    total = 0
+    for node, owner in iter_fields(schema, selection_set, parent_type, fragments):
+        field_def = getattr(owner, "fields", {}).get(node.name.value)
+        key = node.alias.value if node.alias else node.name.value
+        if field_def is None or key not in data:
+            continue
+        total += field_weight(owner, node.name.value, field_def, weights)
+        if node.selection_set:
+            total += actual_cost(
+                schema,
+                node.selection_set,
+                get_named_type(field_def.type),
+                fragments,
+                data[key],
+                weights,
+            )
+    return total
+
+
+def cost_extensions(estimated, actual):
+    return {"cost": {"estimated": estimated, "actual": actual}}
+
+
+def cost_limit_validator(max_cost, variables=None, callback=None):
+    """
+    Validation rule rejecting operations whose estimated cost exceeds
+    `max_cost`; `callback` receives the cost of every operation by name.
+    """
+
+    class CostLimitValidator(ValidationRule):
+        def __init__(self, validation_context):
+            super().__init__(validation_context)
+            document = validation_context.document
+            schema = validation_context.schema
+            fragments = get_fragments(document)
+            costs = {}
+            for operation in document.definitions:
+                if not isinstance(operation, OperationDefinitionNode):
+                    continue
+                root = schema.get_root_type(operation.operation)
+                if root is None:
+                    continue
+                cost = estimate_cost(schema, operation.selection_set, root, fragments, variables)
+                costs[operation_key(operation)] = cost
+                if max_cost is not None and cost > max_cost:
+                    self.report_error(
+                        GraphQLError(
+                            f"Operation '{operation_key(operation)}' has a cost of {cost}, "
+                            f"which exceeds the maximum cost of {max_cost}.",
+                            operation,
+                            extensions={"code": "QUERY_TOO_COSTLY", "cost": cost},
+                        )
+                    )
+            if callable(callback):
+                callback(costs)
+
+    return CostLimitValidator
+
+
+class TokenBuckets:
+    """
+    Per-client token buckets in a Django cache.
+
+    Each client's bucket holds up to CAPACITY tokens and refills at
+    REFILL_RATE tokens per second; clients without a budget of their own
+    get the "default" budget. A bucket's read-modify-write runs under a
+    per-client lock taken with `cache.add`, so concurrent workers sharing
+    the cache cannot lose each other's updates. A lock left by a crashed
+    worker expires after `lock_timeout` seconds.
+    """
+
+    def __init__(self, budgets, cache_alias="default", lock_timeout=2, poll_interval=0.001):
+        self.budgets = budgets
+        self.cache = caches[cache_alias]
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+
+    def budget(self, client):
+        return self.budgets.get(client) or self.budgets["default"]
+
+    @contextmanager
+    def locked(self, key):
+        lock_key = key + BUDGET_LOCK_SUFFIX
+        with self._lock:
+            while not self.cache.add(lock_key, 1, self.lock_timeout):
+                time.sleep(self.poll_interval)
+            try:
+                yield
+            finally:
+                self.cache.delete(lock_key)
+
+    def _take(self, client, tokens):
+        budget = self.budget(client)
+        capacity, rate = budget["CAPACITY"], budget["REFILL_RATE"]
+        key = BUDGET_KEY_PREFIX + client
+        with self.locked(key):
+            now = time.time()
+            level, updated = self.cache.get(key) or (capacity, now)
+            level = min(capacity, level + (now - updated) * rate)
+            allowed = tokens <= level
+            if allowed:
+                level -= tokens
+            self.cache.set(key, (min(level, capacity), now), None)
+        return allowed, level, capacity, rate
+
+    def consume(self, client, tokens):
+        """
+        Take `tokens` from the client's bucket. Returns `(allowed,
+        remaining, retry_after)`; retry_after is None when the request
+        can never fit the bucket. A negative cost is charged as 0 and
+        never refills the bucket.
+        """
+        tokens = max(tokens, 0)
+        allowed, level, capacity, rate = self._take(client, tokens)
+        if allowed:
+            return True, level, 0
+        if tokens > capacity or not rate:
+            return False, level, None
+        return False, level, (tokens - level) / rate
+
+    def refund(self, client, tokens):
+        if tokens > 0:
+            self._take(client, -tokens)
+
+
+def build_token_buckets():
+    budgets = cost_option("BUDGETS")
+    if not budgets:
+        return None
+    return TokenBuckets(budgets, cost_option("BUDGET_CACHE", "default"))
+
+
+token_buckets = build_token_buckets()
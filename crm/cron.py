@@ -1,36 +1,197 @@
 import datetime
-import os
+import json
+import logging
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
 import requests
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+from django.conf import settings
+from django.db import connection, transaction
+
+from alx_backend_graphql.schema import schema
+
+from .events import emit
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_QUERY = "{ hello }"
+
+LOW_STOCK_MUTATION = """
+mutation {
+    updateLowStockProducts {
+        products {
+            id
+            name
+            stock
+        }
+        message
+    }
+}
+"""
+
+_session = None
+
+
+def cron_option(name, default=None):
+    return getattr(settings, "CRM_CRON", {}).get(name, default)
+
+
+class JobTimeout(Exception):
+    """
+    The job ran past its deadline; its transaction is rolled back.
+    """
+
+
+@contextmanager
+def job_deadline(timeout):
+    """
+    Stop the SQL of the current transaction once `timeout` seconds have
+    passed. Every statement checks the deadline before it starts, and the
+    database interrupts one that is still running then: with
+    `SET LOCAL statement_timeout` on PostgreSQL and a progress handler on
+    SQLite. Yields a callable telling whether the deadline has passed.
+    """
+    deadline = time.monotonic() + timeout
+
+    def expired():
+        return time.monotonic() >= deadline
+
+    def check(execute, sql, params, many, context):
+        if expired():
+            raise JobTimeout(f"Timed out after {timeout}s")
+        return execute(sql, params, many, context)
+
+    connection.ensure_connection()
+    with connection.execute_wrapper(check):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = %s", [max(int(timeout * 1000), 1)])
+        elif connection.vendor == "sqlite":
+            connection.connection.set_progress_handler(expired, 10000)
+        try:
+            yield expired
+        finally:
+            if connection.vendor == "sqlite":
+                connection.connection.set_progress_handler(None, 0)
+
+
+def run_job(name, document, variables=None, timeout=None):
+    """
+    Execute a GraphQL document against the schema in this process and log
+    the outcome as one JSON line on the `crm.cron` logger.
+
+    The document runs in one transaction limited to `timeout` seconds by
+    `job_deadline`. A job that fails or runs out of time is rolled back,
+    so the status logged always matches what was committed.
+
+    Returns a dict with `job`, `status` ("ok", "error" or "timeout"),
+    `duration_ms`, `data` and `errors`.
+    """
+    timeout = timeout or cron_option("TIMEOUT", 60)
+    result = {"job": name, "mode": "in-process", "data": None, "errors": []}
+    start = time.perf_counter()
+    timed_out = False
+    try:
+        with transaction.atomic(), job_deadline(timeout) as expired:
+            execution = schema.execute(
+                document, variable_values=variables, context_value=SimpleNamespace()
+            )
+            # decided before the commit, so a late commit is never reported as a timeout
+            timed_out = expired()
+            if execution.errors or timed_out:
+                transaction.set_rollback(True)
+    except Exception as e:
+        execution = None
+        timed_out = isinstance(e, JobTimeout)
+        result["errors"] = [str(e)]
+
+    if timed_out:
+        result["status"] = "timeout"
+        result["errors"] = [f"Timed out after {timeout}s"]
+    elif execution is None:
+        result["status"] = "error"
+    else:
+        result["data"] = execution.data
+        result["errors"] = [error.message for error in execution.errors or []]
+        result["status"] = "error" if execution.errors else "ok"
+    result["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    log = logger.info if result["status"] == "ok" else logger.error
+    log(json.dumps(result, default=str))
+    return result
+
+
+def get_session():
+    """
+    Shared requests session, so repeated probes reuse the connection.
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.headers["X-GraphQL-Client"] = "crm-cron"
+    return _session
+
+
+def probe_graphql_endpoint(url=None, timeout=None):
+    """
+    Opt-in HTTP health probe: POST the heartbeat query to the running
+    server with connect and read timeouts. Returns a result dict like
+    `run_job` with the `status_code`.
+    """
+    url = url or cron_option("GRAPHQL_URL", "http://localhost:8000/graphql")
+    timeout = timeout or cron_option("HTTP_TIMEOUT", (3, 10))
+    result = {"job": "graphql_http_probe", "mode": "http", "status_code": None, "errors": []}
+    start = time.perf_counter()
+    try:
+        response = get_session().post(url, json={"query": HEARTBEAT_QUERY}, timeout=timeout)
+        result["status_code"] = response.status_code
+        result["status"] = "ok" if response.status_code == 200 else "error"
+    except requests.RequestException as e:
+        result["status"] = "error"
+        result["errors"] = [str(e)]
+    result["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    log = logger.info if result["status"] == "ok" else logger.error
+    log(json.dumps(result))
+    return result
+
 
 def log_crm_heartbeat():
     """
     Logs a heartbeat message every 5 minutes to confirm the CRM system is active.
-    Optionally checks the GraphQL endpoint for responsiveness.
+    Checks that the GraphQL schema answers, and probes the HTTP endpoint
+    as well when CRM_CRON["HTTP_PROBE"] is set.
     """
     log_file = '/tmp/crm_heartbeat_log.txt'
     timestamp = datetime.datetime.now().strftime("%d/%m/%Y-%H:%M:%S")
 
     # Write heartbeat message
-    with open(log_file, 'a') as f:
-        f.write(f"{timestamp} CRM is alive\n")
+    emit("crm.heartbeat", log_file, f"{timestamp} CRM is alive")
 
-    # Optional: test GraphQL hello query for endpoint health
-    try:
-        response = requests.post(
-            'http://localhost:8000/graphql/',
-            json={'query': '{ hello }'}
-        )
-        if response.status_code == 200:
-            with open(log_file, 'a') as f:
-                f.write(f"{timestamp} GraphQL endpoint responsive\n")
+    result = run_job("heartbeat", HEARTBEAT_QUERY)
+    if result["status"] == "ok":
+        line = f"{timestamp} GraphQL schema responsive"
+    else:
+        line = f"{timestamp} GraphQL schema error: {'; '.join(result['errors'])}"
+    emit("crm.schema_check", log_file, line, status=result["status"], duration_ms=result["duration_ms"])
+
+    if cron_option("HTTP_PROBE", False):
+        probe = probe_graphql_endpoint()
+        if probe["status"] == "ok":
+            line = f"{timestamp} GraphQL endpoint responsive"
+        elif probe["status_code"]:
+            line = f"{timestamp} GraphQL endpoint error: {probe['status_code']}"
         else:
-            with open(log_file, 'a') as f:
-                f.write(f"{timestamp} GraphQL endpoint error: {response.status_code}\n")
-    except Exception as e:
-        with open(log_file, 'a') as f:
-            f.write(f"{timestamp} Error checking GraphQL endpoint: {e}\n")
+            line = f"{timestamp} Error checking GraphQL endpoint: {probe['errors'][0]}"
+        emit(
+            "crm.http_probe",
+            log_file,
+            line,
+            status=probe["status"],
+            status_code=probe["status_code"],
+            duration_ms=probe["duration_ms"],
+        )
 
 
 def update_low_stock():
@@ -40,39 +201,23 @@ def update_low_stock():
     """
     log_file = '/tmp/low_stock_updates_log.txt'
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    mutation = """
-    mutation {
-        updateLowStockProducts {
-            products {
-                id
-                name
-                stock
-            }
-            message
-        }
-    }
-    """
-    
-    try:
-        response = requests.post(
-            'http://localhost:8000/graphql/',
-            json={'query': mutation}
+
+    result = run_job("update_low_stock", LOW_STOCK_MUTATION)
+    if result["status"] != "ok":
+        emit(
+            "cron.low_stock_failed",
+            log_file,
+            f"[{timestamp}] Error updating low stock: {'; '.join(result['errors'])}",
+            errors=result["errors"],
+        )
+        return
+    data = result["data"].get('updateLowStockProducts') or {}
+    emit("cron.low_stock", log_file, f"[{timestamp}] {data.get('message', '')}")
+    for product in data.get('products') or []:
+        emit(
+            "cron.product_restocked",
+            log_file,
+            f"[{timestamp}] Updated Product: {product['name']}, New Stock: {product['stock']}",
+            product_id=product["id"],
+            stock=product["stock"],
         )
-        
-        if response.status_code == 200:
-            data = response.json()
-            result = data.get('data', {}).get('updateLowStockProducts', {})
-            products = result.get('products', [])
-            message = result.get('message', '')
-            
-            with open(log_file, 'a') as f:
-                f.write(f"[{timestamp}] {message}\n")
-                for product in products:
-                    f.write(f"[{timestamp}] Updated Product: {product['name']}, New Stock: {product['stock']}\n")
-        else:
-            with open(log_file, 'a') as f:
-                f.write(f"[{timestamp}] Error: HTTP {response.status_code}\n")
-    except Exception as e:
-        with open(log_file, 'a') as f:
-            f.write(f"[{timestamp}] Error updating low stock: {e}\n")
@@ -2,68 +2,46 @@
 """
 send_order_reminders.py
 
-This script queries the GraphQL endpoint to find orders placed within the
-last 7 days and logs reminders for each order.
+Sends one reminder per customer for orders placed within the last 7 days
+that have not been reminded yet. Orders are streamed from the database
+and dispatched as batches of Celery tasks (see crm/reminders.py); an
+interrupted run resumes where it stopped on the next invocation.
 
 Author: ALX Backend Developer
 """
 
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
-from datetime import datetime, timedelta
+import os
+import sys
+from datetime import datetime
 
-# GraphQL endpoint
-GRAPHQL_URL = "http://localhost:8000/graphql"
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql.settings")
 
-# Calculate the date range (last 7 days)
-today = datetime.now().date()
-seven_days_ago = today - timedelta(days=7)
+import django  # noqa: E402
 
-# Define the GraphQL query
-query = gql("""
-query RecentOrders($startDate: Date!) {
-  allOrders(orderDate_Gte: $startDate) {
-    edges {
-      node {
-        id
-        customer {
-          email
-        }
-      }
-    }
-  }
-}
-""")
+django.setup()
 
-# Define variables for the query
-variables = {"startDate": str(seven_days_ago)}
+from crm.events import emit  # noqa: E402
+from crm.reminders import queue_order_reminders  # noqa: E402
+
+LOG_FILE = "/tmp/order_reminders_log.txt"
 
 try:
-    # Setup transport and client
-    transport = RequestsHTTPTransport(url=GRAPHQL_URL)
-    client = Client(transport=transport, fetch_schema_from_transport=False)
-    
-    # Execute the query
-    result = client.execute(query, variable_values=variables)
-    
-    # Extract order data
-    orders = result.get("allOrders", {}).get("edges", [])
+    queued = queue_order_reminders()
 
-    # Open the log file
-    with open("/tmp/order_reminders_log.txt", "a") as log_file:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        if orders:
-            for edge in orders:
-                order = edge.get("node", {})
-                order_id = order.get("id")
-                customer_email = order.get("customer", {}).get("email", "N/A")
-                log_file.write(f"[{timestamp}] Reminder: Order ID {order_id}, Customer: {customer_email}\n")
-        else:
-            log_file.write(f"[{timestamp}] No pending orders found in the last 7 days.\n")
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if not queued:
+        emit("order.reminders_idle", LOG_FILE, f"[{timestamp}] No pending orders found in the last 7 days.")
+    emit("order.reminders_queued", queued=queued)
 
     print("Order reminders processed!")
 
 except Exception as e:
-    with open("/tmp/order_reminders_log.txt", "a") as log_file:
-        log_file.write(f"[{datetime.now()}] Error processing reminders: {e}\n")
+    emit(
+        "order.reminders_failed",
+        LOG_FILE,
+        f"[{datetime.now()}] Error processing reminders: {e}",
+        error=str(e),
+    )
     print("An error occurred while processing order reminders.")
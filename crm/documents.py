@@ -0,0 +1,132 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.core.cache import caches
+
+from .conf import graphene_option
+
+APQ_KEY_PREFIX = "crm:apq:"
+
+
+class DocumentCache:
+    """
+    Thread-safe LRU of parsed and validated DocumentNodes keyed by the
+    sha256 of the query text, with hit, miss and eviction counters.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            document = self._documents.get(key)
+            if document is None:
+                self.misses += 1
+                return None
+            self._documents.move_to_end(key)
+            self.hits += 1
+            return document
+
+    def set(self, key, document):
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._documents),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class PersistedQueryError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def load_allow_list(path):
+    """
+    Load an operation manifest mapping sha256 hashes to query text.
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+def get_persisted_query_options():
+    return graphene_option("PERSISTED_QUERIES", {})
+
+
+def resolve_persisted_query(query, extensions):
+    """
+    Apply automatic persisted queries to a request.
+
+    Returns the query text to run, its sha256 and whether the text should
+    be registered under that hash: a hash-only request is looked up in
+    the registry, while the text of a request carrying both is only
+    registered, with `register_persisted_query`, once it has parsed,
+    validated and passed the cost check. In allow-list mode only
+    documents from the manifest run.
+    """
+    if isinstance(extensions, str):
+        extensions = json.loads(extensions)
+    persisted = (extensions or {}).get("persistedQuery") or {}
+    sent_hash = persisted.get("sha256Hash")
+    options = get_persisted_query_options()
+    allow_list_path = options.get("ALLOW_LIST")
+
+    if allow_list_path:
+        allowed = load_allow_list(allow_list_path)
+        key = sent_hash or (query_hash(query) if query else None)
+        if key not in allowed:
+            raise PersistedQueryError("PersistedQueryNotAllowed", "PERSISTED_QUERY_NOT_ALLOWED")
+        return allowed[key], key, False
+
+    if not sent_hash:
+        return query, query_hash(query) if query else None, False
+
+    if query:
+        if query_hash(query) != sent_hash:
+            raise PersistedQueryError("provided sha does not match query", "INTERNAL_SERVER_ERROR")
+        return query, sent_hash, True
+
+    query = caches[options.get("CACHE", "default")].get(APQ_KEY_PREFIX + sent_hash)
+    if query is None:
+        raise PersistedQueryError("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+    return query, sent_hash, False
+
+
+def register_persisted_query(key, query):
+    """
+    Store `query` under its sha256 `key` for TIMEOUT seconds.
+    """
+    options = get_persisted_query_options()
+    caches[options.get("CACHE", "default")].set(
+        APQ_KEY_PREFIX + key, query, options.get("TIMEOUT", 86400)
+    )
+
+
+document_cache = DocumentCache(graphene_option("DOCUMENT_CACHE_SIZE", 256))
@@ -0,0 +1,222 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def events_option(name, default=None):
+    return getattr(settings, "CRM_EVENTS", {}).get(name, default)
+
+
+# ---------- Sinks ----------
+class TextLogSink:
+    """
+    Append the human-readable `line` of events to their `log_file`, opening
+    each file once per batch.
+    """
+
+    def write(self, events):
+        lines = defaultdict(list)
+        for event in events:
+            if event.get("log_file"):
+                lines[event["log_file"]].append(event["line"])
+        for path, file_lines in lines.items():
+            with open(path, "a") as f:
+                f.write("".join(f"{line}\n" for line in file_lines))
+
+
+class JSONLinesSink:
+    """
+    Newline-delimited JSON file, rotated to `path.1` .. `path.<backup_count>`
+    once it grows past `max_bytes`.
+    """
+
+    def __init__(self, path=None, max_bytes=None, backup_count=None):
+        self.path = path or events_option("PATH", "/tmp/crm_events.ndjson")
+        self.max_bytes = max_bytes or events_option("MAX_BYTES", 10 * 1024 * 1024)
+        self.backup_count = backup_count if backup_count is not None else events_option(
+            "BACKUP_COUNT", 5
+        )
+
+    def rotate(self):
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def write(self, events):
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            self.rotate()
+        with open(self.path, "a") as f:
+            for event in events:
+                record = {"kind": event["kind"], "at": event["at"].isoformat(), **event["data"]}
+                if event.get("line"):
+                    record["message"] = event["line"]
+                f.write(json.dumps(record, default=str) + "\n")
+
+
+class DatabaseSink:
+    """
+    `ActivityEvent` rows, one INSERT per batch.
+    """
+
+    def write(self, events):
+        from .models import ActivityEvent
+
+        try:
+            ActivityEvent.objects.bulk_create(
+                ActivityEvent(kind=event["kind"], created_at=event["at"], data=event["data"])
+                for event in events
+            )
+        except DatabaseError:
+            # drop the writer's connection so the next batch reconnects
+            connection.close()
+            raise
+
+    def close(self):
+        connection.close()
+
+
+# ---------- Writer ----------
+class EventLog:
+    """
+    Write-behind event log.
+
+    `emit` only puts the event on a bounded queue; a background thread
+    drains it and hands the sinks batches of up to `batch_size` events at
+    least every `flush_interval` seconds. When the queue is full, events
+    are dropped and counted rather than blocking the caller. The thread is
+    started on first use in each process, so forked workers get their own.
+    """
+
+    def __init__(self, sinks, batch_size=200, flush_interval=1.0, queue_size=10000):
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_writer(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue(self.queue_size)
+                self._thread = threading.Thread(target=self._run, name="crm-events", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def emit(self, kind, log_file=None, line=None, **data):
+        """
+        Queue an event once the current transaction commits (immediately
+        outside one). `log_file` and `line` feed the text log sink.
+        """
+        event = {"kind": kind, "at": timezone.now(), "data": data}
+        if log_file:
+            event["log_file"] = log_file
+            event["line"] = line
+        transaction.on_commit(lambda: self.put(event))
+
+    def put(self, event):
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            metrics.inc("crm_events_dropped_total", (("kind", event["kind"]),))
+
+    def _write(self, batch):
+        for sink in self.sinks:
+            try:
+                sink.write(batch)
+            except Exception:
+                logger.exception("Event sink %s failed, %d events lost", type(sink).__name__, len(batch))
+        metrics.inc("crm_events_written_total", value=len(batch))
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                event = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                event = None
+            if event is _STOP or isinstance(event, threading.Event):
+                if batch:
+                    self._write(batch)
+                    batch = []
+                if event is _STOP:
+                    for sink in self.sinks:
+                        getattr(sink, "close", lambda: None)()
+                    return
+                event.set()
+            elif event is not None:
+                batch.append(event)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._write(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def flush(self, timeout=5):
+        """
+        Block until every event queued so far has been written.
+        """
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done, timeout=timeout)
+        done.wait(timeout)
+
+    def close(self, timeout=5):
+        """
+        Write the remaining events and stop the writer thread.
+        """
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP, timeout=timeout)
+        self._thread.join(timeout)
+
+
+def build_event_log():
+    sinks = [
+        import_string(path)()
+        for path in events_option(
+            "SINKS",
+            ["crm.events.TextLogSink", "crm.events.JSONLinesSink", "crm.events.DatabaseSink"],
+        )
+    ]
+    return EventLog(
+        sinks,
+        batch_size=events_option("BATCH_SIZE", 200),
+        flush_interval=events_option("FLUSH_INTERVAL", 1.0),
+        queue_size=events_option("QUEUE_SIZE", 10000),
+    )
+
+
+event_log = build_event_log()
+atexit.register(event_log.close)
+
+
+def emit(kind, log_file=None, line=None, **data):
+    event_log.emit(kind, log_file, line, **data)
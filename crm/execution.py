@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from graphql import OperationType
+
+from .conf import graphene_option
+from .tracing import TracingExecutionContext
+
+# each pool thread holds its own database connection, so the pool size also
+# caps the connections used by async requests
+resolver_pool = ThreadPoolExecutor(
+    max_workers=graphene_option("ASYNC_THREAD_POOL_SIZE", 8),
+    thread_name_prefix="crm-graphql",
+)
+
+
+def _call_with_connection(func, args, kwargs):
+    # pool threads outlive requests, so apply the request_started and
+    # request_finished connection handling around each call
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_pool(func, *args, **kwargs):
+    """
+    Run the synchronous `func` in the bounded resolver pool and await it.
+    """
+    return await sync_to_async(
+        _call_with_connection, thread_sensitive=False, executor=resolver_pool
+    )(func, args, kwargs)
+
+
+class ConcurrentExecutionContext(TracingExecutionContext):
+    """
+    Execution context for the async view.
+
+    Each root field of a query is resolved, with everything below it, in the
+    resolver pool, so sibling root fields run concurrently and the event loop
+    never touches the ORM. Mutations keep graphql-core's serial execution.
+    """
+
+    def execute_field(self, parent_type, source, field_nodes, path):
+        if path.prev is not None or self.operation.operation != OperationType.QUERY:
+            return super().execute_field(parent_type, source, field_nodes, path)
+        return self.execute_root_field(parent_type, source, field_nodes, path)
+
+    async def execute_root_field(self, parent_type, source, field_nodes, path):
+        result = await run_in_pool(super().execute_field, parent_type, source, field_nodes, path)
+        # native async resolvers hand back an awaitable to finish on the loop
+        if self.is_awaitable(result):
+            result = await result
+        return result
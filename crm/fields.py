@@ -0,0 +1,51 @@
+from graphene_django.filter import DjangoFilterConnectionField
+from promise import Promise
+
+from .loaders import get_loaders
+from .optimizer import optimize_queryset
+
+
+class CRMFilterConnectionField(DjangoFilterConnectionField):
+    """
+    DjangoFilterConnectionField that shapes its queryset to the requested
+    fields and registers the nodes of each page with the request's loaders,
+    so nested relations the optimizer did not cover are fetched in batches.
+    """
+
+    @classmethod
+    def resolve_queryset(cls, connection, iterable, info, args, **kwargs):
+        queryset = super().resolve_queryset(connection, iterable, info, args, **kwargs)
+        return optimize_queryset(queryset, info)
+
+    @classmethod
+    def connection_resolver(
+        cls,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        enforce_first_or_last,
+        root,
+        info,
+        **args,
+    ):
+        result = super().connection_resolver(
+            resolver,
+            connection,
+            default_manager,
+            queryset_resolver,
+            max_limit,
+            enforce_first_or_last,
+            root,
+            info,
+            **args,
+        )
+
+        def register_page(page):
+            get_loaders(info).register(edge.node for edge in page.edges)
+            return page
+
+        if Promise.is_thenable(result):
+            return Promise.resolve(result).then(register_page)
+        return register_page(result)
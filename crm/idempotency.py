@@ -0,0 +1,88 @@
+import hashlib
+
+from django.core.cache import caches
+
+from .conf import graphene_option
+
+IDEMPOTENCY_KEY_PREFIX = "crm:idempotency:"
+
+CLAIMED = "claimed"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+
+
+def idempotency_option(name, default=None):
+    return graphene_option("IDEMPOTENCY", {}).get(name, default)
+
+
+class IdempotencyConflict(Exception):
+    """
+    The key was used before for a different request.
+    """
+
+
+class IdempotencyStore:
+    """
+    Responses of requests sent with an idempotency key, in a Django cache.
+
+    The first request claims the key with an atomic `add` that expires
+    after `lock_timeout` seconds, so a crashed worker cannot hold it
+    forever; its response then replaces the claim for `ttl` seconds.
+    The cache must be shared by every worker for duplicates sent to
+    different processes to be caught.
+    """
+
+    def __init__(self, cache_alias="default", ttl=86400, lock_timeout=60):
+        self.cache = caches[cache_alias]
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+
+    def make_key(self, key):
+        return IDEMPOTENCY_KEY_PREFIX + hashlib.sha256(key.encode()).hexdigest()
+
+    def claim(self, key, fingerprint):
+        """
+        Return `(CLAIMED, None)` when this request should run,
+        `(IN_PROGRESS, None)` while another one holds the key and
+        `(DONE, entry)` once its response is stored. Raises
+        IdempotencyConflict when `fingerprint` differs from the first
+        request's.
+        """
+        cache_key = self.make_key(key)
+        if self.cache.add(cache_key, {"fingerprint": fingerprint}, self.lock_timeout):
+            return CLAIMED, None
+        entry = self.cache.get(cache_key)
+        if entry is None:
+            # expired between the two calls; the caller tries again
+            return IN_PROGRESS, None
+        if entry["fingerprint"] != fingerprint:
+            raise IdempotencyConflict
+        return (DONE, entry) if "content" in entry else (IN_PROGRESS, None)
+
+    def finish(self, key, fingerprint, response):
+        self.cache.set(
+            self.make_key(key),
+            {
+                "fingerprint": fingerprint,
+                "status": response.status_code,
+                "content": response.content,
+                "content_type": response["Content-Type"],
+            },
+            self.ttl,
+        )
+
+    def release(self, key):
+        self.cache.delete(self.make_key(key))
+
+
+def build_idempotency_store():
+    if not idempotency_option("ENABLED", False):
+        return None
+    return IdempotencyStore(
+        idempotency_option("CACHE", "default"),
+        idempotency_option("TTL", 86400),
+        idempotency_option("LOCK_TIMEOUT", 60),
+    )
+
+
+idempotency_store = build_idempotency_store()
@@ -0,0 +1,98 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+
+from .models import Product
+from .response_cache import invalidate_models
+
+
+def restock_batch(threshold, increment, after=0, limit=None, upto=None):
+    """
+    Lock up to `limit` low-stock products with ids above `after` (and up to
+    `upto`), skipping rows another transaction holds, and restock them with
+    one UPDATE.
+
+    Returns the restocked products in id order.
+    """
+    with transaction.atomic():
+        locked = (
+            Product.objects.select_for_update(skip_locked=True)
+            .filter(stock__lt=threshold, pk__gt=after)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        if upto is not None:
+            locked = locked.filter(pk__lte=upto)
+        ids = list(locked[:limit] if limit else locked)
+        if not ids:
+            return []
+        Product.objects.filter(pk__in=ids).update(stock=F("stock") + increment)
+        invalidate_models(Product)
+        return list(Product.objects.filter(pk__in=ids).order_by("pk"))
+
+
+def restock_low_stock(threshold=10, increment=10, batch_size=None):
+    """
+    Add `increment` to the stock of every product below `threshold`.
+
+    Without `batch_size` the whole catalog is restocked in one transaction;
+    with it, products are processed in id order in transactions of at most
+    `batch_size` rows so locks are never held for long.
+    """
+    if not batch_size:
+        return restock_batch(threshold, increment)
+
+    restocked = []
+    while batch := restock_batch(
+        threshold, increment, after=restocked[-1].pk if restocked else 0, limit=batch_size
+    ):
+        restocked.extend(batch)
+    return restocked
+
+
+def order_quantities(product_ids=None, lines=None):
+    """
+    Merge `product_ids` (one of each) and `lines` (`product_id`,
+    `quantity`) into `{product_id: quantity}`.
+    """
+    quantities = {}
+    try:
+        for pk in product_ids or []:
+            quantities.setdefault(int(pk), 1)
+        for line in lines or []:
+            if line["quantity"] <= 0:
+                raise ValidationError("Quantity must be positive")
+            pk = int(line["product_id"])
+            quantities[pk] = quantities.get(pk, 0) + line["quantity"]
+    except (TypeError, ValueError):
+        raise ValidationError("Invalid product IDs")
+    return quantities
+
+
+def reserve_stock(quantities):
+    """
+    Take `{product_id: quantity}` out of stock, all or nothing.
+
+    One conditional `UPDATE ... SET stock = stock - qty WHERE stock >= qty`
+    covers every product, so concurrent checkouts serialize on the product
+    rows alone and can never take stock below zero. If any product is
+    short, its savepoint is rolled back and ValidationError names them.
+    """
+    if not quantities:
+        return
+    wanted = Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        output_field=PositiveIntegerField(),
+    )
+    with transaction.atomic():
+        reserved = Product.objects.filter(pk__in=quantities, stock__gte=wanted).update(
+            stock=F("stock") - wanted
+        )
+        if reserved == len(quantities):
+            invalidate_models(Product)
+            return
+        transaction.set_rollback(True)
+
+    short = Product.objects.filter(pk__in=quantities, stock__lt=wanted).order_by("pk")
+    names = ", ".join(f"{product.name} ({product.stock} left)" for product in short)
+    raise ValidationError(f"Insufficient stock for {names}" if names else "Insufficient stock")
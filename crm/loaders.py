@@ -0,0 +1,160 @@
+import threading
+from collections import defaultdict
+
+from .models import Customer, Order, OrderLine, Product
+from .optimizer import prefetch_attr
+
+
+class BatchLoader:
+    """
+    Synchronous DataLoader.
+
+    Keys are primed while a resolution pass walks a list of nodes and are
+    fetched together, with one query, the first time any of them is loaded.
+    Loaders that prime each other should share one re-entrant `lock`, since
+    root fields of async requests resolve in parallel threads.
+    """
+
+    def __init__(self, batch_load_fn, default_factory=None, lock=None):
+        self.batch_load_fn = batch_load_fn
+        self.default_factory = default_factory
+        self.lock = lock or threading.RLock()
+        self._cache = {}
+        self._pending = set()
+
+    def prime(self, keys):
+        with self.lock:
+            for key in keys:
+                if key is not None and key not in self._cache:
+                    self._pending.add(key)
+
+    def load(self, key):
+        with self.lock:
+            if key not in self._cache:
+                self._pending.add(key)
+                self.dispatch()
+            value = self._cache.get(key)
+        if value is None and self.default_factory is not None:
+            return self.default_factory()
+        return value
+
+    def dispatch(self):
+        keys, self._pending = list(self._pending), set()
+        if not keys:
+            return
+        results = self.batch_load_fn(keys)
+        for key in keys:
+            self._cache[key] = results.get(key)
+
+
+class CRMLoaders:
+    """
+    Per-request set of loaders for the CRM relations.
+
+    Every instance fetched through a loader (or handed to `register` by a
+    connection field) primes the loaders for its own relations, so each
+    level of a nested query costs one `IN (...)` query per relation.
+    """
+
+    def __init__(self):
+        lock = threading.RLock()
+        self.customer = BatchLoader(self._load_customers, lock=lock)
+        self.order_products = BatchLoader(
+            self._load_order_products, default_factory=list, lock=lock
+        )
+        self.customer_orders = BatchLoader(
+            self._load_customer_orders, default_factory=list, lock=lock
+        )
+        self.product_orders = BatchLoader(
+            self._load_product_orders, default_factory=list, lock=lock
+        )
+        self.order_lines = BatchLoader(self._load_order_lines, default_factory=list, lock=lock)
+        self.product_lines = BatchLoader(
+            self._load_product_lines, default_factory=list, lock=lock
+        )
+
+    def register(self, instances):
+        for obj in instances:
+            if isinstance(obj, Order):
+                # the optimizer may have deferred the column
+                if "customer_id" not in obj.get_deferred_fields():
+                    self.customer.prime([obj.customer_id])
+                self.order_products.prime([obj.pk])
+                self.order_lines.prime([obj.pk])
+            elif isinstance(obj, Customer):
+                self.customer_orders.prime([obj.pk])
+            elif isinstance(obj, Product):
+                self.product_orders.prime([obj.pk])
+                self.product_lines.prime([obj.pk])
+        return instances
+
+    def _load_customers(self, keys):
+        customers = Customer.objects.in_bulk(keys)
+        self.register(customers.values())
+        return customers
+
+    def _load_order_products(self, keys):
+        through = Order.products.through.objects.filter(order_id__in=keys)
+        return self._group(through.select_related("product"), "order_id", "product")
+
+    def _load_customer_orders(self, keys):
+        grouped = defaultdict(list)
+        orders = list(Order.objects.filter(customer_id__in=keys).order_by("pk"))
+        for order in orders:
+            grouped[order.customer_id].append(order)
+        self.register(orders)
+        return grouped
+
+    def _load_product_orders(self, keys):
+        through = Order.products.through.objects.filter(product_id__in=keys)
+        return self._group(through.select_related("order"), "product_id", "order")
+
+    def _load_order_lines(self, keys):
+        grouped = defaultdict(list)
+        lines = list(OrderLine.objects.filter(order_id__in=keys).select_related("product").order_by("pk"))
+        for line in lines:
+            grouped[line.order_id].append(line)
+        self.register(line.product for line in lines)
+        return grouped
+
+    def _load_product_lines(self, keys):
+        grouped = defaultdict(list)
+        lines = OrderLine.objects.filter(product_id__in=keys).select_related("product")
+        for line in lines.order_by("pk"):
+            grouped[line.product_id].append(line)
+        return grouped
+
+    def _group(self, rows, key_attr, value_attr):
+        grouped = defaultdict(list)
+        values = []
+        for row in rows.order_by(f"{value_attr}_id"):
+            value = getattr(row, value_attr)
+            grouped[getattr(row, key_attr)].append(value)
+            values.append(value)
+        self.register(values)
+        return grouped
+
+
+def get_loaders(info):
+    """
+    Return the loaders bound to the current request, creating them on first use.
+    """
+    context = info.context
+    if context is None:
+        return CRMLoaders()
+    loaders = getattr(context, "crm_loaders", None)
+    if loaders is None:
+        loaders = CRMLoaders()
+        setattr(context, "crm_loaders", loaders)
+    return loaders
+
+
+def load_related(info, instance, name, loader_name):
+    """
+    Return the `name` relation of `instance`, preferring results the query
+    optimizer already prefetched over a batched loader lookup.
+    """
+    prefetched = getattr(instance, prefetch_attr(name), None)
+    if prefetched is not None:
+        return prefetched
+    return getattr(get_loaders(info), loader_name).load(instance.pk)
@@ -0,0 +1,21 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from crm.rollups import backfill
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily reporting rollups from the order and customer tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days-per-chunk", type=int, default=31)
+        parser.add_argument("--start", type=date.fromisoformat, help="First day, YYYY-MM-DD.")
+        parser.add_argument("--end", type=date.fromisoformat, help="Day after the last one.")
+
+    def handle(self, *args, days_per_chunk, start, end, **options):
+        chunks = 0
+        for chunk_start, chunk_end in backfill(days_per_chunk, start=start, end=end):
+            chunks += 1
+            self.stdout.write(f"Rebuilt rollups for {chunk_start} to {chunk_end}")
+        self.stdout.write(self.style.SUCCESS(f"Backfill finished in {chunks} chunks"))
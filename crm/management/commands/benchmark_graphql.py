@@ -0,0 +1,125 @@
+import random
+import resource
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from crm.benchmark import (
+    WORKLOADS,
+    BenchmarkError,
+    Dataset,
+    GraphQLClient,
+    benchmark_option,
+    compare,
+    load_baseline,
+    measure,
+    save_baseline,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run representative GraphQL and report workloads in process against the current "
+        "database and report p50/p99 latency, SQL queries and peak memory per operation, "
+        "compared with a stored baseline. Fill the database with generate_crm_data first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "workloads", nargs="*", metavar="workload", help=f"Default: all of {', '.join(sorted(WORKLOADS))}."
+        )
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--memory-iterations", type=int, default=5, help="Runs under tracemalloc; 0 skips them."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--baseline", default=benchmark_option("BASELINE"))
+        parser.add_argument(
+            "--save-baseline", action="store_true", help="Store these results as the baseline."
+        )
+        parser.add_argument(
+            "--tolerance", type=float, default=benchmark_option("TOLERANCE", 0.2),
+            help="Allowed slowdown against the baseline, as a fraction.",
+        )
+        parser.add_argument(
+            "--response-cache", action="store_true", help="Keep the response cache enabled."
+        )
+        parser.add_argument(
+            "--check", action="store_true", help="Exit with an error when a workload regressed."
+        )
+
+    def handle(self, *args, workloads, iterations, warmup, memory_iterations, seed, **options):
+        if iterations <= 0:
+            raise CommandError("--iterations must be positive.")
+        unknown = set(workloads) - set(WORKLOADS)
+        if unknown:
+            raise CommandError(f"Unknown workloads: {', '.join(sorted(unknown))}")
+        dataset = Dataset(random.Random(seed))
+        client = GraphQLClient(response_cache=options["response_cache"])
+        baseline = load_baseline(options["baseline"]) if options["baseline"] else None
+
+        report = {"vendor": connection.vendor, "dataset": dataset.counts, "workloads": {}}
+        self.stdout.write(
+            f"{connection.vendor}: {dataset.counts['customers']} customers, "
+            f"{dataset.counts['products']} products, {dataset.counts['orders']} orders"
+        )
+        if baseline and (baseline["vendor"], baseline["dataset"]) != (connection.vendor, dataset.counts):
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Baseline was measured on {baseline['vendor']} with {baseline['dataset']}; "
+                    "comparisons are only indicative."
+                )
+            )
+        self.stdout.write(
+            f"{'workload':<24}{'p50 ms':>10}{'p99 ms':>10}{'queries':>10}{'peak KiB':>10}"
+        )
+
+        regressions = {}
+        for name in workloads or sorted(WORKLOADS):
+            workload = WORKLOADS[name]
+            if not workload.ready(dataset):
+                self.stdout.write(f"{name:<24}skipped, not enough data")
+                continue
+            # one stream per workload, so running a subset draws the same arguments
+            rng = random.Random(f"{seed}:{name}")
+            try:
+                result = measure(
+                    workload, client, dataset, rng, iterations, warmup, memory_iterations
+                )
+            except BenchmarkError as e:
+                raise CommandError(f"Workload {name} failed: {e}")
+            report["workloads"][name] = result
+            self.stdout.write(
+                f"{name:<24}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                f"{result['queries']:>10.1f}{result['peak_kib'] or 0:>10.0f}"
+            )
+            previous = (baseline or {}).get("workloads", {}).get(name)
+            if previous:
+                found = compare(
+                    result, previous, options["tolerance"], benchmark_option("MIN_DELTA_MS", 1.0)
+                )
+                if found:
+                    regressions[name] = found
+                    self.stdout.write(self.style.ERROR(f"{'':<24}regressed: {', '.join(found)}"))
+
+        # ru_maxrss is in kilobytes on Linux
+        report["max_rss_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(f"Peak process RSS: {report['max_rss_kib'] / 1024:.0f} MiB")
+
+        if options["save_baseline"]:
+            if not options["baseline"]:
+                raise CommandError("Set --baseline or CRM_BENCHMARK['BASELINE'] to save a baseline.")
+            Path(options["baseline"]).parent.mkdir(parents=True, exist_ok=True)
+            save_baseline(options["baseline"], report)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+        elif baseline is None:
+            self.stdout.write("No baseline to compare with; store one with --save-baseline.")
+        elif regressions:
+            message = f"{len(regressions)} workloads regressed against {options['baseline']}"
+            if options["check"]:
+                raise CommandError(message)
+            self.stdout.write(self.style.ERROR(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
@@ -0,0 +1,103 @@
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+
+from crm.benchmark import percentile
+from crm.inventory import reserve_stock
+from crm.models import Product
+
+
+def naive_reserve(pk, quantity):
+    """
+    Read-modify-write reservation, for comparison.
+    """
+    with transaction.atomic():
+        product = Product.objects.get(pk=pk)
+        if product.stock < quantity:
+            raise ValidationError("Insufficient stock")
+        product.stock -= quantity
+        product.save(update_fields=["stock"])
+
+
+def conditional_reserve(pk, quantity):
+    with transaction.atomic():
+        reserve_stock({pk: quantity})
+
+
+MODES = {"conditional": conditional_reserve, "naive": naive_reserve}
+
+
+class Command(BaseCommand):
+    help = (
+        "Reserve one product's stock from many threads at once and report throughput, "
+        "latency, rejections and oversold units for each reservation strategy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--attempts", type=int, default=25, help="Reservations per thread.")
+        parser.add_argument("--stock", type=int, default=200)
+        parser.add_argument("--quantity", type=int, default=1)
+        parser.add_argument("--mode", choices=sorted(MODES) + ["all"], default="all")
+
+    def handle(self, *args, threads, attempts, stock, quantity, mode, **options):
+        for name in sorted(MODES) if mode == "all" else [mode]:
+            self.run(name, MODES[name], threads, attempts, stock, quantity)
+
+    def run(self, name, reserve, threads, attempts, stock, quantity):
+        product = Product.objects.create(
+            name=f"benchmark-{uuid.uuid4().hex[:8]}", price=Decimal("1.00"), stock=stock
+        )
+        counts = {"reserved": 0, "rejected": 0, "errors": 0}
+        latencies = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        def worker():
+            barrier.wait()
+            try:
+                for _ in range(attempts):
+                    start = time.perf_counter()
+                    try:
+                        reserve(product.pk, quantity)
+                        outcome = "reserved"
+                    except ValidationError:
+                        outcome = "rejected"
+                    except DatabaseError:
+                        outcome = "errors"
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        counts[outcome] += 1
+                        latencies.append(elapsed * 1000)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        product.refresh_from_db(fields=["stock"])
+        product.delete()
+        taken = counts["reserved"] * quantity
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{name} ({connection.vendor})"))
+        self.stdout.write(
+            f"  attempts={threads * attempts} reserved={counts['reserved']} "
+            f"rejected={counts['rejected']} errors={counts['errors']}"
+        )
+        self.stdout.write(
+            f"  stock {stock} -> {product.stock}, oversold={max(taken - stock, 0)} "
+            f"lost updates={taken - (stock - product.stock)}"
+        )
+        self.stdout.write(
+            f"  {threads * attempts / elapsed:.0f} reservations/s "
+            f"p50={percentile(latencies, 0.5):.1f}ms p99={percentile(latencies, 0.99):.1f}ms"
+        )
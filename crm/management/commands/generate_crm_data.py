@@ -0,0 +1,69 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from crm.synthetic import SyntheticData
+
+
+def parse_end(value):
+    end = datetime.fromisoformat(value)
+    return timezone.make_aware(end) if timezone.is_naive(end) else end
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the CRM with deterministic synthetic customers, products and orders "
+        "for load tests. Uses COPY on PostgreSQL, batched INSERTs elsewhere."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=10000)
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--orders", type=int, default=50000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--days", type=int, default=365, help="Days of history to spread rows over.")
+        parser.add_argument(
+            "--end",
+            type=parse_end,
+            help="Last moment of the history, ISO 8601; pin it for reproducible datasets.",
+        )
+        parser.add_argument("--product-skew", type=float, default=1.1, help="Zipf exponent.")
+        parser.add_argument("--customer-skew", type=float, default=0.8, help="Zipf exponent.")
+        parser.add_argument(
+            "--growth", type=float, default=2.0, help="How much busier recent days are; 1 is uniform."
+        )
+        parser.add_argument("--lines", type=float, default=3, help="Mean lines per order.")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument(
+            "--no-copy", action="store_true", help="Use batched INSERTs even on PostgreSQL."
+        )
+
+    def handle(self, *args, customers, products, orders, chunk_size, no_copy, **options):
+        if min(customers, products, orders) < 0 or chunk_size <= 0:
+            raise CommandError("Counts cannot be negative and --chunk-size must be positive.")
+        data = SyntheticData(
+            seed=options["seed"],
+            days=options["days"],
+            end=options["end"],
+            product_skew=options["product_skew"],
+            customer_skew=options["customer_skew"],
+            growth=options["growth"],
+            lines=options["lines"],
+            chunk_size=chunk_size,
+            use_copy=False if no_copy else None,
+        )
+        start = time.perf_counter()
+        created = data.generate(customers, products, orders)
+        elapsed = time.perf_counter() - start
+        rows = sum(created.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {created['customers']} customers, {created['products']} products and "
+                f"{created['orders']} orders on {connection.vendor} in {elapsed:.1f}s "
+                f"({rows / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+        )
+        self.stdout.write("Run backfill_crm_rollups to build the reporting rollups for them.")
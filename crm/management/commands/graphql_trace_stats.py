@@ -0,0 +1,50 @@
+import glob
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.tracing import load_trace_stats, tracing_option
+
+SORT_KEYS = {
+    "p95": lambda h: h.quantile(0.95),
+    "max": lambda h: h.max,
+    "mean": lambda h: h.total / h.count,
+    "total": lambda h: h.total,
+    "sql": lambda h: h.sql_count / h.count,
+}
+
+
+class Command(BaseCommand):
+    help = "Show the slowest GraphQL operations and fields recorded by the running workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=10)
+        parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="p95")
+        parser.add_argument("--stats-dir", help="Defaults to GRAPHENE['TRACING']['STATS_DIR'].")
+        parser.add_argument(
+            "--clear", action="store_true", help="Delete the recorded snapshots afterwards."
+        )
+
+    def handle(self, *args, limit, sort, stats_dir, clear, **options):
+        stats_dir = stats_dir or tracing_option("STATS_DIR")
+        if not stats_dir:
+            raise CommandError("No stats directory configured.")
+
+        stats = load_trace_stats(stats_dir)
+        for kind in ("operations", "fields"):
+            histograms = sorted(
+                stats[kind].items(), key=lambda item: SORT_KEYS[sort](item[1]), reverse=True
+            )
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Slowest {kind} by {sort}"))
+            if not histograms:
+                self.stdout.write("  nothing recorded")
+            for name, h in histograms[:limit]:
+                self.stdout.write(
+                    f"  {name:<40} count={h.count:<7} mean={h.total / h.count:.1f}ms "
+                    f"p50={h.quantile(0.5):.1f}ms p95={h.quantile(0.95):.1f}ms max={h.max:.1f}ms "
+                    f"sql/call={h.sql_count / h.count:.1f} sql={h.sql_time / h.count:.1f}ms"
+                )
+
+        if clear:
+            for path in glob.glob(os.path.join(stats_dir, "*.json")):
+                os.remove(path)
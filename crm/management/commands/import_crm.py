@@ -0,0 +1,66 @@
+import csv
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from crm.bulk import bulk_create_orders, bulk_create_products, chunked, copy_orders, copy_products
+
+
+def read_rows(path, fmt):
+    """
+    Lazily yield one dict per CSV row or NDJSON line.
+    """
+    with open(path, newline="") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream products or orders from a CSV or NDJSON file into the CRM. "
+        "Uses COPY and set-based SQL on PostgreSQL, chunked bulk_create elsewhere. "
+        "Orders get one line per product at its current price; as past orders "
+        "they do not take stock."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=["products", "orders"])
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "ndjson"])
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument(
+            "--no-copy", action="store_true", help="Use bulk_create even on PostgreSQL."
+        )
+
+    def handle(self, *args, model, path, format, chunk_size, no_copy, **options):
+        fmt = format or ("csv" if Path(path).suffix == ".csv" else "ndjson")
+        if not Path(path).exists():
+            raise CommandError(f"File not found: {path}")
+        rows = read_rows(path, fmt)
+
+        if connection.vendor == "postgresql" and not no_copy:
+            if model == "products":
+                inserted, updated, errors = copy_products(rows, chunk_size)
+                summary = f"{inserted} products inserted, {updated} updated"
+            else:
+                inserted, skipped, errors = copy_orders(rows, chunk_size)
+                summary = f"{inserted} orders inserted, {skipped} skipped"
+        else:
+            bulk_create = bulk_create_products if model == "products" else bulk_create_orders
+            inserted, errors = 0, []
+            with transaction.atomic():
+                for chunk in chunked(rows, chunk_size):
+                    created, chunk_errors = bulk_create(chunk, chunk_size=chunk_size)
+                    inserted += len(created)
+                    errors.extend(chunk_errors)
+            summary = f"{inserted} {model} inserted"
+
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(f"Import finished: {summary}, {len(errors)} errors"))
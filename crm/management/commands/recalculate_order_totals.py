@@ -0,0 +1,34 @@
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from crm.batch import run_inline
+from crm.tasks import fan_out
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Order.total_amount from the order lines (quantity times unit price), "
+        "or from current product prices for orders without lines, one id range per UPDATE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument(
+            "--fan-out",
+            action="store_true",
+            dest="dispatch",
+            help="Dispatch the id ranges to the Celery workers instead of running them here.",
+        )
+
+    def handle(self, *args, chunk_size, dispatch, **options):
+        if dispatch:
+            result = fan_out("order_totals", chunk_size=chunk_size)
+            self.stdout.write(self.style.SUCCESS(f"Dispatched order total recalculation {result.id}"))
+            return
+
+        updated = run_inline("order_totals", uuid.uuid4().hex, chunk_size).get("updated", 0)
+        if not updated:
+            self.stdout.write("No orders to recalculate")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Recalculated totals for {updated} orders"))
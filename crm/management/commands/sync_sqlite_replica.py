@@ -0,0 +1,33 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from crm.routers import replica_alias
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database onto the replica file, standing in for "
+        "replication when both aliases are local SQLite files."
+    )
+
+    def handle(self, *args, **options):
+        replica = replica_alias()
+        if replica is None:
+            raise CommandError("No replica database is configured.")
+        primary_settings = connections["default"].settings_dict
+        replica_settings = connections[replica].settings_dict
+        if "sqlite3" not in primary_settings["ENGINE"] or "sqlite3" not in replica_settings["ENGINE"]:
+            raise CommandError("Both the primary and the replica must be SQLite databases.")
+
+        connections[replica].close()
+        source = sqlite3.connect(primary_settings["NAME"])
+        target = sqlite3.connect(replica_settings["NAME"])
+        try:
+            # the backup API copies a consistent snapshot, even mid-write
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f"Copied {primary_settings['NAME']} to {replica_settings['NAME']}"))
@@ -0,0 +1,201 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+# histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+HELP = {
+    "graphql_request_duration_seconds": "GraphQL request latency by operation.",
+    "graphql_requests_total": "GraphQL requests by operation.",
+    "graphql_errors_total": "GraphQL errors returned, by operation.",
+    "graphql_sql_queries_total": "SQL queries run while executing an operation.",
+    "graphql_resolver_sql_queries_total": "SQL queries run by each traced resolver.",
+    "graphql_document_cache_hits_total": "Parsed document cache hits.",
+    "graphql_document_cache_misses_total": "Parsed document cache misses.",
+    "graphql_response_cache_hits_total": "Response cache hits.",
+    "graphql_response_cache_misses_total": "Response cache misses.",
+    "celery_task_duration_seconds": "Celery task runtime by task.",
+    "celery_task_queue_latency_seconds": "Time between publishing a task and a worker starting it.",
+    "celery_tasks_total": "Finished Celery tasks by task and state.",
+    "crm_events_written_total": "Events handed to the event log sinks.",
+    "crm_events_dropped_total": "Events dropped because the event log queue was full.",
+}
+
+
+def metrics_option(name, default=None):
+    return getattr(settings, "CRM_METRICS", {}).get(name, default)
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms for one process.
+
+    Every thread writes to its own shard, so recording takes no lock; the
+    shards are only merged when a snapshot is taken. Snapshots are written
+    to `metrics_dir` as `<pid>.json` at most every `flush_interval` seconds,
+    and `collect` merges the files of every web and Celery worker process.
+    """
+
+    def __init__(self, metrics_dir=None, flush_interval=5):
+        self.metrics_dir = metrics_dir
+        self.flush_interval = flush_interval
+        self.collectors = []
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._flushed = time.monotonic()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = ({}, {})
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name, labels=(), value=1):
+        counters = self._shard()[0]
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+        self._maybe_flush()
+
+    def observe(self, name, labels, value):
+        histograms = self._shard()[1]
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            # one count per bucket, then +Inf, sum and count
+            histogram = histograms[key] = [0] * (len(BUCKETS) + 3)
+        histogram[bisect_left(BUCKETS, value)] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+        self._maybe_flush()
+
+    def register_collector(self, collector):
+        """
+        Add a callable returning `{(name, labels): value}` counters, read
+        at snapshot time, for numbers other objects already keep.
+        """
+        self.collectors.append(collector)
+
+    def _maybe_flush(self):
+        if self.metrics_dir and time.monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def snapshot(self):
+        counters, histograms = {}, {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard_counters, shard_histograms in shards:
+            # list() copies a dict atomically under the GIL
+            for key, value in list(shard_counters.items()):
+                counters[key] = counters.get(key, 0) + value
+            for key, values in list(shard_histograms.items()):
+                merged = histograms.setdefault(key, [0] * len(values))
+                histograms[key] = [a + b for a, b in zip(merged, list(values))]
+        for collector in self.collectors:
+            for key, value in collector().items():
+                counters[key] = counters.get(key, 0) + value
+        return {"counters": counters, "histograms": histograms}
+
+    def flush(self):
+        if not self.metrics_dir:
+            return
+        self._flushed = time.monotonic()
+        snapshot = self.snapshot()
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        path = os.path.join(self.metrics_dir, f"{os.getpid()}.json")
+        # write and rename so readers never see a partial file
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({kind: list(values.items()) for kind, values in snapshot.items()}, f)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """
+        Snapshot of this process merged with the latest snapshot of every
+        other process sharing `metrics_dir`.
+        """
+        merged = self.snapshot()
+        if not self.metrics_dir:
+            return merged
+        self.flush()
+        own = os.path.join(self.metrics_dir, f"{os.getpid()}.json")
+        for path in glob.glob(os.path.join(self.metrics_dir, "*.json")):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for (name, labels), value in snapshot.get("counters", []):
+                key = (name, tuple(map(tuple, labels)))
+                merged["counters"][key] = merged["counters"].get(key, 0) + value
+            for (name, labels), values in snapshot.get("histograms", []):
+                key = (name, tuple(map(tuple, labels)))
+                current = merged["histograms"].get(key, [0] * len(values))
+                merged["histograms"][key] = [a + b for a, b in zip(current, values)]
+        return merged
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+
+def render(snapshot):
+    """
+    Prometheus text exposition (version 0.0.4) of a merged snapshot.
+    """
+    lines = []
+    typed = set()
+
+    def header(name, kind):
+        if name not in typed:
+            typed.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(snapshot["counters"].items()):
+        header(name, "counter")
+        lines.append(f"{name}{format_labels(labels)} {value}")
+
+    for (name, labels), values in sorted(snapshot["histograms"].items()):
+        header(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), values):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels(labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{format_labels(labels)} {values[-2]}")
+        lines.append(f"{name}_count{format_labels(labels)} {values[-1]}")
+
+    hits = misses = 0
+    for (name, labels), value in snapshot["counters"].items():
+        if name == "graphql_response_cache_hits_total":
+            hits += value
+        elif name == "graphql_response_cache_misses_total":
+            misses += value
+    if hits + misses:
+        lines.append("# HELP graphql_response_cache_hit_ratio Response cache hits per lookup.")
+        lines.append("# TYPE graphql_response_cache_hit_ratio gauge")
+        lines.append(f"graphql_response_cache_hit_ratio {hits / (hits + misses)}")
+    return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry(metrics_option("DIR"), metrics_option("FLUSH_INTERVAL", 5))
+atexit.register(metrics.flush)
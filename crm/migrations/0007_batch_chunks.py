@@ -0,0 +1,29 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_order_reminders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=32)),
+                ('job', models.CharField(max_length=50)),
+                ('after', models.BigIntegerField()),
+                ('upto', models.BigIntegerField()),
+                ('result', models.JSONField(default=dict)),
+                ('finished_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='batchchunk',
+            constraint=models.UniqueConstraint(fields=('job_id', 'after'), name='crm_batch_chunk_uniq'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import TruncDate
+
+BATCH_SIZE = 2000
+
+
+def backfill_order_lines(apps, schema_editor):
+    # product links without a line (orders from before order lines) get
+    # one unit at the price they are reported at today, which freezes it;
+    # their days are queued so the rollups are rebuilt from the lines
+    Order = apps.get_model("crm", "Order")
+    OrderLine = apps.get_model("crm", "OrderLine")
+    RollupDirtyDay = apps.get_model("crm", "RollupDirtyDay")
+    links = Order.products.through.objects.filter(
+        ~Exists(
+            OrderLine.objects.filter(
+                order_id=OuterRef("order_id"), product_id=OuterRef("product_id")
+            )
+        )
+    )
+    days = set(
+        links.annotate(day=TruncDate("order__order_date"))
+        .values_list("day", flat=True)
+        .distinct()
+    )
+    batch = []
+    for order_id, product_id, price in links.values_list(
+        "order_id", "product_id", "product__price"
+    ).iterator(chunk_size=BATCH_SIZE):
+        batch.append(
+            OrderLine(order_id=order_id, product_id=product_id, quantity=1, unit_price=price)
+        )
+        if len(batch) == BATCH_SIZE:
+            OrderLine.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    OrderLine.objects.bulk_create(batch, ignore_conflicts=True)
+    RollupDirtyDay.objects.bulk_create(
+        [RollupDirtyDay(day=day) for day in days if day is not None], ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0010_order_date_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_lines, migrations.RunPython.noop),
+    ]
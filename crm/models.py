@@ -1,12 +1,23 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 
 class Customer(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
-    phone = models.CharField(max_length=20, blank=True, null=True)
+    phone = models.CharField(max_length=20, blank=True, null=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination seeks on (created_at, id)
+            models.Index(fields=["created_at", "id"], name="crm_customer_created_id_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -17,20 +28,180 @@ class Product(models.Model):
     stock = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="crm_product_created_id_idx"),
+            models.Index(fields=["price"], name="crm_product_price_idx"),
+            models.Index(fields=["stock"], name="crm_product_stock_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class OrderQuerySet(models.QuerySet):
+    def recalculate_totals(self):
+        """
+        Set `total_amount` to the sum of each order's lines (quantity times
+        the price snapshot) with a single UPDATE and return the number of
+        orders updated.
+        """
+        line_totals = (
+            OrderLine.objects.filter(order_id=OuterRef("pk"))
+            .values("order_id")
+            .annotate(
+                total=Sum(
+                    ExpressionWrapper(
+                        F("quantity") * F("unit_price"),
+                        output_field=DecimalField(max_digits=10, decimal_places=2),
+                    )
+                )
+            )
+            .values("total")
+        )
+        return self.update(
+            total_amount=Coalesce(
+                Subquery(line_totals),
+                Value(Decimal("0")),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            )
+        )
+
+
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     products = models.ManyToManyField(Product)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
-    order_date = models.DateTimeField(auto_now_add=True)
+    # a default rather than auto_now_add, so imports keep historical dates
+    order_date = models.DateTimeField(default=timezone.now)
 
-    def save(self, *args, **kwargs):
-        # auto-calculate total amount
-        self.total_amount = sum(p.price for p in self.products.all()) if self.pk else 0
-        super().save(*args, **kwargs)
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["order_date", "id"], name="crm_order_date_id_idx"),
+            models.Index(fields=["total_amount"], name="crm_order_total_idx"),
+        ]
 
     def __str__(self):
         return f"Order {self.id} by {self.customer.name}"
+
+
+class OrderLine(models.Model):
+    """
+    Quantity of a product in an order, with its unit price at checkout.
+    """
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="lines")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="order_lines")
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["order", "product"], name="crm_order_line_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} in order {self.order_id}"
+
+
+# ---------- Reporting rollups ----------
+class CrmDailyStats(models.Model):
+    day = models.DateField(unique=True)
+    new_customers = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Stats for {self.day}"
+
+
+class CustomerDailyStats(models.Model):
+    day = models.DateField()
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "customer"], name="crm_customer_day_stats_uniq"),
+        ]
+
+
+class ProductDailyStats(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "product"], name="crm_product_day_stats_uniq"),
+        ]
+
+
+class RollupDirtyDay(models.Model):
+    """
+    Day whose rollups are stale and must be rebuilt on the next catch-up.
+    """
+
+    day = models.DateField(unique=True)
+
+
+class RollupWatermark(models.Model):
+    """
+    Highest primary key of `name` whose day has been queued for rollup.
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    position = models.BigIntegerField(default=0)
+
+
+class ReminderCheckpoint(models.Model):
+    """
+    Progress of the order reminder pipeline. Orders up to `order_position`
+    have been reminded; a run in progress covers orders up to `run_top` and
+    has dispatched the customers up to `customer_position`.
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    order_position = models.BigIntegerField(default=0)
+    run_top = models.BigIntegerField(default=0)
+    customer_position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class BatchChunk(models.Model):
+    """
+    Result of one id-range chunk of a fanned-out batch job. Its row is
+    written in the chunk's transaction, so a retried or redelivered chunk
+    returns the stored result instead of running twice.
+    """
+
+    job_id = models.CharField(max_length=32)
+    job = models.CharField(max_length=50)
+    after = models.BigIntegerField()
+    upto = models.BigIntegerField()
+    result = models.JSONField(default=dict)
+    finished_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["job_id", "after"], name="crm_batch_chunk_uniq"),
+        ]
+
+
+class ActivityEvent(models.Model):
+    """
+    Structured event written in batches by `crm.events.DatabaseSink`.
+    """
+
+    kind = models.CharField(max_length=50)
+    created_at = models.DateTimeField()
+    data = models.JSONField(default=dict)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["kind", "created_at"], name="crm_event_kind_created_idx"),
+        ]
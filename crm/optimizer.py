@@ -0,0 +1,127 @@
+from collections import defaultdict
+
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+PREFETCH_ATTR = "{}_prefetched"
+
+
+def prefetch_attr(name):
+    """
+    Attribute a `Prefetch` built by the optimizer stores its results under.
+    """
+    return PREFETCH_ATTR.format(name)
+
+
+def iter_field_nodes(selection_set, fragments):
+    if selection_set is None:
+        return
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments[selection.name.value]
+            yield from iter_field_nodes(fragment.selection_set, fragments)
+        elif isinstance(selection, InlineFragmentNode):
+            yield from iter_field_nodes(selection.selection_set, fragments)
+
+
+def selected_fields(field_nodes, fragments):
+    """
+    Group the fields selected under `field_nodes` by their snake_case name.
+    """
+    selected = defaultdict(list)
+    for node in field_nodes:
+        for field in iter_field_nodes(node.selection_set, fragments):
+            selected[to_snake_case(field.name.value)].append(field)
+    return selected
+
+
+def connection_node_fields(field_nodes, fragments):
+    """
+    Return the `node` field nodes selected under `edges` of a connection.
+    """
+    edges = selected_fields(field_nodes, fragments).get("edges", [])
+    return selected_fields(edges, fragments).get("node", [])
+
+
+def model_fields(model):
+    """
+    Map every forward field and reverse accessor of `model` to its field.
+    """
+    fields = {}
+    for field in model._meta.get_fields():
+        if field.auto_created and not field.concrete:
+            fields[field.get_accessor_name()] = field
+        else:
+            fields[field.name] = field
+    return fields
+
+
+class QueryOptimizer:
+    """
+    Translate a GraphQL selection into `only`, `select_related` and
+    `prefetch_related` calls, so a connection page costs one query for the
+    page plus one per to-many relation, whatever the page size.
+    """
+
+    def __init__(self, fragments):
+        self.fragments = fragments
+
+    def optimize(self, queryset, node_fields, required=()):
+        only, related, prefetches = self.plan(queryset.model, node_fields)
+        only.extend(required)
+        if related:
+            queryset = queryset.select_related(*related)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset.only(*only)
+
+    def plan(self, model, node_fields, prefix=""):
+        only = [prefix + model._meta.pk.name]
+        related, prefetches = [], []
+        fields = model_fields(model)
+
+        for name, nodes in selected_fields(node_fields, self.fragments).items():
+            field = fields.get(name)
+            if field is None:
+                continue
+            if field.many_to_many or field.one_to_many:
+                prefetches.append(self.prefetch(prefix + name, field, nodes))
+            elif field.is_relation:
+                related.append(prefix + name)
+                only.append(prefix + name)
+                sub_only, sub_related, sub_prefetches = self.plan(
+                    field.related_model, nodes, prefix=f"{prefix}{name}__"
+                )
+                only.extend(sub_only)
+                related.extend(sub_related)
+                prefetches.extend(sub_prefetches)
+            elif field.concrete:
+                only.append(prefix + name)
+
+        return only, related, prefetches
+
+    def prefetch(self, lookup, field, nodes):
+        # the reverse side of a foreign key needs its column to attach results
+        required = [field.field.attname] if field.one_to_many else []
+        # relations of Node types are connections, others plain lists
+        node_fields = connection_node_fields(nodes, self.fragments) or nodes
+        queryset = self.optimize(
+            field.related_model._default_manager.order_by("pk"),
+            node_fields,
+            required=required,
+        )
+        return Prefetch(lookup, queryset=queryset, to_attr=prefetch_attr(lookup.split("__")[-1]))
+
+
+def optimize_queryset(queryset, info):
+    """
+    Optimize the queryset behind a connection field for the fields requested
+    in `info`; querysets for unrecognised selections are returned unchanged.
+    """
+    node_fields = connection_node_fields(info.field_nodes, info.fragments)
+    if not node_fields:
+        return queryset
+    return QueryOptimizer(info.fragments).optimize(queryset, node_fields)
@@ -0,0 +1,120 @@
+import json
+
+import graphene
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from graphene.relay import ConnectionField, PageInfo
+from graphene_django.utils import maybe_queryset
+from graphql_relay.utils import base64, unbase64
+
+from .fields import CRMFilterConnectionField
+
+KEYSET_VALUE = "keyset_value"
+
+
+class KeysetConnection(graphene.relay.Connection):
+    """
+    Connection paginated on `(keyset_field, id)` instead of row offsets.
+
+    `totalCount` runs a `COUNT(*)` and is only computed when selected.
+    """
+
+    keyset_field = None
+
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int()
+
+    def resolve_total_count(self, info):
+        return self.iterable.count()
+
+
+def encode_cursor(value, pk):
+    # str() keeps full microsecond precision, unlike DjangoJSONEncoder
+    return base64(json.dumps([value, pk], default=str))
+
+
+def decode_cursor(cursor, field):
+    try:
+        value, pk = json.loads(unbase64(cursor))
+        return field.to_python(value), int(pk)
+    except (TypeError, ValueError, ValidationError):
+        raise ValidationError(f"Invalid cursor: {cursor}")
+
+
+def seek(column, value, pk, direction):
+    """
+    Row-value comparison `(column, id) > (value, pk)` written so the leading
+    `column` bound stays sargable for the `(column, id)` index.
+    """
+    bound = f"{column}__{direction}e"
+    strict = f"{column}__{direction}"
+    return Q(**{bound: value}) & (Q(**{strict: value}) | Q(**{f"pk__{direction}": pk}))
+
+
+class KeysetConnectionField(CRMFilterConnectionField):
+    """
+    Filter connection field for a `KeysetConnection`.
+
+    Pages are read with an indexed seek from the cursor, so the cost of a
+    page does not grow with its depth and no count is run unless
+    `totalCount` is selected.
+    """
+
+    def __init__(self, type_, *args, **kwargs):
+        super().__init__(type_, *args, **kwargs)
+        # offsets are what keyset pagination replaces
+        self._base_args.pop("offset", None)
+
+    @property
+    def type(self):
+        # skip DjangoConnectionField.type, which always returns the node's
+        # default connection
+        return ConnectionField.type.fget(self)
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        queryset = maybe_queryset(iterable)
+        column = connection.keyset_field
+        field = queryset.model._meta.get_field(column)
+        first, last = args.get("first"), args.get("last")
+        after, before = args.get("after"), args.get("before")
+        for name, value in (("first", first), ("last", last)):
+            if value is not None and value < 0:
+                raise ValidationError(f"Argument '{name}' must be a non-negative integer.")
+        if first is None and last is None:
+            first = max_limit
+
+        page = queryset.annotate(**{KEYSET_VALUE: F(column)}).order_by(column, "pk")
+        if after:
+            page = page.filter(seek(column, *decode_cursor(after, field), "gt"))
+        if before:
+            page = page.filter(seek(column, *decode_cursor(before, field), "lt"))
+
+        if first is not None:
+            rows = list(page[: first + 1])
+            has_next, has_previous = len(rows) > first, bool(after)
+            rows = rows[:first]
+            if last is not None:
+                rows = rows[-last:] if last else []
+        else:
+            rows = list(page.reverse()[: last + 1])
+            has_next, has_previous = bool(before), len(rows) > last
+            rows = rows[:last][::-1]
+
+        edges = [
+            connection.Edge(node=row, cursor=encode_cursor(getattr(row, KEYSET_VALUE), row.pk))
+            for row in rows
+        ]
+        result = connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_previous,
+                has_next_page=has_next,
+            ),
+        )
+        result.iterable = queryset
+        return result
@@ -0,0 +1,102 @@
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .bulk import chunked
+from .models import Order, ReminderCheckpoint
+from .tasks import send_order_reminder_batch
+
+PIPELINE = "order_reminders"
+
+
+def reminder_option(name, default=None):
+    return getattr(settings, "CRM_REMINDERS", {}).get(name, default)
+
+
+def start_run(checkpoint):
+    """
+    Fix the orders covered by the next run, unless an interrupted run is
+    still pending, in which case it is resumed.
+    """
+    if not checkpoint.run_top:
+        checkpoint.run_top = Order.objects.aggregate(top=Max("pk"))["top"] or 0
+        checkpoint.customer_position = 0
+        checkpoint.save(update_fields=["run_top", "customer_position", "updated_at"])
+    return checkpoint
+
+
+def pending_reminders(checkpoint, since, chunk_size):
+    """
+    Stream one row per customer with orders in the run that were placed
+    after `since`, in customer id order, skipping customers already
+    dispatched by an interrupted run.
+    """
+    return (
+        Order.objects.filter(
+            pk__gt=checkpoint.order_position,
+            pk__lte=checkpoint.run_top,
+            order_date__gte=since,
+            customer_id__gt=checkpoint.customer_position,
+        )
+        .values("customer_id", "customer__name", "customer__email")
+        .annotate(orders=Count("id"), latest_order_id=Max("id"))
+        .order_by("customer_id")
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def queue_order_reminders(batch_size=None, max_in_flight=None):
+    """
+    Send one reminder per customer for orders not reminded before, as
+    batches of `send_order_reminder_batch` tasks.
+
+    At most `max_in_flight` batches are outstanding at a time. The
+    checkpoint moves past a batch only once it and every earlier batch
+    have finished, so a crash resumes after the last confirmed customer
+    and a batch is sent at least once. Memory stays bounded by the
+    iterator chunk and the in-flight batches. Returns the number of
+    reminders queued.
+    """
+    batch_size = batch_size or reminder_option("BATCH_SIZE", 100)
+    max_in_flight = max_in_flight or reminder_option("MAX_IN_FLIGHT", 4)
+    timeout = reminder_option("RESULT_TIMEOUT", 300)
+    since = timezone.now() - timedelta(days=reminder_option("LOOKBACK_DAYS", 7))
+
+    checkpoint, _ = ReminderCheckpoint.objects.get_or_create(name=PIPELINE)
+    start_run(checkpoint)
+    rows = pending_reminders(checkpoint, since, reminder_option("CHUNK_SIZE", 2000))
+
+    in_flight = deque()
+    queued = 0
+
+    def settle():
+        result, last_customer_id = in_flight.popleft()
+        result.get(timeout=timeout)
+        checkpoint.customer_position = last_customer_id
+        checkpoint.save(update_fields=["customer_position", "updated_at"])
+
+    for batch in chunked(rows, batch_size):
+        reminders = [
+            {
+                "customer_id": row["customer_id"],
+                "name": row["customer__name"],
+                "email": row["customer__email"],
+                "orders": row["orders"],
+                "latest_order_id": row["latest_order_id"],
+            }
+            for row in batch
+        ]
+        in_flight.append((send_order_reminder_batch.delay(reminders), batch[-1]["customer_id"]))
+        queued += len(reminders)
+        if len(in_flight) >= max_in_flight:
+            settle()
+    while in_flight:
+        settle()
+
+    checkpoint.order_position = checkpoint.run_top
+    checkpoint.run_top = checkpoint.customer_position = 0
+    checkpoint.save()
+    return queued
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLObjectType,
+    InlineFragmentNode,
+    TypeInfo,
+    TypeInfoVisitor,
+    Visitor,
+    get_named_type,
+    visit,
+)
+
+from .conf import graphene_option
+from .routers import replica_alias, routing_option
+
+TAG_KEY_PREFIX = "crm:response-tag:"
+# set for REPLICA_LAG seconds after a tag is invalidated
+INVALIDATED_KEY_PREFIX = "crm:response-tag-invalidated:"
+ENTRY_KEY_PREFIX = "crm:response:"
+
+
+class LocalMemoryBackend:
+    """
+    Per-process dict with expiry times, guarded by a lock. Once it holds
+    `max_entries` keys, expired entries and then the oldest ones are dropped.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            found = {}
+            for key in keys:
+                item = self._data.get(key)
+                if item is not None and (item[1] is None or item[1] > now):
+                    found[key] = item[0]
+            return found
+
+    def set(self, key, value, timeout=None):
+        now = time.monotonic()
+        expires = now + timeout if timeout else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            if len(self._data) > self.max_entries:
+                self._prune(now)
+
+    def _prune(self, now):
+        expired = [k for k, (_, expires) in self._data.items() if expires and expires <= now]
+        for key in expired:
+            del self._data[key]
+        while len(self._data) > self.max_entries:
+            # tag versions never expire; keep them so old entries stay stale
+            oldest = next(k for k in self._data if not k.startswith(TAG_KEY_PREFIX))
+            del self._data[oldest]
+
+    def incr(self, key):
+        with self._lock:
+            value = self._data.get(key, (0, None))[0] + 1
+            self._data[key] = (value, None)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheBackend:
+    """
+    Backend on a Django cache alias, shared by every worker using it.
+    """
+
+    def __init__(self, alias="default"):
+        self.cache = caches[alias]
+
+    def get_many(self, keys):
+        return self.cache.get_many(keys)
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(key, value, timeout)
+
+    def incr(self, key):
+        # add() is a no-op when the tag already has a version
+        self.cache.add(key, 0, None)
+        return self.cache.incr(key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+def root_field_names(selection_set, fragments):
+    """
+    Names of the fields selected at the root of `selection_set`, looking
+    through fragment spreads and inline fragments.
+    """
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection.name.value
+        elif isinstance(selection, InlineFragmentNode):
+            yield from root_field_names(selection.selection_set, fragments)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments.get(selection.name.value)
+            # validation has already rejected unknown and cyclic fragments
+            if fragment is not None:
+                yield from root_field_names(fragment.selection_set, fragments)
+
+
+class ResponseCache:
+    """
+    Cache of `data` for query operations, tagged with the models the
+    operation reads.
+
+    Entries remember the version of each tag they were stored under;
+    invalidating a tag bumps its version, which turns every entry stored
+    under an older version into a miss. The versions are read before the
+    operation runs, so a result computed while a mutation committed is
+    stored as already stale.
+
+    For `replica_lag` seconds after a tag is invalidated the replica may
+    not have the invalidating write yet, so `get` reports the tags as
+    recently invalidated and results read from the replica are not stored.
+    """
+
+    def __init__(self, backend, timeout=60, field_timeouts=None, replica_lag=0):
+        self.backend = backend
+        self.timeout = timeout
+        self.field_timeouts = field_timeouts or {}
+        self.replica_lag = replica_lag
+        self.hits = self.misses = 0
+
+    def make_key(self, document_key, operation_name, variables, user):
+        payload = json.dumps(
+            [document_key, operation_name, variables, user], sort_keys=True, default=str
+        )
+        return ENTRY_KEY_PREFIX + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_timeout(self, operation_ast, fragments=None):
+        """
+        Lowest TTL among the operation's root fields; 0 disables caching.
+        """
+        names = root_field_names(operation_ast.selection_set, fragments or {})
+        return min((self.field_timeouts.get(name, self.timeout) for name in names), default=0)
+
+    def get(self, key, tags):
+        """
+        Return `(data, versions, recently_invalidated)`: the cached data,
+        or None on a miss, the current versions of `tags` to pass to `set`
+        with a fresh result, and whether any of them was invalidated within
+        `replica_lag` seconds. Everything is read in one round trip.
+        """
+        tag_keys = {tag: TAG_KEY_PREFIX + tag for tag in tags}
+        invalidated_keys = []
+        if self.replica_lag:
+            invalidated_keys = [INVALIDATED_KEY_PREFIX + tag for tag in tags]
+        found = self.backend.get_many([key, *tag_keys.values(), *invalidated_keys])
+        versions = {tag: found.get(tag_key, 0) for tag, tag_key in tag_keys.items()}
+        recently_invalidated = any(k in found for k in invalidated_keys)
+        entry = found.get(key)
+        if entry is not None and entry["tags"] == versions:
+            self.hits += 1
+            return entry["data"], versions, recently_invalidated
+        self.misses += 1
+        return None, versions, recently_invalidated
+
+    def set(self, key, data, versions, timeout):
+        self.backend.set(key, {"data": data, "tags": versions}, timeout)
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.incr(TAG_KEY_PREFIX + tag)
+            if self.replica_lag:
+                self.backend.set(INVALIDATED_KEY_PREFIX + tag, True, self.replica_lag)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def document_tags(schema, document):
+    """
+    Model names of every Django object type selected in `document`, plus
+    the `cache_tags` of plain object types that read models.
+    """
+    tags = set()
+    type_info = TypeInfo(schema)
+
+    class TagCollector(Visitor):
+        def enter_field(self, node, *args):
+            named_type = get_named_type(type_info.get_type())
+            if isinstance(named_type, GraphQLObjectType):
+                graphene_type = getattr(named_type, "graphene_type", None)
+                model = getattr(getattr(graphene_type, "_meta", None), "model", None)
+                if model is not None:
+                    tags.add(model._meta.model_name)
+                tags.update(getattr(graphene_type, "cache_tags", ()))
+
+    visit(document, TypeInfoVisitor(type_info, TagCollector()))
+    return tags
+
+
+def invalidate_models(*models):
+    """
+    Invalidate cached responses for `models` once the current transaction
+    commits, so a request reading before the commit cannot re-cache stale data.
+    """
+    if response_cache is None:
+        return
+    tags = [model._meta.model_name for model in models]
+    transaction.on_commit(lambda: response_cache.invalidate(*tags))
+
+
+def build_response_cache():
+    options = graphene_option("RESPONSE_CACHE", {})
+    if not options.get("ENABLED", False):
+        return None
+    if options.get("BACKEND", "locmem") == "django":
+        backend = DjangoCacheBackend(options.get("CACHE", "default"))
+    else:
+        backend = LocalMemoryBackend(options.get("MAX_ENTRIES", 1000))
+    return ResponseCache(
+        backend,
+        timeout=options.get("TIMEOUT", 60),
+        field_timeouts=options.get("FIELD_TIMEOUTS"),
+        # by default, as long as a writing client stays pinned to the primary
+        replica_lag=(
+            options.get("REPLICA_LAG", routing_option("STICKY_SECONDS", 5))
+            if replica_alias()
+            else 0
+        ),
+    )
+
+
+response_cache = build_response_cache()
@@ -0,0 +1,231 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import (
+    CrmDailyStats,
+    Customer,
+    CustomerDailyStats,
+    Order,
+    OrderLine,
+    ProductDailyStats,
+    RollupDirtyDay,
+    RollupWatermark,
+)
+
+PERIODS = {"day": None, "week": TruncWeek, "month": TruncMonth}
+
+
+def day_of(value):
+    return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+
+
+def day_bounds(start, end):
+    """
+    Aware datetimes covering the days `start` up to but excluding `end`.
+    """
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start, time.min), tz),
+        timezone.make_aware(datetime.combine(end, time.min), tz),
+    )
+
+
+def mark_order_days_dirty(orders):
+    """
+    Queue the days of every order in the `orders` queryset.
+    """
+    mark_days_dirty(
+        orders.annotate(day=TruncDate("order_date")).values_list("day", flat=True).distinct()
+    )
+
+
+def mark_days_dirty(days):
+    """
+    Queue days for the next catch-up with a single conflict-ignoring INSERT.
+    """
+    days = {day for day in days if day is not None}
+    if days:
+        RollupDirtyDay.objects.bulk_create(
+            [RollupDirtyDay(day=day) for day in days], ignore_conflicts=True
+        )
+
+
+def product_sales(lines, keys):
+    """
+    Units and revenue per `keys` group (which include "product_id") from
+    the OrderLine queryset `lines`, at the prices snapshotted on the lines.
+    """
+    return list(
+        lines.values(*keys).annotate(
+            units=Sum("quantity"), revenue=Sum(F("quantity") * F("unit_price"))
+        )
+    )
+
+
+@transaction.atomic
+def rebuild_range(start, end):
+    """
+    Recompute every rollup row for the days `start` up to `end` from the
+    orders and customers in that range. The range scans use the
+    order_date and created_at indexes.
+    """
+    low, high = day_bounds(start, end)
+    CrmDailyStats.objects.filter(day__gte=start, day__lt=end).delete()
+    CustomerDailyStats.objects.filter(day__gte=start, day__lt=end).delete()
+    ProductDailyStats.objects.filter(day__gte=start, day__lt=end).delete()
+
+    orders = Order.objects.filter(order_date__gte=low, order_date__lt=high).annotate(
+        day=TruncDate("order_date")
+    )
+    lines = OrderLine.objects.filter(
+        order__order_date__gte=low, order__order_date__lt=high
+    ).annotate(day=TruncDate("order__order_date"))
+    customers = Customer.objects.filter(created_at__gte=low, created_at__lt=high).annotate(
+        day=TruncDate("created_at")
+    )
+
+    daily = {}
+    for row in orders.values("day").annotate(orders=Count("id"), revenue=Sum("total_amount")):
+        daily[row["day"]] = CrmDailyStats(
+            day=row["day"], orders=row["orders"], revenue=row["revenue"]
+        )
+    for row in customers.values("day").annotate(count=Count("id")):
+        daily.setdefault(row["day"], CrmDailyStats(day=row["day"])).new_customers = row["count"]
+    CrmDailyStats.objects.bulk_create(daily.values())
+
+    CustomerDailyStats.objects.bulk_create(
+        CustomerDailyStats(**row)
+        for row in orders.values("day", "customer_id").annotate(
+            orders=Count("id"), revenue=Sum("total_amount")
+        )
+    )
+    ProductDailyStats.objects.bulk_create(
+        ProductDailyStats(**row) for row in product_sales(lines, ["day", "product_id"])
+    )
+
+
+def advance_watermark(name, queryset, date_field):
+    """
+    Queue the days of rows created past the watermark, which covers bulk
+    and COPY inserts that send no signals, and move the watermark on.
+    """
+    watermark, _ = RollupWatermark.objects.get_or_create(name=name)
+    new_rows = queryset.filter(pk__gt=watermark.position)
+    top = new_rows.aggregate(top=Max("pk"))["top"]
+    if top is None:
+        return
+    mark_days_dirty(
+        new_rows.filter(pk__lte=top)
+        .annotate(day=TruncDate(date_field))
+        .values_list("day", flat=True)
+        .distinct()
+    )
+    watermark.position = top
+    watermark.save(update_fields=["position"])
+
+
+def advance_watermarks():
+    with transaction.atomic():
+        advance_watermark("order", Order.objects.all(), "order_date")
+        advance_watermark("customer", Customer.objects.all(), "created_at")
+
+
+def rebuild_dirty_days(dirty):
+    """
+    Rebuild and dequeue the days of the `dirty` RollupDirtyDay queryset,
+    skipping rows another catch-up holds. Returns the number of days.
+    """
+    with transaction.atomic():
+        rows = list(dirty.select_for_update(skip_locked=True).values_list("pk", "day"))
+        for _, day in rows:
+            rebuild_range(day, day + timedelta(days=1))
+        RollupDirtyDay.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+    return len(rows)
+
+
+def catch_up():
+    """
+    Bring the rollups up to date: queue days with new rows, then rebuild
+    every queued day. Returns the number of days rebuilt.
+    """
+    with transaction.atomic():
+        advance_watermarks()
+        return rebuild_dirty_days(RollupDirtyDay.objects.all())
+
+
+def backfill(days_per_chunk=31, start=None, end=None):
+    """
+    Rebuild the rollups for all data (or `start`..`end`) in chunks of
+    `days_per_chunk` days, each in its own transaction, clearing the
+    dirty-day queue as it goes. Yields each rebuilt range.
+    """
+    if start is None or end is None:
+        bounds = Order.objects.aggregate(low=Min("order_date"), high=Max("order_date"))
+        customer_bounds = Customer.objects.aggregate(low=Min("created_at"), high=Max("created_at"))
+        lows = [day_of(v) for v in (bounds["low"], customer_bounds["low"]) if v]
+        highs = [day_of(v) for v in (bounds["high"], customer_bounds["high"]) if v]
+        if not lows:
+            return
+        start = start or min(lows)
+        end = end or max(highs) + timedelta(days=1)
+
+    # watermarks are taken first so rows written during the backfill are
+    # picked up again by the next catch-up
+    for name, queryset in (("order", Order.objects), ("customer", Customer.objects)):
+        top = queryset.aggregate(top=Max("pk"))["top"] or 0
+        RollupWatermark.objects.update_or_create(name=name, defaults={"position": top})
+
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(days=days_per_chunk), end)
+        rebuild_range(chunk_start, chunk_end)
+        RollupDirtyDay.objects.filter(day__gte=chunk_start, day__lt=chunk_end).delete()
+        yield chunk_start, chunk_end
+        chunk_start = chunk_end
+
+
+def summarize(start=None, end=None):
+    """
+    Totals of customers, orders and revenue from the daily rollups.
+    """
+    stats = CrmDailyStats.objects.all()
+    if start:
+        stats = stats.filter(day__gte=start)
+    if end:
+        stats = stats.filter(day__lt=end)
+    totals = stats.aggregate(
+        customers=Sum("new_customers"), orders=Sum("orders"), revenue=Sum("revenue")
+    )
+    return {
+        "customers": totals["customers"] or 0,
+        "orders": totals["orders"] or 0,
+        "revenue": totals["revenue"] or Decimal("0.00"),
+    }
+
+
+def breakdown(period="day", by=None, start=None, end=None):
+    """
+    Rollup totals grouped by `period` ("day", "week" or "month") and,
+    optionally, by "customer" or "product".
+    """
+    if by == "customer":
+        rows, totals = CustomerDailyStats.objects.all(), {"total_orders": Sum("orders")}
+    elif by == "product":
+        rows, totals = ProductDailyStats.objects.all(), {"total_units": Sum("units")}
+    else:
+        rows = CrmDailyStats.objects.all()
+        totals = {"total_customers": Sum("new_customers"), "total_orders": Sum("orders")}
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lt=end)
+
+    trunc = PERIODS[period]
+    rows = rows.annotate(period=trunc("day") if trunc else F("day"))
+    keys = ["period"] + ([f"{by}_id"] if by else [])
+    return list(rows.values(*keys).annotate(total_revenue=Sum("revenue"), **totals).order_by(*keys))
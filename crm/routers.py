@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_KEY_PREFIX = "crm:primary-sticky:"
+
+_read_alias = ContextVar("crm_read_alias", default=None)
+
+
+def routing_option(name, default=None):
+    return getattr(settings, "CRM_DB_ROUTING", {}).get(name, default)
+
+
+def replica_alias():
+    """
+    Alias of the read replica, or None when none is configured.
+    """
+    alias = routing_option("REPLICA", "replica")
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    """
+    Send the reads made in this block, including those of resolver pool
+    calls it awaits, to the replica when one is configured.
+    """
+    token = _read_alias.set(replica_alias() if enabled else None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def reading_from_replica():
+    """
+    Whether reads made here go to the replica.
+    """
+    return _read_alias.get() is not None and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+class ReplicaRouter:
+    """
+    Writes always go to the primary. Reads go to the replica only inside
+    `read_from_replica`, and stay on the primary while it has a
+    transaction open, so read-modify-write code never reads stale rows.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as the primary
+        return True
+
+
+def stick_to_primary(client):
+    """
+    Serve `client`'s reads from the primary for STICKY_SECONDS, long
+    enough for the replica to catch up with what it just wrote.
+    """
+    if replica_alias() is None:
+        return
+    caches[routing_option("CACHE", "default")].set(
+        STICKY_KEY_PREFIX + client, True, routing_option("STICKY_SECONDS", 5)
+    )
+
+
+def is_sticky(client):
+    if replica_alias() is None:
+        return False
+    return bool(caches[routing_option("CACHE", "default")].get(STICKY_KEY_PREFIX + client))
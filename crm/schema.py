@@ -1,13 +1,25 @@
 import graphene
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
-from crm.models import Customer, Product, Order
+from crm.models import Customer, Product, Order, OrderLine
 from crm.models import Product
 from django.core.exceptions import ValidationError
 from django.db import transaction
-from datetime import datetime
+from django.utils import timezone
 from decimal import Decimal
+from graphene_django.filter.utils import get_filtering_args_from_filterset
+from .analytics import filter_orders, revenue_by_period, top_customers, top_products
+from .bulk import (
+    build_product,
+    bulk_create_customers,
+    bulk_create_orders,
+    bulk_create_products,
+)
+from .events import emit
+from .fields import CRMFilterConnectionField
 from .filters import CustomerFilter, ProductFilter, OrderFilter
+from .inventory import order_quantities, reserve_stock, restock_low_stock
+from .loaders import get_loaders, load_related
+from .pagination import KeysetConnection, KeysetConnectionField
 
 
 # ---------- GraphQL Types ----------
@@ -17,6 +29,9 @@ class CustomerType(DjangoObjectType):
         fields = "__all__"
         interfaces = (graphene.relay.Node,)  # needed for filter connections
 
+    def resolve_order_set(self, info, **kwargs):
+        return load_related(info, self, "order_set", "customer_orders")
+
 
 class ProductType(DjangoObjectType):
     class Meta:
@@ -24,6 +39,12 @@ class ProductType(DjangoObjectType):
         fields = "__all__"
         interfaces = (graphene.relay.Node,)
 
+    def resolve_order_set(self, info, **kwargs):
+        return load_related(info, self, "order_set", "product_orders")
+
+    def resolve_order_lines(self, info, **kwargs):
+        return load_related(info, self, "order_lines", "product_lines")
+
 
 class OrderType(DjangoObjectType):
     class Meta:
@@ -31,13 +52,145 @@ class OrderType(DjangoObjectType):
         fields = "__all__"
         interfaces = (graphene.relay.Node,)
 
+    def resolve_customer(self, info):
+        if Order.customer.is_cached(self):
+            return self.customer
+        return get_loaders(info).customer.load(self.customer_id)
+
+    def resolve_products(self, info, **kwargs):
+        return load_related(info, self, "products", "order_products")
+
+    def resolve_lines(self, info, **kwargs):
+        return load_related(info, self, "lines", "order_lines")
+
+
+class OrderLineType(DjangoObjectType):
+    class Meta:
+        model = OrderLine
+        fields = ("id", "product", "quantity", "unit_price")
+
+
+class CustomerKeysetConnection(KeysetConnection):
+    keyset_field = "created_at"
+
+    class Meta:
+        node = CustomerType
+
+
+class ProductKeysetConnection(KeysetConnection):
+    keyset_field = "created_at"
+
+    class Meta:
+        node = ProductType
+
+
+class OrderKeysetConnection(KeysetConnection):
+    keyset_field = "order_date"
+
+    class Meta:
+        node = OrderType
+
+
+# ---------- Analytics Types ----------
+class Granularity(graphene.Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class CustomerRanking(graphene.Enum):
+    REVENUE = "revenue"
+    ORDERS = "orders"
+
+
+class RevenuePeriodType(graphene.ObjectType):
+    # analytics rows are not model types, so name the models they read
+    # for response cache invalidation
+    cache_tags = ("order",)
+
+    period = graphene.DateTime()
+    orders = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class CustomerSalesType(graphene.ObjectType):
+    cache_tags = ("order",)
+
+    customer = graphene.Field(CustomerType)
+    orders = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class ProductSalesType(graphene.ObjectType):
+    cache_tags = ("order", "product")
+
+    product = graphene.Field(ProductType)
+    units = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+ORDER_FILTER_ARGS = get_filtering_args_from_filterset(OrderFilter, OrderType)
+
+
+def order_filter_data(kwargs):
+    return {name: value for name, value in kwargs.items() if name in ORDER_FILTER_ARGS}
+
 
 # ---------- Queries ----------
 class Query(graphene.ObjectType):
     # add filtering support using django-filter
-    all_customers = DjangoFilterConnectionField(CustomerType, filterset_class=CustomerFilter)
-    all_products = DjangoFilterConnectionField(ProductType, filterset_class=ProductFilter)
-    all_orders = DjangoFilterConnectionField(OrderType, filterset_class=OrderFilter)
+    all_customers = CRMFilterConnectionField(CustomerType, filterset_class=CustomerFilter)
+    all_products = CRMFilterConnectionField(ProductType, filterset_class=ProductFilter)
+    all_orders = CRMFilterConnectionField(OrderType, filterset_class=OrderFilter)
+
+    # opt-in keyset pagination for deep paging over large tables
+    all_customers_keyset = KeysetConnectionField(
+        CustomerKeysetConnection, filterset_class=CustomerFilter
+    )
+    all_products_keyset = KeysetConnectionField(
+        ProductKeysetConnection, filterset_class=ProductFilter
+    )
+    all_orders_keyset = KeysetConnectionField(OrderKeysetConnection, filterset_class=OrderFilter)
+
+    # aggregates computed in the database; they take the allOrders filters
+    revenue_by_period = graphene.List(
+        RevenuePeriodType,
+        granularity=Granularity(default_value=Granularity.DAY),
+        from_=graphene.Date(name="from"),
+        to=graphene.Date(),
+        **ORDER_FILTER_ARGS,
+    )
+    top_customers = graphene.List(
+        CustomerSalesType,
+        limit=graphene.Int(default_value=10),
+        by=CustomerRanking(default_value=CustomerRanking.REVENUE),
+        from_=graphene.Date(name="from"),
+        to=graphene.Date(),
+        **ORDER_FILTER_ARGS,
+    )
+    top_products = graphene.List(
+        ProductSalesType,
+        limit=graphene.Int(default_value=10),
+        from_=graphene.Date(name="from"),
+        to=graphene.Date(),
+        **ORDER_FILTER_ARGS,
+    )
+
+    def resolve_revenue_by_period(root, info, granularity, from_=None, to=None, **kwargs):
+        orders = filter_orders(order_filter_data(kwargs), from_, to, info.context)
+        return revenue_by_period(orders, granularity.value)
+
+    def resolve_top_customers(root, info, limit, by, from_=None, to=None, **kwargs):
+        if limit <= 0:
+            raise ValidationError("Limit must be positive")
+        orders = filter_orders(order_filter_data(kwargs), from_, to, info.context)
+        return top_customers(orders, limit, by.value)
+
+    def resolve_top_products(root, info, limit, from_=None, to=None, **kwargs):
+        if limit <= 0:
+            raise ValidationError("Limit must be positive")
+        orders = filter_orders(order_filter_data(kwargs), from_, to, info.context)
+        return top_products(orders, limit)
 
 
 # ---------- Mutations ----------
@@ -71,6 +224,8 @@ class BulkCreateCustomers(graphene.Mutation):
     class Arguments:
         # ALX expects the argument name to be `input` (list of customers)
         input = graphene.List(CustomerInput, required=True)
+        chunk_size = graphene.Int(required=False)
+        savepoint_per_chunk = graphene.Boolean(required=False, default_value=False)
 
     customers = graphene.List(CustomerType)
     errors = graphene.List(graphene.String)
@@ -78,18 +233,10 @@ class BulkCreateCustomers(graphene.Mutation):
 
     @classmethod
     @transaction.atomic
-    def mutate(cls, root, info, input):
-        created, errors = [], []
-        for cust in input:
-            try:
-                if Customer.objects.filter(email=cust.email).exists():
-                    raise ValidationError(f"Email {cust.email} already exists")
-                obj = Customer(name=cust.name, email=cust.email, phone=cust.phone)
-                obj.full_clean()
-                obj.save()
-                created.append(obj)
-            except Exception as e:
-                errors.append(str(e))
+    def mutate(cls, root, info, input, chunk_size=None, savepoint_per_chunk=False):
+        created, errors = bulk_create_customers(
+            input, chunk_size=chunk_size, savepoint_per_chunk=savepoint_per_chunk
+        )
         msg = (
             "Bulk create completed with partial success" if errors else "Bulk create successful"
         )
@@ -111,17 +258,7 @@ class CreateProduct(graphene.Mutation):
 
     @classmethod
     def mutate(cls, root, info, name, price, stock=0):
-        try:
-            price_decimal = Decimal(price)
-        except Exception:
-            raise ValidationError("Invalid price format. Use a numeric string like '999.99'.")
-
-        if price_decimal <= 0:
-            raise ValidationError("Price must be positive")
-        if stock < 0:
-            raise ValidationError("Stock cannot be negative")
-
-        product = Product(name=name, price=price_decimal, stock=stock)
+        product = build_product(name, price, stock)
         product.save()
         result = CreateProduct()
         result.product = product
@@ -129,54 +266,154 @@ class CreateProduct(graphene.Mutation):
         return result
 
 
+class ProductInput(graphene.InputObjectType):
+    name = graphene.String(required=True)
+    price = graphene.String(required=True)
+    stock = graphene.Int(required=False, default_value=0)
+
+
+class BulkCreateProducts(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(ProductInput, required=True)
+        chunk_size = graphene.Int(required=False)
+        savepoint_per_chunk = graphene.Boolean(required=False, default_value=False)
+
+    products = graphene.List(ProductType)
+    errors = graphene.List(graphene.String)
+    message = graphene.String()
+
+    @classmethod
+    @transaction.atomic
+    def mutate(cls, root, info, input, chunk_size=None, savepoint_per_chunk=False):
+        created, errors = bulk_create_products(
+            input, chunk_size=chunk_size, savepoint_per_chunk=savepoint_per_chunk
+        )
+        msg = (
+            "Bulk create completed with partial success" if errors else "Bulk create successful"
+        )
+        result = BulkCreateProducts()
+        result.products = created
+        result.errors = errors
+        result.message = msg
+        return result
+
+
+class OrderLineInput(graphene.InputObjectType):
+    product_id = graphene.ID(required=True)
+    quantity = graphene.Int(required=False, default_value=1)
+
+
 class CreateOrder(graphene.Mutation):
     class Arguments:
         customer_id = graphene.ID(required=True)
-        product_ids = graphene.List(graphene.ID, required=True)
+        product_ids = graphene.List(graphene.ID, required=False)
+        lines = graphene.List(OrderLineInput, required=False)
         order_date = graphene.DateTime(required=False)
 
     order = graphene.Field(OrderType)
     message = graphene.String()
 
     @classmethod
-    def mutate(cls, root, info, customer_id, product_ids, order_date=None):
+    @transaction.atomic
+    def mutate(cls, root, info, customer_id, product_ids=None, lines=None, order_date=None):
         try:
             customer = Customer.objects.get(pk=customer_id)
         except Customer.DoesNotExist:
             raise ValidationError("Invalid customer ID")
 
-        products = list(Product.objects.filter(pk__in=product_ids))
+        quantities = order_quantities(product_ids, lines)
+        products = Product.objects.in_bulk(quantities)
         if not products:
             raise ValidationError("Invalid product IDs")
-
-        order = Order(customer=customer, order_date=order_date or datetime.now())
-        order.save()
-        order.products.set(products)
-        order.total_amount = sum((p.price for p in products), Decimal("0"))
-        order.save()
+        quantities = {pk: quantity for pk, quantity in quantities.items() if pk in products}
+        reserve_stock(quantities)
+
+        order = Order.objects.create(
+            customer=customer,
+            order_date=order_date or timezone.now(),
+            total_amount=sum(
+                (products[pk].price * quantity for pk, quantity in quantities.items()),
+                Decimal("0"),
+            ),
+        )
+        OrderLine.objects.bulk_create(
+            OrderLine(order=order, product_id=pk, quantity=quantity, unit_price=products[pk].price)
+            for pk, quantity in quantities.items()
+        )
+        # the total is already known, so link rows skip the m2m_changed recalculation
+        Order.products.through.objects.bulk_create(
+            Order.products.through(order=order, product_id=pk) for pk in quantities
+        )
+        emit(
+            "order.created",
+            order_id=order.pk,
+            customer_id=customer.pk,
+            quantities={str(pk): quantity for pk, quantity in quantities.items()},
+            total_amount=str(order.total_amount),
+        )
         result = CreateOrder()
         result.order = order
         result.message = "Order created successfully"
         return result
 
 
+class OrderInput(graphene.InputObjectType):
+    customer_id = graphene.ID(required=True)
+    product_ids = graphene.List(graphene.ID, required=True)
+    order_date = graphene.DateTime(required=False)
+
+
+class BulkCreateOrders(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(OrderInput, required=True)
+        chunk_size = graphene.Int(required=False)
+        savepoint_per_chunk = graphene.Boolean(required=False, default_value=False)
+
+    orders = graphene.List(OrderType)
+    errors = graphene.List(graphene.String)
+    message = graphene.String()
+
+    @classmethod
+    @transaction.atomic
+    def mutate(cls, root, info, input, chunk_size=None, savepoint_per_chunk=False):
+        created, errors = bulk_create_orders(
+            input, chunk_size=chunk_size, savepoint_per_chunk=savepoint_per_chunk, reserve=True
+        )
+        msg = (
+            "Bulk create completed with partial success" if errors else "Bulk create successful"
+        )
+        result = BulkCreateOrders()
+        result.orders = created
+        result.errors = errors
+        result.message = msg
+        return result
+
+
 class UpdateLowStockProducts(graphene.Mutation):
     class Arguments:
-        pass
+        threshold = graphene.Int(required=False, default_value=10)
+        increment = graphene.Int(required=False, default_value=10)
+        batch_size = graphene.Int(required=False)
 
     products = graphene.List(ProductType)
     message = graphene.String()
 
     @classmethod
-    def mutate(cls, root, info):
-        low_stock_products = Product.objects.filter(stock__lt=10)
-        updated_products = []
-        
-        for product in low_stock_products:
-            product.stock += 10
-            product.save()
-            updated_products.append(product)
-        
+    def mutate(cls, root, info, threshold=10, increment=10, batch_size=None):
+        if increment <= 0:
+            raise ValidationError("Increment must be positive")
+        if threshold < 0:
+            raise ValidationError("Threshold cannot be negative")
+        if batch_size is not None and batch_size < 1:
+            raise ValidationError("Batch size must be positive")
+        updated_products = restock_low_stock(threshold, increment, batch_size=batch_size)
+        emit(
+            "products.restocked",
+            threshold=threshold,
+            increment=increment,
+            product_ids=[product.pk for product in updated_products],
+        )
+
         result = UpdateLowStockProducts()
         result.products = updated_products
         result.message = f"Updated {len(updated_products)} low-stock products"
@@ -188,5 +425,7 @@ class Mutation(graphene.ObjectType):
     create_customer = CreateCustomer.Field()
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
+    bulk_create_products = BulkCreateProducts.Field()
     create_order = CreateOrder.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
     update_low_stock_products = UpdateLowStockProducts.Field()
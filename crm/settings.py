@@ -17,6 +17,16 @@ CRONJOBS = [
     ('0 */12 * * *', 'crm.cron.update_low_stock'),
 ]
 
+# Cron jobs execute their GraphQL documents in-process; set HTTP_PROBE to
+# also check the running server over HTTP
+CRM_CRON = {
+    'TIMEOUT': 60,
+    'HTTP_PROBE': False,
+    'GRAPHQL_URL': 'http://localhost:8000/graphql',
+    # (connect, read) seconds
+    'HTTP_TIMEOUT': (3, 10),
+}
+
 # Celery Configuration
 import os
 
@@ -27,6 +37,23 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Workers reserve one task at a time and acknowledge it only once it has
+# finished, so a crashed worker's task is redelivered instead of lost;
+# batch chunks are idempotent (see crm/batch.py)
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.environ.get('CELERY_WORKER_PREFETCH_MULTIPLIER', 1))
+CELERY_TASK_ACKS_LATE = os.environ.get('CELERY_TASK_ACKS_LATE', '1') == '1'
+CELERY_TASK_REJECT_ON_WORKER_LOST = CELERY_TASK_ACKS_LATE
+
+# Heavy batch work has its own queue so it cannot starve the light tasks:
+#   celery -A crm worker -Q crm_light -c 4
+#   celery -A crm worker -Q crm_heavy -c 2
+CELERY_TASK_DEFAULT_QUEUE = 'crm_light'
+CELERY_TASK_ROUTES = {
+    'crm.tasks.run_batch_chunk': {'queue': os.environ.get('CRM_HEAVY_QUEUE', 'crm_heavy')},
+    'crm.tasks.refresh_crm_rollups': {'queue': os.environ.get('CRM_HEAVY_QUEUE', 'crm_heavy')},
+    'crm.tasks.*': {'queue': os.environ.get('CRM_LIGHT_QUEUE', 'crm_light')},
+}
+
 # Celery Beat Schedule
 from celery.schedules import crontab
 
@@ -35,4 +62,8 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'crm.tasks.generate_crm_report',
         'schedule': crontab(day_of_week='mon', hour=6, minute=0),
     },
+    'refresh-crm-rollups': {
+        'task': 'crm.tasks.refresh_crm_rollups',
+        'schedule': crontab(minute=15),
+    },
 }
@@ -0,0 +1,140 @@
+import time
+
+from celery.signals import (
+    before_task_publish,
+    task_postrun,
+    task_prerun,
+    worker_process_shutdown,
+)
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .events import event_log
+from .metrics import metrics
+from .models import Customer, Order, OrderLine, Product
+from .response_cache import invalidate_models
+from .rollups import day_of, mark_days_dirty, mark_order_days_dirty
+
+
+def sync_order_lines(action, lines, pairs):
+    """
+    Mirror a change of `Order.products` onto the OrderLine rows in `lines`:
+    added `(order_id, product_id, price)` `pairs` get a line for one unit
+    at the current price unless they already have one, removed or cleared
+    links lose theirs. Lines stay the source of totals and analytics.
+    """
+    if action == "post_add":
+        OrderLine.objects.bulk_create(
+            [
+                OrderLine(order_id=order_id, product_id=product_id, quantity=1, unit_price=price)
+                for order_id, product_id, price in pairs
+            ],
+            ignore_conflicts=True,
+        )
+    else:
+        lines.delete()
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def update_order_totals(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep the order lines and `total_amount` in step with `Order.products`
+    using one statement each for the affected orders, whichever side of
+    the relation was changed, and queue their days for the reporting
+    rollups.
+    """
+    if not reverse:
+        if action not in ("post_add", "post_remove", "post_clear"):
+            return
+        lines = OrderLine.objects.filter(order=instance)
+        if action != "post_clear":
+            lines = lines.filter(product_id__in=pk_set)
+        pairs = []
+        if action == "post_add":
+            prices = Product.objects.filter(pk__in=pk_set).values_list("pk", "price")
+            pairs = [(instance.pk, pk, price) for pk, price in prices]
+        sync_order_lines(action, lines, pairs)
+        Order.objects.filter(pk=instance.pk).recalculate_totals()
+        instance.refresh_from_db(fields=["total_amount"])
+        mark_days_dirty([day_of(instance.order_date)])
+        return
+
+    # product.order_set changes: pk_set holds order ids, except on clear
+    if action == "pre_clear":
+        instance._cleared_order_ids = list(instance.order_set.values_list("pk", flat=True))
+        return
+    if action == "post_clear":
+        order_ids = instance.__dict__.pop("_cleared_order_ids", [])
+    elif action in ("post_add", "post_remove"):
+        order_ids = pk_set
+    else:
+        return
+    orders = Order.objects.filter(pk__in=order_ids)
+    sync_order_lines(
+        action,
+        OrderLine.objects.filter(product=instance, order_id__in=order_ids),
+        [(order_id, instance.pk, instance.price) for order_id in order_ids],
+    )
+    orders.recalculate_totals()
+    mark_order_days_dirty(orders)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def queue_order_rollup(sender, instance, **kwargs):
+    mark_days_dirty([day_of(instance.order_date)])
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def queue_customer_rollup(sender, instance, created=True, **kwargs):
+    # only creation and deletion change the new-customer counts
+    if created:
+        mark_days_dirty([day_of(instance.created_at)])
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Order)
+def invalidate_cached_responses(sender, **kwargs):
+    invalidate_models(sender)
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def invalidate_cached_order_products(sender, action, **kwargs):
+    if action.startswith("post_"):
+        invalidate_models(Order, OrderLine, Product)
+
+
+# ---------- Celery task metrics ----------
+@before_task_publish.connect
+def stamp_task_published(headers=None, **kwargs):
+    if headers is not None:
+        headers["crm_published_at"] = time.time()
+
+
+@task_prerun.connect
+def start_task_timer(task=None, **kwargs):
+    labels = (("task", task.name),)
+    published_at = getattr(task.request, "crm_published_at", None)
+    if published_at is not None:
+        metrics.observe("celery_task_queue_latency_seconds", labels, time.time() - published_at)
+    task.request.crm_started = time.perf_counter()
+
+
+@task_postrun.connect
+def record_task_runtime(task=None, state=None, **kwargs):
+    labels = (("task", task.name),)
+    started = getattr(task.request, "crm_started", None)
+    if started is not None:
+        metrics.observe("celery_task_duration_seconds", labels, time.perf_counter() - started)
+    metrics.inc("celery_tasks_total", labels + (("state", state or "UNKNOWN"),))
+
+
+@worker_process_shutdown.connect
+def flush_worker_events(**kwargs):
+    # prefork children may exit without running atexit handlers
+    event_log.close()
@@ -0,0 +1,241 @@
+import math
+import random
+from bisect import bisect
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .bulk import copy_rows
+from .models import Customer, Order, OrderLine, Product
+from .response_cache import invalidate_models
+
+FIRST_NAMES = (
+    "Alice", "Bob", "Carol", "David", "Eve", "Frank", "Grace", "Heidi", "Ivan", "Judy",
+    "Mallory", "Niaj", "Olivia", "Peggy", "Rupert", "Sybil", "Trent", "Victor", "Walter", "Zoe",
+)
+LAST_NAMES = (
+    "Smith", "Johnson", "Okafor", "Garcia", "Mwangi", "Brown", "Kim", "Nguyen", "Patel", "Otieno",
+    "Rossi", "Muller", "Silva", "Tanaka", "Haddad", "Novak", "Kowalski", "Dubois", "Ali", "Evans",
+)
+ADJECTIVES = (
+    "Basic", "Compact", "Deluxe", "Ergonomic", "Portable", "Pro", "Rugged", "Smart", "Ultra", "Wireless",
+)
+NOUNS = (
+    "Camera", "Charger", "Headphones", "Keyboard", "Lamp", "Laptop", "Monitor", "Mouse", "Phone",
+    "Router", "Speaker", "Tablet", "Watch",
+)
+
+
+class Zipf:
+    """
+    Picks one of `items` with probability proportional to
+    1 / rank ** `exponent`. Ranks are dealt out in a shuffled order, so
+    the popular items are spread over the primary key range.
+    """
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(
+            accumulate(1 / rank ** exponent for rank in range(1, len(self.items) + 1))
+        )
+        self.rng = rng
+
+    def pick(self):
+        position = self.rng.random() * self.cum_weights[-1]
+        return self.items[bisect(self.cum_weights, position, 0, len(self.items) - 1)]
+
+
+def skewed_times(count, start, end, growth, rng):
+    """
+    Yield `count` increasing datetimes between `start` and `end` whose
+    density grows toward `end` when `growth` > 1, so ids follow dates and
+    recent days are the busiest.
+    """
+    span = (end - start).total_seconds()
+    for index in range(count):
+        position = ((index + rng.random()) / count) ** (1 / growth)
+        yield start + timedelta(seconds=span * position)
+
+
+def allocate_ids(model, count):
+    """
+    Reserve `count` primary keys of `model`: from its sequence on
+    PostgreSQL, past the current maximum elsewhere, which assumes nothing
+    else inserts into the table meanwhile.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [model._meta.db_table, count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+    top = model.objects.aggregate(top=Max("pk"))["top"] or 0
+    return range(top + 1, top + count + 1)
+
+
+def insert_rows(model, columns, rows, use_copy):
+    """
+    Insert tuples of values for the `columns` fields of `model`, with COPY
+    or a single executemany INSERT. Unlike bulk_create this keeps the
+    generated `created_at` and `order_date` instead of stamping them with
+    the current time.
+    """
+    fields = [model._meta.get_field(name) for name in columns]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if use_copy:
+            copy_rows(cursor, table, [field.column for field in fields], rows)
+            return
+        # the bare connection: going through the thread-local proxy for
+        # every value costs more than the INSERT itself
+        db = cursor.db
+        quote = db.ops.quote_name
+        cursor.executemany(
+            f"INSERT INTO {quote(table)} ({', '.join(quote(field.column) for field in fields)}) "
+            f"VALUES ({', '.join(['%s'] * len(fields))})",
+            [[field.get_db_prep_save(value, db) for field, value in zip(fields, row)] for row in rows],
+        )
+
+
+class SyntheticData:
+    """
+    Deterministic generator of customers, products and orders.
+
+    Each model draws from its own random stream seeded with `seed`, so the
+    same arguments, `end` included, always produce the same rows in an
+    empty database.
+    Product popularity and order counts per customer follow Zipf
+    distributions, sign-ups and orders grow denser toward `end`, orders
+    have a geometric number of lines around `lines` and a tenth of the
+    products are low on stock. Rows are written `chunk_size` at a time,
+    one transaction per chunk, with COPY on PostgreSQL.
+    """
+
+    def __init__(
+        self,
+        seed=0,
+        days=365,
+        end=None,
+        product_skew=1.1,
+        customer_skew=0.8,
+        growth=2.0,
+        lines=3,
+        chunk_size=5000,
+        use_copy=None,
+    ):
+        self.seed = seed
+        self.end = end or timezone.now()
+        self.start = self.end - timedelta(days=days)
+        self.product_skew = product_skew
+        self.customer_skew = customer_skew
+        self.growth = growth
+        self.lines = lines
+        self.chunk_size = chunk_size
+        self.use_copy = connection.vendor == "postgresql" if use_copy is None else use_copy
+
+    def rng(self, name):
+        return random.Random(f"{self.seed}:{name}")
+
+    def write(self, model, columns, count, make_row):
+        written = 0
+        while written < count:
+            size = min(self.chunk_size, count - written)
+            with transaction.atomic():
+                insert_rows(model, columns, [make_row(written + i) for i in range(size)], self.use_copy)
+            written += size
+        return written
+
+    def phone(self, rng):
+        roll = rng.random()
+        if roll < 0.2:
+            return None
+        digits = str(rng.randrange(10 ** 9, 10 ** 10))
+        if roll < 0.6:
+            return "+1" + digits
+        return f"{digits[:3]}-{digits[3:6]}-{digits[6:]}"
+
+    def customers(self, count):
+        rng = self.rng("customers")
+        offset = Customer.objects.count()
+        times = skewed_times(count, self.start, self.end, self.growth, rng)
+
+        def make_row(index):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            email = f"{first}.{last}.{offset + index}@example.com".lower()
+            return (f"{first} {last}", email, self.phone(rng), next(times))
+
+        return self.write(Customer, ("name", "email", "phone", "created_at"), count, make_row)
+
+    def products(self, count):
+        rng = self.rng("products")
+        offset = Product.objects.count()
+        times = skewed_times(count, self.start, self.end, 1.0, rng)
+
+        def make_row(index):
+            name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {offset + index}"
+            price = Decimal(str(round(min(math.exp(rng.gauss(3.5, 1.0)), 5000) + 0.5, 2)))
+            stock = rng.randint(0, 9) if rng.random() < 0.1 else rng.randint(10, 1000)
+            return (name, price, stock, next(times))
+
+        return self.write(Product, ("name", "price", "stock", "created_at"), count, make_row)
+
+    def line_count(self, rng, limit):
+        # geometric with mean `lines`
+        success = 1 / max(self.lines, 1)
+        if success >= 1:
+            return 1
+        return min(1 + int(math.log(1 - rng.random()) / math.log(1 - success)), limit)
+
+    def orders(self, count):
+        """
+        Create `count` orders for the existing customers and products,
+        with their lines, product links and totals.
+        """
+        rng = self.rng("orders")
+        customer_ids = list(Customer.objects.order_by("pk").values_list("pk", flat=True))
+        products = list(Product.objects.order_by("pk").values_list("pk", "price"))
+        if not customer_ids or not products:
+            return 0
+        customers = Zipf(customer_ids, self.customer_skew, rng)
+        popular = Zipf(products, self.product_skew, rng)
+        times = skewed_times(count, self.start, self.end, self.growth, rng)
+        limit = min(10, len(products))
+
+        written = 0
+        while written < count:
+            size = min(self.chunk_size, count - written)
+            orders, lines, links = [], [], []
+            for order_id in allocate_ids(Order, size):
+                quantities = {}
+                for _ in range(self.line_count(rng, limit)):
+                    quantities.setdefault(popular.pick(), 1 if rng.random() < 0.7 else rng.randint(2, 5))
+                total = sum((price * quantity for (_, price), quantity in quantities.items()), Decimal("0"))
+                orders.append((order_id, customers.pick(), total, next(times)))
+                for (product_id, price), quantity in quantities.items():
+                    lines.append((order_id, product_id, quantity, price))
+                    links.append((order_id, product_id))
+            with transaction.atomic():
+                insert_rows(Order, ("id", "customer", "total_amount", "order_date"), orders, self.use_copy)
+                insert_rows(OrderLine, ("order", "product", "quantity", "unit_price"), lines, self.use_copy)
+                insert_rows(Order.products.through, ("order", "product"), links, self.use_copy)
+            written += size
+        return written
+
+    def generate(self, customers=0, products=0, orders=0):
+        """
+        Create the given numbers of rows and return them as a dict. The
+        rollup watermarks pick the new orders up on the next catch-up.
+        """
+        created = {
+            "customers": self.customers(customers),
+            "products": self.products(products),
+            "orders": self.orders(orders),
+        }
+        invalidate_models(Customer, Product, Order)
+        return created
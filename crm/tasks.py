@@ -1,52 +1,160 @@
 import os
+import uuid
 import requests
 from datetime import datetime
-from decimal import Decimal
-from celery import shared_task
-from django.db.models import Sum, Count
-from .models import Customer, Order, Product
+from celery import chord, shared_task
+from django.db import DatabaseError
+from .batch import batch_option, merge_chunks, plan, run_chunk
+from .events import emit
+from .rollups import breakdown, catch_up, summarize
+from .routers import read_from_replica
 
 
 @shared_task
-def generate_crm_report():
+def refresh_crm_rollups():
+    """
+    Rebuild the reporting rollups for every day touched since the last run.
+    """
+    days = catch_up()
+    return f"CRM rollups refreshed for {days} days"
+
+
+@shared_task(acks_late=True)
+def send_order_reminder_batch(reminders):
+    """
+    Log one reminder per customer in the batch queued by
+    `crm.reminders.queue_order_reminders`.
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for reminder in reminders:
+        emit(
+            "order.reminder",
+            "/tmp/order_reminders_log.txt",
+            f"[{timestamp}] Reminder: Order ID {reminder['latest_order_id']}, "
+            f"Customer: {reminder['email']} ({reminder['orders']} new orders)",
+            order_id=reminder["latest_order_id"],
+            customer_id=reminder["customer_id"],
+            email=reminder["email"],
+            orders=reminder["orders"],
+        )
+    return len(reminders)
+
+
+# ---------- Batch fan-out ----------
+@shared_task(
+    acks_late=True,
+    autoretry_for=(DatabaseError,),
+    retry_backoff=batch_option("RETRY_BACKOFF", 5),
+    max_retries=batch_option("MAX_RETRIES", 3),
+)
+def run_batch_chunk(name, job_id, after, upto, options):
+    """
+    Process one id range of a batch job; safe to retry and redeliver.
+    """
+    return run_chunk(name, job_id, after, upto, options)
+
+
+@shared_task(acks_late=True)
+def merge_batch_chunks(results, name, job_id, options):
+    return merge_chunks(name, job_id, results, options)
+
+
+def fan_out(name, callback=None, chunk_size=None, **options):
+    """
+    Plan the id ranges of batch job `name` and dispatch them as a chord:
+    one `run_batch_chunk` per range, then `merge_batch_chunks`, whose
+    merged result is passed on to `callback` if given.
+    """
+    job_id = uuid.uuid4().hex
+    header = [
+        run_batch_chunk.s(name, job_id, after, upto, options)
+        for after, upto in plan(name, chunk_size, **options)
+    ]
+    body = merge_batch_chunks.s(name, job_id, options)
+    if callback is not None:
+        body = body | callback
+    return chord(header)(body)
+
+
+@shared_task
+def run_batch_job(name, chunk_size=None, **options):
+    """
+    Fan out a batch job ("restock", "rollups" or "order_totals") from a
+    worker, e.g. on a beat schedule.
+    """
+    result = fan_out(name, chunk_size=chunk_size, **options)
+    return f"Batch job {name} dispatched as {result.id}"
+
+
+@shared_task
+def generate_crm_report(period=None):
+    """
+    Rebuild the queued rollup days across the heavy workers, then write
+    the CRM report from them with `write_crm_report`.
+    """
+    fan_out("rollups", callback=write_crm_report.s(period=period))
+    return "CRM report queued"
+
+
+@shared_task
+def write_crm_report(rebuilt=None, period=None):
     """
     Generate a weekly CRM report summarizing:
     - Total number of customers
     - Total number of orders  
     - Total revenue (sum of all order amounts)
-    
+
+    Totals are read from the daily rollup tables instead of scanning the
+    customer and order tables. `generate_crm_report` rebuilds the queued
+    days on the heavy workers first and passes the merged result, the
+    number of days rebuilt, as `rebuilt`; this task only reads. When
+    `period` is "day", "week" or "month", one line per period follows.
+
     Logs the report to /tmp/crm_report_log.txt with timestamp.
     """
     try:
-        # Fetch CRM statistics using Django ORM
-        total_customers = Customer.objects.count()
-        total_orders = Order.objects.count()
-        
-        # Calculate total revenue from all orders
-        revenue_result = Order.objects.aggregate(total_revenue=Sum('total_amount'))
-        total_revenue = revenue_result['total_revenue'] or Decimal('0.00')
-        
+        rebuilt_days = (rebuilt or {}).get("days", 0)
+        # reporting reads go to the replica, which may lag the rebuild
+        # that ran before this task by its replication delay
+        with read_from_replica():
+            totals = summarize()
+            rows = breakdown(period) if period else []
+        total_customers = totals["customers"]
+        total_orders = totals["orders"]
+        total_revenue = totals["revenue"]
+
         # Format the report message
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         report_message = (
             f"{timestamp} - Report: {total_customers} customers, "
             f"{total_orders} orders, {total_revenue} revenue"
         )
-        
+        for row in rows:
+            report_message += (
+                f"\n{timestamp} - {period} {row['period']}: {row['total_customers']} customers, "
+                f"{row['total_orders']} orders, {row['total_revenue']} revenue"
+            )
+
         # Write report to log file
-        log_file = '/tmp/crm_report_log.txt'
-        with open(log_file, 'a') as f:
-            f.write(f"{report_message}\n")
+        emit(
+            "crm.report",
+            '/tmp/crm_report_log.txt',
+            report_message,
+            customers=total_customers,
+            orders=total_orders,
+            revenue=str(total_revenue),
+            period=period,
+            rebuilt_days=rebuilt_days,
+        )
         
         # Return summary for Celery logs
-        return f"CRM report generated: {total_customers} customers, {total_orders} orders, ${total_revenue} revenue"
+        return f"CRM report generated: {total_customers} customers, {total_orders} orders, ${total_revenue} revenue ({rebuilt_days} days rebuilt)"
         
     except Exception as e:
         # Log errors for debugging
         error_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        error_message = f"{error_timestamp} - Error generating report: {str(e)}\n"
-        
-        with open('/tmp/crm_report_log.txt', 'a') as f:
-            f.write(error_message)
+        error_message = f"{error_timestamp} - Error generating report: {str(e)}"
+
+        emit("crm.report_failed", '/tmp/crm_report_log.txt', error_message, error=str(e))
         
         raise
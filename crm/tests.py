@@ -1,3 +1,801 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .batch import plan, run_chunk
+from .bulk import copy_orders, copy_products
+from .celery import app as celery_app
+from .execution import run_in_pool
+from .metrics import MetricsRegistry, metrics
+from .cost import BUDGET_KEY_PREFIX, BUDGET_LOCK_SUFFIX, TokenBuckets
+from .cron import LOW_STOCK_MUTATION, run_job
+from .models import (
+    BatchChunk,
+    CrmDailyStats,
+    Customer,
+    Order,
+    OrderLine,
+    Product,
+    ProductDailyStats,
+    ReminderCheckpoint,
+    RollupDirtyDay,
+)
+from .reminders import queue_order_reminders
+from .response_cache import response_cache
+from .rollups import rebuild_range
+from .routers import ReplicaRouter, read_from_replica, replica_alias
+from .tasks import fan_out, refresh_crm_rollups, send_order_reminder_batch, write_crm_report
+from .tracing import Histogram, trace_stats
+from .views import AsyncCRMGraphQLView, CRMGraphQLView
+
+ORDERS_QUERY = """
+{ allOrders(first: 50) { edges { node {
+    totalAmount
+    customer { name }
+    products { edges { node { name } } }
+    lines { quantity product { name } }
+} } } }
+"""
+
+
+class GraphQLTestCase(TestCase):
+    """
+    Posts operations to /graphql through the test client, with empty
+    caches so budgets, idempotency keys and cached responses do not leak
+    between tests. Reads stay on the primary inside the test transaction.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.clear_response_cache()
+        self.customer = Customer.objects.create(name="Alice", email="alice@example.com")
+        self.laptop = Product.objects.create(name="Laptop", price=Decimal("10.00"), stock=5)
+        self.mouse = Product.objects.create(name="Mouse", price=Decimal("3.00"), stock=5)
+
+    def clear_response_cache(self):
+        if response_cache is not None:
+            response_cache.backend.clear()
+
+    def post(self, body, **headers):
+        return self.client.post(
+            "/graphql", json.dumps(body), content_type="application/json", **headers
+        )
+
+    def execute(self, query, variables=None, **headers):
+        response = self.post({"query": query, "variables": variables or {}}, **headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def create_orders(self, count):
+        for index in range(count):
+            order = Order.objects.create(
+                customer=self.customer,
+                order_date=timezone.now() - timedelta(days=index),
+                total_amount=Decimal("13.00"),
+            )
+            OrderLine.objects.bulk_create(
+                OrderLine(order=order, product=product, quantity=1, unit_price=product.price)
+                for product in (self.laptop, self.mouse)
+            )
+            order.products.add(self.laptop, self.mouse)
+
+    def count_queries(self, query):
+        self.clear_response_cache()
+        with CaptureQueriesContext(connection) as queries:
+            body = self.execute(query)
+        self.assertNotIn("errors", body)
+        return len(queries)
+
+
+class QueryCountTests(GraphQLTestCase):
+    def test_nested_relations_do_not_add_queries_per_order(self):
+        self.create_orders(2)
+        few = self.count_queries(ORDERS_QUERY)
+        self.create_orders(8)
+        self.assertEqual(self.count_queries(ORDERS_QUERY), few)
+
+    def test_product_order_lines_do_not_add_queries_per_product(self):
+        query = (
+            "{ allProducts(first: 20) { edges { node { name orderLines { quantity } } } } "
+            "allOrders(first: 10) { edges { node { products(first: 10) { edges { node "
+            "{ orderLines { quantity product { name } } } } } } } } }"
+        )
+        self.create_orders(2)
+        few = self.count_queries(query)
+        for index in range(8):
+            product = Product.objects.create(name=f"Cable {index}", price=Decimal("1.00"))
+            self.customer.order_set.first().products.add(product)
+        self.create_orders(2)
+        self.assertEqual(self.count_queries(query), few)
+
+    def test_nested_relations_resolve(self):
+        self.create_orders(1)
+        node = self.execute(ORDERS_QUERY)["data"]["allOrders"]["edges"][0]["node"]
+        self.assertEqual(node["customer"]["name"], "Alice")
+        self.assertEqual(len(node["products"]["edges"]), 2)
+        self.assertEqual({line["product"]["name"] for line in node["lines"]}, {"Laptop", "Mouse"})
+
+
+class KeysetPaginationTests(GraphQLTestCase):
+    query = """
+    query Page($after: String) { allOrdersKeyset(first: 3, after: $after) {
+        edges { node { id } } pageInfo { hasNextPage endCursor }
+    } }
+    """
+
+    def test_pages_do_not_overlap(self):
+        self.create_orders(5)
+        first = self.execute(self.query)["data"]["allOrdersKeyset"]
+        after = first["pageInfo"]["endCursor"]
+        second = self.execute(self.query, {"after": after})["data"]["allOrdersKeyset"]
+        ids = [edge["node"]["id"] for page in (first, second) for edge in page["edges"]]
+        self.assertTrue(first["pageInfo"]["hasNextPage"])
+        self.assertFalse(second["pageInfo"]["hasNextPage"])
+        self.assertEqual(len(set(ids)), 5)
+
+    def test_negative_page_size_is_rejected(self):
+        body = self.execute("{ allOrdersKeyset(last: -2) { edges { node { id } } } }")
+        self.assertEqual(
+            body["errors"][0]["message"], "Argument 'last' must be a non-negative integer."
+        )
+
+    def test_bad_cursor_is_rejected(self):
+        body = self.execute(self.query, {"after": "not-a-cursor"})
+        self.assertIn("Invalid cursor: not-a-cursor", body["errors"][0]["message"])
+
+
+class BulkMutationTests(GraphQLTestCase):
+    def test_bulk_create_customers_reports_duplicate_emails(self):
+        body = self.execute(
+            "mutation($input: [CustomerInput]!) { bulkCreateCustomers(input: $input) "
+            "{ customers { email } errors } }",
+            {
+                "input": [
+                    {"name": "Bob", "email": "bob@example.com"},
+                    {"name": "Alice", "email": "alice@example.com"},
+                ]
+            },
+        )
+        result = body["data"]["bulkCreateCustomers"]
+        self.assertEqual([c["email"] for c in result["customers"]], ["bob@example.com"])
+        self.assertEqual(result["errors"], ["['Email alice@example.com already exists']"])
+
+    def test_bulk_create_orders_reports_invalid_rows(self):
+        body = self.execute(
+            "mutation($input: [OrderInput]!) { bulkCreateOrders(input: $input) "
+            "{ orders { totalAmount } errors } }",
+            {
+                "input": [
+                    {"customerId": str(self.customer.pk), "productIds": [str(self.laptop.pk)]},
+                    {"customerId": "0", "productIds": [str(self.laptop.pk)]},
+                ]
+            },
+        )
+        result = body["data"]["bulkCreateOrders"]
+        self.assertEqual(result["orders"], [{"totalAmount": "10.00"}])
+        self.assertEqual(result["errors"], ["['Invalid customer ID']"])
+        self.assertEqual(Product.objects.get(pk=self.laptop.pk).stock, 4)
+
+
+class RestockTests(GraphQLTestCase):
+    mutation = """
+    mutation($threshold: Int, $batchSize: Int) {
+        updateLowStockProducts(threshold: $threshold, increment: 10, batchSize: $batchSize) {
+            products { name stock } message
+        }
+    }
+    """
+
+    def test_batches_restock_each_low_stock_product_once(self):
+        Product.objects.create(name="Desk", price=Decimal("50.00"), stock=20)
+        body = self.execute(self.mutation, {"threshold": 16, "batchSize": 1})
+        result = body["data"]["updateLowStockProducts"]
+        self.assertEqual(result["message"], "Updated 2 low-stock products")
+        self.assertEqual(
+            {product["name"]: product["stock"] for product in result["products"]},
+            {"Laptop": 15, "Mouse": 15},
+        )
+        self.assertEqual(Product.objects.get(name="Desk").stock, 20)
+
+    def test_negative_threshold_is_rejected(self):
+        body = self.execute(self.mutation, {"threshold": -1})
+        self.assertEqual(body["errors"][0]["message"], "Threshold cannot be negative")
+        self.assertEqual(Product.objects.get(pk=self.laptop.pk).stock, 5)
+
+
+class ImportTests(GraphQLTestCase):
+    def write_rows(self, rows):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / "rows.ndjson"
+        path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+        return str(path)
+
+    def test_import_orders_snapshots_prices_and_reports_bad_rows(self):
+        path = self.write_rows(
+            [
+                {
+                    "customer_id": self.customer.pk,
+                    "product_ids": f"{self.laptop.pk},{self.mouse.pk}",
+                    "order_date": "2026-01-02T10:00:00+00:00",
+                },
+                {"customer_id": 0, "product_ids": str(self.laptop.pk)},
+                {"customer_id": self.customer.pk, "product_ids": "x"},
+            ]
+        )
+        call_command("import_crm", "orders", path, stdout=io.StringIO(), stderr=io.StringIO())
+        order = Order.objects.get()
+        self.assertEqual(order.total_amount, Decimal("13.00"))
+        self.assertEqual(
+            dict(order.lines.values_list("product__name", "unit_price")),
+            {"Laptop": Decimal("10.00"), "Mouse": Decimal("3.00")},
+        )
+        self.assertEqual(order.products.count(), 2)
+        self.assertEqual(Product.objects.get(pk=self.laptop.pk).stock, 5)
+
+    @skipUnless(connection.vendor == "postgresql", "COPY needs PostgreSQL")
+    def test_copy_products_upserts_and_reports_missing_ids(self):
+        inserted, updated, errors = copy_products(
+            [
+                {"id": self.laptop.pk, "name": "Laptop", "price": "12.00", "stock": 7},
+                {"name": "Lamp", "price": "5.00"},
+                {"id": 999999, "name": "Ghost", "price": "1.00"},
+            ],
+            chunk_size=2,
+        )
+        self.assertEqual((inserted, updated), (1, 1))
+        self.assertEqual(errors, ["['Product 999999 does not exist']"])
+        self.assertEqual(Product.objects.get(pk=self.laptop.pk).price, Decimal("12.00"))
+        self.assertTrue(Product.objects.filter(name="Lamp", stock=0).exists())
+
+    @skipUnless(connection.vendor == "postgresql", "COPY needs PostgreSQL")
+    def test_copy_orders_skips_rows_without_customer_or_products(self):
+        inserted, skipped, errors = copy_orders(
+            [
+                {"customer_id": self.customer.pk, "product_ids": [self.laptop.pk, self.mouse.pk]},
+                {"customer_id": 0, "product_ids": [self.laptop.pk]},
+                {"customer_id": self.customer.pk, "product_ids": [999999]},
+            ],
+            chunk_size=2,
+        )
+        self.assertEqual((inserted, skipped, errors), (1, 2, []))
+        order = Order.objects.get()
+        self.assertEqual(order.total_amount, Decimal("13.00"))
+        self.assertEqual(order.lines.count(), 2)
+        self.assertEqual(order.products.count(), 2)
+
+
+class AnalyticsTests(GraphQLTestCase):
+    query = """
+    query($from: Date) {
+        revenueByPeriod(granularity: DAY, from: $from) { orders revenue }
+        topCustomers(by: ORDERS) { customer { name } orders revenue }
+        topProducts(limit: 1) { product { name } units revenue }
+    }
+    """
+
+    def test_aggregates_use_line_quantities_and_the_date_range(self):
+        self.create_orders(3)
+        bob = Customer.objects.create(name="Bob", email="bob@example.com")
+        order = Order.objects.create(customer=bob, total_amount=Decimal("0"))
+        OrderLine.objects.create(
+            order=order, product=self.mouse, quantity=3, unit_price=Decimal("3.00")
+        )
+        order.products.add(self.mouse)
+
+        yesterday = timezone.localdate() - timedelta(days=1)
+        data = self.execute(self.query, {"from": yesterday.isoformat()})["data"]
+        # SQLite drops the scale of summed decimals, so compare values
+        self.assertEqual(
+            [(row["orders"], Decimal(row["revenue"])) for row in data["revenueByPeriod"]],
+            [(1, Decimal("13")), (2, Decimal("22"))],
+        )
+        self.assertEqual(
+            [
+                (row["customer"]["name"], row["orders"], Decimal(row["revenue"]))
+                for row in data["topCustomers"]
+            ],
+            [("Alice", 3, Decimal("39")), ("Bob", 1, Decimal("9"))],
+        )
+        [product] = data["topProducts"]
+        self.assertEqual(
+            (product["product"]["name"], product["units"], Decimal(product["revenue"])),
+            ("Laptop", 3, Decimal("30")),
+        )
+
+    def test_non_positive_limit_is_rejected(self):
+        body = self.execute("{ topProducts(limit: 0) { units } }")
+        self.assertEqual(body["errors"][0]["message"], "Limit must be positive")
+
+
+class CreateOrderTests(GraphQLTestCase):
+    mutation = """
+    mutation($customerId: ID!, $lines: [OrderLineInput]) {
+        createOrder(customerId: $customerId, lines: $lines) { order { totalAmount } }
+    }
+    """
+
+    def create_order(self, *lines):
+        return self.execute(
+            self.mutation,
+            {
+                "customerId": str(self.customer.pk),
+                "lines": [{"productId": str(p.pk), "quantity": q} for p, q in lines],
+            },
+        )
+
+    def test_total_is_quantity_times_price(self):
+        body = self.create_order((self.laptop, 2), (self.mouse, 1))
+        self.assertEqual(body["data"]["createOrder"]["order"]["totalAmount"], "23.00")
+        self.assertEqual(Product.objects.get(pk=self.laptop.pk).stock, 3)
+        self.assertEqual(OrderLine.objects.filter(product=self.laptop).get().quantity, 2)
+
+    def test_reserve_stock_never_oversells(self):
+        body = self.create_order((self.laptop, 6), (self.mouse, 1))
+        self.assertEqual(body["errors"][0]["message"], "Insufficient stock for Laptop (5 left)")
+        self.assertEqual(Product.objects.get(pk=self.mouse.pk).stock, 5)
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderProductSyncTests(GraphQLTestCase):
+    def test_adding_and_removing_products_keeps_lines_and_total_in_step(self):
+        self.create_orders(1)
+        order = Order.objects.get()
+        lamp = Product.objects.create(name="Lamp", price=Decimal("5.00"))
+        order.products.add(lamp)
+        self.assertEqual(order.lines.get(product=lamp).unit_price, Decimal("5.00"))
+        self.assertEqual(order.total_amount, Decimal("18.00"))
+        order.products.remove(self.laptop)
+        self.assertFalse(order.lines.filter(product=self.laptop).exists())
+        self.assertEqual(order.total_amount, Decimal("8.00"))
+
+    def test_reverse_side_keeps_lines_and_totals_in_step(self):
+        self.create_orders(2)
+        self.laptop.order_set.clear()
+        self.assertFalse(OrderLine.objects.filter(product=self.laptop).exists())
+        totals = set(Order.objects.values_list("total_amount", flat=True))
+        self.assertEqual(totals, {Decimal("3.00")})
+
+
+class LegacyOrderBackfillTests(GraphQLTestCase):
+    def test_backfilled_lines_keep_the_price_through_later_changes(self):
+        order = Order.objects.create(customer=self.customer, total_amount=Decimal("13.00"))
+        # links written before order lines existed, bypassing the m2m signals
+        Order.products.through.objects.bulk_create(
+            Order.products.through(order=order, product=product)
+            for product in (self.laptop, self.mouse)
+        )
+        backfill = import_module("crm.migrations.0011_backfill_order_lines")
+        backfill.backfill_order_lines(apps, None)
+        self.assertEqual(order.lines.get(product=self.laptop).unit_price, Decimal("10.00"))
+        day = timezone.localdate(order.order_date)
+        self.assertTrue(RollupDirtyDay.objects.filter(day=day).exists())
+
+        Product.objects.filter(pk=self.laptop.pk).update(price=Decimal("99.00"))
+        Order.objects.recalculate_totals()
+        rebuild_range(day, day + timedelta(days=1))
+        self.assertEqual(Order.objects.get().total_amount, Decimal("13.00"))
+        stats = ProductDailyStats.objects.get(day=day, product=self.laptop)
+        self.assertEqual((stats.units, stats.revenue), (1, Decimal("10.00")))
+
+
+class BatchJobTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        conf = {"task_always_eager": True, "task_eager_propagates": True}
+        previous = {name: celery_app.conf[name] for name in conf}
+        celery_app.conf.update(conf)
+        self.addCleanup(celery_app.conf.update, previous)
+
+    def test_rerun_chunk_returns_the_stored_result_without_redoing_the_work(self):
+        options = {"threshold": 10, "increment": 10}
+        (after, upto), = plan("restock", **options)
+        first = run_chunk("restock", "job-1", after, upto, options)
+        again = run_chunk("restock", "job-1", after, upto, options)
+        self.assertEqual(first, {"restocked": 2})
+        self.assertEqual(again, first)
+        self.assertEqual(Product.objects.get(pk=self.laptop.pk).stock, 15)
+        self.assertEqual(BatchChunk.objects.filter(job_id="job-1").count(), 1)
+
+    def test_rollups_chord_rebuilds_queued_days_then_writes_the_report(self):
+        self.create_orders(3)
+        with mock.patch("crm.tasks.emit") as emit:
+            fan_out("rollups", callback=write_crm_report.s(), chunk_size=2)
+        self.assertFalse(RollupDirtyDay.objects.exists())
+        self.assertFalse(BatchChunk.objects.exists())
+        self.assertEqual(CrmDailyStats.objects.aggregate(orders=Sum("orders"))["orders"], 3)
+        kind, _, _ = emit.call_args.args
+        self.assertEqual(kind, "crm.report")
+        self.assertEqual(emit.call_args.kwargs["orders"], 3)
+        self.assertEqual(emit.call_args.kwargs["rebuilt_days"], 3)
+
+
+class ViewTests(GraphQLTestCase):
+    products_query = "{ allProducts(first: 10) { edges { node { name } } } }"
+
+    def product_names(self):
+        edges = self.execute(self.products_query)["data"]["allProducts"]["edges"]
+        return {edge["node"]["name"] for edge in edges}
+
+    def test_response_cache_is_invalidated_by_mutations(self):
+        self.product_names()
+        hits = response_cache.hits
+        self.assertEqual(self.product_names(), {"Laptop", "Mouse"})
+        self.assertEqual(response_cache.hits, hits + 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.execute('mutation { createProduct(name: "Lamp", price: "5.00") { message } }')
+        self.assertEqual(self.product_names(), {"Laptop", "Mouse", "Lamp"})
+
+    def test_replica_reads_after_an_invalidation_are_not_cached(self):
+        self.product_names()
+        with mock.patch.object(response_cache, "replica_lag", 5), mock.patch(
+            "crm.views.reading_from_replica", return_value=True
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.execute('mutation { createProduct(name: "Lamp", price: "5.00") { message } }')
+            self.product_names()
+            hits = response_cache.hits
+            self.product_names()
+        self.assertEqual(response_cache.hits, hits)
+
+    def test_persisted_query_is_registered_then_served_by_hash(self):
+        sha = hashlib.sha256(self.products_query.encode()).hexdigest()
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": sha}}
+        missing = self.post({"extensions": extensions}).json()
+        self.assertEqual(missing["errors"][0]["extensions"]["code"], "PERSISTED_QUERY_NOT_FOUND")
+        self.post({"query": self.products_query, "extensions": extensions})
+        body = self.post({"extensions": extensions}).json()
+        self.assertEqual(len(body["data"]["allProducts"]["edges"]), 2)
+
+    def test_invalid_or_costly_documents_are_not_registered(self):
+        costly = (
+            "{ allCustomers(first: 100) { edges { node { orderSet(first: 100) { edges { node "
+            "{ products(first: 100) { edges { node { orderSet(first: 100) { edges { node { id "
+            "} } } } } } } } } } } } }"
+        )
+        for query in ("{ noSuchField }", costly):
+            sha = hashlib.sha256(query.encode()).hexdigest()
+            extensions = {"persistedQuery": {"version": 1, "sha256Hash": sha}}
+            self.post({"query": query, "extensions": extensions})
+            body = self.post({"extensions": extensions}).json()
+            self.assertEqual(body["errors"][0]["extensions"]["code"], "PERSISTED_QUERY_NOT_FOUND")
+
+    def test_batch_returns_one_result_per_operation(self):
+        response = self.post([{"query": self.products_query}, {"query": "{ hello }"}])
+        results = response.json()
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(results[0]["data"]["allProducts"]["edges"]), 2)
+        self.assertIn("hello", results[1]["data"])
+
+    def test_idempotency_key_replays_and_rejects_other_requests(self):
+        mutation = {"query": 'mutation { createCustomer(name: "B", email: "b@x.io") { message } }'}
+        first = self.post(mutation, HTTP_IDEMPOTENCY_KEY="k1")
+        replay = self.post(mutation, HTTP_IDEMPOTENCY_KEY="k1")
+        self.assertEqual(replay.content, first.content)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(Customer.objects.filter(email="b@x.io").count(), 1)
+        other = self.post({"query": self.products_query}, HTTP_IDEMPOTENCY_KEY="k1")
+        self.assertEqual(other.status_code, 422)
+
+    def test_costly_query_is_rejected_before_execution(self):
+        response = self.post(
+            {
+                "query": "{ allCustomers(first: 100) { edges { node { orderSet(first: 100) "
+                "{ edges { node { products(first: 100) { edges { node { orderSet(first: 100) "
+                "{ edges { node { id } } } } } } } } } } } } }"
+            }
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"][0]["extensions"]["code"], "QUERY_TOO_COSTLY")
+
+    def test_negative_page_size_does_not_lower_the_cost(self):
+        nested = (
+            "{ edges { node { orderSet(first: 100) { edges { node { products(first: 100) "
+            "{ edges { node { orderSet(first: 100) { edges { node { id } } } } } } } } } } } }"
+        )
+        query = "{ deep: allCustomers(first: 100) %s cheap: allCustomers(first: -100) %s }"
+        response = self.post({"query": query % (nested, nested)})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"][0]["extensions"]["code"], "QUERY_TOO_COSTLY")
+
+
+class TracingTests(GraphQLTestCase):
+    query = """
+    query Orders {
+        recent: allOrders(first: 50) { edges { node { customer { name } lines { quantity } } } }
+        allOrders(first: 1) { edges { node { id } } }
+    }
+    """
+
+    def histogram(self, kind, name):
+        return trace_stats.histograms[kind].get(name) or Histogram()
+
+    def test_root_fields_account_for_every_query_under_one_lock(self):
+        self.create_orders(2)
+        before = self.histogram("operations", "Orders").as_dict()
+        with mock.patch.object(
+            trace_stats, "observe_many", wraps=trace_stats.observe_many
+        ) as observe_many, CaptureQueriesContext(connection) as queries:
+            self.execute(self.query)
+        self.assertEqual(observe_many.call_count, 1)
+        observed = observe_many.call_args.args[0]
+        self.assertEqual(
+            [name for kind, name, *_ in observed if kind == "fields"],
+            ["Query.allOrders", "Query.allOrders"],
+        )
+        operation = self.histogram("operations", "Orders")
+        self.assertEqual(operation.count, before["count"] + 1)
+        self.assertEqual(operation.sql_count - before["sql_count"], len(queries))
+        self.assertEqual(sum(sql_count for *_, sql_count, _ in observed[:-1]), len(queries))
+
+    def test_detailed_trace_times_every_resolver(self):
+        self.create_orders(1)
+        body = self.post({"query": self.query}, HTTP_X_GRAPHQL_TRACE="1").json()
+        resolvers = body["extensions"]["tracing"]["execution"]["resolvers"]
+        paths = {tuple(resolver["path"]) for resolver in resolvers}
+        self.assertIn(("recent", "edges", 0, "node", "customer", "name"), paths)
+        self.assertNotIn("tracing", self.execute(self.query).get("extensions", {}))
+
+
+class AsyncViewTests(TransactionTestCase):
+    """
+    The async view resolves in pool threads with their own connections, so
+    the data must be committed for them to see it.
+    """
+
+    view = staticmethod(AsyncCRMGraphQLView.as_view())
+
+    def setUp(self):
+        cache.clear()
+        if response_cache is not None:
+            response_cache.backend.clear()
+        Product.objects.create(name="Laptop", price=Decimal("10.00"), stock=5)
+        Customer.objects.create(name="Alice", email="alice@example.com")
+
+    async def post(self, body, headers=None):
+        request = AsyncRequestFactory().post(
+            "/graphql", json.dumps(body), content_type="application/json", headers=headers
+        )
+        return await self.view(request)
+
+    async def test_root_fields_resolve_in_the_resolver_pool(self):
+        query = (
+            "{ allProducts(first: 5) { edges { node { name } } } "
+            "allCustomers(first: 5) { edges { node { name } } } hello }"
+        )
+        with mock.patch("crm.execution.run_in_pool", wraps=run_in_pool) as pooled:
+            response = await self.post({"query": query})
+        data = json.loads(response.content)["data"]
+        self.assertEqual(data["allProducts"]["edges"], [{"node": {"name": "Laptop"}}])
+        self.assertEqual(data["allCustomers"]["edges"], [{"node": {"name": "Alice"}}])
+        self.assertEqual(pooled.call_count, 3)
+
+    async def test_mutations_and_batches_run_in_order(self):
+        response = await self.post(
+            [
+                {"query": 'mutation { createProduct(name: "Lamp", price: "5.00") { message } }'},
+                {"query": "{ allProducts(first: 5) { edges { node { name } } } }"},
+            ]
+        )
+        created, listed = json.loads(response.content)
+        self.assertNotIn("errors", created)
+        names = {edge["node"]["name"] for edge in listed["data"]["allProducts"]["edges"]}
+        self.assertEqual(names, {"Laptop", "Lamp"})
+
+    async def test_idempotency_key_replays_the_stored_response(self):
+        mutation = {"query": 'mutation { createCustomer(name: "B", email: "b@x.io") { message } }'}
+        first = await self.post(mutation, {"Idempotency-Key": "k1"})
+        replay = await self.post(mutation, {"Idempotency-Key": "k1"})
+        self.assertEqual(replay.content, first.content)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        count = await Customer.objects.filter(email="b@x.io").acount()
+        self.assertEqual(count, 1)
+
+
+class MetricsTests(GraphQLTestCase):
+    def counter(self, name, *labels):
+        return metrics.snapshot()["counters"].get((name, labels), 0)
+
+    def test_operations_and_their_sql_are_counted(self):
+        self.create_orders(2)
+        requests = self.counter("graphql_requests_total", ("operation", "Orders"))
+        queries = self.counter("graphql_sql_queries_total", ("operation", "Orders"))
+        self.clear_response_cache()
+        with CaptureQueriesContext(connection) as captured:
+            self.post({"query": "query Orders " + ORDERS_QUERY, "operationName": "Orders"})
+        self.assertEqual(
+            self.counter("graphql_requests_total", ("operation", "Orders")), requests + 1
+        )
+        self.assertEqual(
+            self.counter("graphql_sql_queries_total", ("operation", "Orders")),
+            queries + len(captured),
+        )
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn('graphql_requests_total{operation="Orders"}', body)
+        self.assertIn('graphql_request_duration_seconds_bucket{operation="Orders",le="+Inf"}', body)
+
+    def test_celery_tasks_are_counted_by_state(self):
+        labels = (("task", refresh_crm_rollups.name), ("state", "SUCCESS"))
+        before = self.counter("celery_tasks_total", *labels)
+        refresh_crm_rollups.apply()
+        self.assertEqual(self.counter("celery_tasks_total", *labels), before + 1)
+
+    def test_collect_merges_the_snapshots_of_other_processes(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        registry = MetricsRegistry(directory.name)
+        registry.inc("graphql_requests_total", (("operation", "Orders"),), 2)
+        other = {"counters": [[["graphql_requests_total", [["operation", "Orders"]]], 3]]}
+        Path(directory.name, "0.json").write_text(json.dumps(other))
+        counters = registry.collect()["counters"]
+        self.assertEqual(counters[("graphql_requests_total", (("operation", "Orders"),))], 5)
+
+    def test_token_is_required_when_configured(self):
+        with self.settings(CRM_METRICS={"TOKEN": "s3cret"}):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+
+
+class CronJobTests(GraphQLTestCase):
+    def test_job_commits_its_mutation_and_reports_ok(self):
+        with self.assertLogs("crm.cron", "INFO") as logs:
+            result = run_job("low_stock", LOW_STOCK_MUTATION)
+        self.assertEqual(result["status"], "ok")
+        self.assertEqual(json.loads(logs.records[0].getMessage())["job"], "low_stock")
+        self.assertEqual(Product.objects.get(pk=self.laptop.pk).stock, 15)
+
+    def test_job_past_its_deadline_is_rolled_back(self):
+        # the deadline is taken from the first reading; every later one is past it
+        readings = iter([0.0])
+        with mock.patch(
+            "crm.cron.time.monotonic", side_effect=lambda: next(readings, 1000.0)
+        ), self.assertLogs("crm.cron", "ERROR"):
+            result = run_job("low_stock", LOW_STOCK_MUTATION, timeout=5)
+        self.assertEqual((result["status"], result["errors"]), ("timeout", ["Timed out after 5s"]))
+        self.assertEqual(Product.objects.get(pk=self.laptop.pk).stock, 5)
+
+    def test_failing_job_reports_its_errors(self):
+        with self.assertLogs("crm.cron", "ERROR"):
+            result = run_job("broken", "{ noSuchField }")
+        self.assertEqual(result["status"], "error")
+        self.assertIn("noSuchField", result["errors"][0])
+
+
+class ReminderTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customers = [self.customer] + [
+            Customer.objects.create(name=name, email=f"{name.lower()}@example.com")
+            for name in ("Bob", "Carol")
+        ]
+        for customer in self.customers:
+            Order.objects.create(customer=customer, total_amount=Decimal("1.00"))
+        self.sent = []
+
+    def send(self, reminders, fail_on=None):
+        self.sent.append([reminder["email"] for reminder in reminders])
+        result = mock.Mock()
+        if len(self.sent) == fail_on:
+            result.get.side_effect = TimeoutError
+        return result
+
+    def queue(self, fail_on=None):
+        with mock.patch.object(
+            send_order_reminder_batch, "delay", side_effect=lambda r: self.send(r, fail_on)
+        ):
+            return queue_order_reminders(batch_size=1, max_in_flight=1)
+
+    def test_customers_are_reminded_once_per_new_order(self):
+        self.assertEqual(self.queue(), 3)
+        self.assertEqual(self.queue(), 0)
+        Order.objects.create(customer=self.customers[1], total_amount=Decimal("1.00"))
+        self.sent = []
+        self.assertEqual(self.queue(), 1)
+        self.assertEqual(self.sent, [["bob@example.com"]])
+
+    def test_interrupted_run_resumes_after_the_last_confirmed_batch(self):
+        with self.assertRaises(TimeoutError):
+            self.queue(fail_on=2)
+        checkpoint = ReminderCheckpoint.objects.get()
+        self.assertEqual(checkpoint.customer_position, self.customer.pk)
+        # placed after the interrupted run started, so left to the next run
+        Order.objects.create(customer=self.customer, total_amount=Decimal("1.00"))
+
+        self.sent = []
+        self.assertEqual(self.queue(), 2)
+        self.assertEqual(self.sent, [["bob@example.com"], ["carol@example.com"]])
+        self.sent = []
+        self.assertEqual(self.queue(), 1)
+        self.assertEqual(self.sent, [["alice@example.com"]])
+
+
+@skipUnless(replica_alias(), "needs a replica alias")
+class ReplicaRoutingTests(GraphQLTestCase):
+    def reads_from_replica(self, query, address="127.0.0.1"):
+        request = RequestFactory().post("/graphql", REMOTE_ADDR=address)
+        return CRMGraphQLView().reads_from_replica(request, {"query": query})
+
+    def test_reads_inside_the_block_go_to_the_replica_outside_transactions(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Product), "default")
+        with read_from_replica(), mock.patch.object(connection, "in_atomic_block", False):
+            self.assertEqual(router.db_for_read(Product), "replica")
+            self.assertEqual(router.db_for_write(Product), "default")
+        # the test transaction is open, as in a mutation
+        with read_from_replica():
+            self.assertEqual(router.db_for_read(Product), "default")
+
+    def test_client_sticks_to_the_primary_after_a_mutation(self):
+        products = "{ allProducts(first: 5) { edges { node { name } } } }"
+        mutation = 'mutation { createProduct(name: "Lamp", price: "5.00") { message } }'
+        self.assertTrue(self.reads_from_replica(products))
+        self.assertFalse(self.reads_from_replica(mutation))
+        self.execute(mutation)
+        self.assertFalse(self.reads_from_replica(products))
+        self.assertTrue(self.reads_from_replica(products, address="10.0.0.2"))
+
+
+class SlowReadCache:
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.cache, name)
+
+    def get(self, key, default=None):
+        value = self.cache.get(key, default)
+        time.sleep(0.001)
+        return value
+
+
+class TokenBucketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.buckets = TokenBuckets({"default": {"CAPACITY": 100, "REFILL_RATE": 0}})
+
+    def test_negative_cost_never_refills_the_bucket(self):
+        self.buckets.consume("client", 60)
+        self.assertEqual(self.buckets.consume("client", -1000), (True, 40, 0))
+        self.assertFalse(self.buckets.consume("client", 50)[0])
+
+    def test_workers_sharing_the_cache_do_not_lose_updates(self):
+        # one TokenBuckets per simulated worker, so only the cache lock
+        # serializes them; slow reads widen the read-modify-write window
+        workers = [TokenBuckets(self.buckets.budgets) for _ in range(4)]
+        for buckets in workers:
+            buckets.cache = SlowReadCache(cache)
+
+        def spend(buckets):
+            for _ in range(20):
+                buckets.consume("client", 1)
+
+        threads = [threading.Thread(target=spend, args=(buckets,)) for buckets in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.buckets.consume("client", 0)[1], 20)
+
+    def test_consume_waits_for_another_workers_lock(self):
+        cache.add(BUDGET_KEY_PREFIX + "client" + BUDGET_LOCK_SUFFIX, 1, 1)
+        start = time.monotonic()
+        self.assertTrue(self.buckets.consume("client", 1)[0])
+        self.assertGreaterEqual(time.monotonic() - start, 0.5)
@@ -0,0 +1,304 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+
+from django.db import connections
+from graphql import ExecutionContext
+
+from .conf import graphene_option
+from .metrics import metrics
+
+# upper bounds of the duration histogram buckets, in milliseconds
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def tracing_option(name, default=None):
+    return graphene_option("TRACING", {}).get(name, default)
+
+
+class Histogram:
+    """
+    Fixed-bucket duration histogram with SQL query totals.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = self.max = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+
+    def observe(self, ms, sql_count=0, sql_time=0.0):
+        index = next((i for i, bound in enumerate(BUCKETS_MS) if ms <= bound), len(BUCKETS_MS))
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.sql_count += sql_count
+        self.sql_time += sql_time
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the `q` quantile (the maximum for
+        the overflow bucket).
+        """
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= q * self.count:
+                return min(BUCKETS_MS[index], self.max) if index < len(BUCKETS_MS) else self.max
+        return 0.0
+
+    def merge(self, other):
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.sql_count += other.sql_count
+        self.sql_time += other.sql_time
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        vars(histogram).update(data)
+        return histogram
+
+
+class TraceStats:
+    """
+    Per-process histograms of operation and field durations.
+
+    Snapshots are written to `stats_dir` as `<pid>.json`, at most every
+    `flush_interval` seconds and at exit, so a separate process such as the
+    `graphql_trace_stats` command can merge the numbers of every worker.
+    """
+
+    def __init__(self, stats_dir=None, flush_interval=10):
+        self.stats_dir = stats_dir
+        self.flush_interval = flush_interval
+        self.started = time.time()
+        self.histograms = {"operations": {}, "fields": {}}
+        self._flushed = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, kind, name, ms, sql_count=0, sql_time=0.0):
+        self.observe_many([(kind, name, ms, sql_count, sql_time)])
+
+    def observe_many(self, observations):
+        """
+        Record `(kind, name, ms, sql_count, sql_time)` tuples, taking the
+        lock once for all of them.
+        """
+        with self._lock:
+            for kind, name, ms, sql_count, sql_time in observations:
+                histogram = self.histograms[kind].get(name)
+                if histogram is None:
+                    histogram = self.histograms[kind][name] = Histogram()
+                histogram.observe(ms, sql_count, sql_time)
+        if self.stats_dir and time.monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "started": self.started,
+                **{
+                    kind: {name: h.as_dict() for name, h in histograms.items()}
+                    for kind, histograms in self.histograms.items()
+                },
+            }
+
+    def flush(self):
+        if not self.stats_dir:
+            return
+        self._flushed = time.monotonic()
+        os.makedirs(self.stats_dir, exist_ok=True)
+        path = os.path.join(self.stats_dir, f"{os.getpid()}.json")
+        # write and rename so readers never see a partial file
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+
+def load_trace_stats(stats_dir):
+    """
+    Merge the snapshots of every process in `stats_dir` into
+    `{"operations": {name: Histogram}, "fields": {name: Histogram}}`.
+    """
+    merged = {"operations": {}, "fields": {}}
+    for path in glob.glob(os.path.join(stats_dir, "*.json")):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for kind, histograms in merged.items():
+            for name, data in snapshot.get(kind, {}).items():
+                histograms.setdefault(name, Histogram()).merge(Histogram.from_dict(data))
+    return merged
+
+
+class SQLTimer:
+    """
+    `connection.execute_wrapper` callable counting and timing queries.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - start
+
+
+@contextmanager
+def timing_sql(sql):
+    """
+    Pass the queries of this thread's connections through `sql`.
+    """
+    # reads may go to the replica alias, so every connection is timed
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(sql))
+        yield sql
+
+
+class Trace:
+    """
+    Timings of one operation. Root fields are kept until the operation
+    finishes and then fed to the histograms together; detailed traces also
+    keep every resolver for the Apollo tracing extension.
+    """
+
+    def __init__(self, detailed=False):
+        self.detailed = detailed
+        self.start_time = datetime.now(timezone.utc)
+        self.start = time.perf_counter_ns()
+        self.fields = []
+        self.resolvers = []
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self._lock = threading.Lock()
+
+    def record_field(self, field, duration, sql):
+        with self._lock:
+            self.sql_count += sql.count
+            self.sql_time += sql.time
+            self.fields.append(("fields", field, duration / 1e6, sql.count, sql.time * 1000))
+
+    def record(self, info, start, duration, sql):
+        self.resolvers.append(
+            {
+                "path": info.path.as_list(),
+                "parentType": info.parent_type.name,
+                "fieldName": info.field_name,
+                "returnType": str(info.return_type),
+                "startOffset": start - self.start,
+                "duration": duration,
+                "sqlCount": sql.count,
+                "sqlDuration": int(sql.time * 1e9),
+            }
+        )
+
+    def finish(self, operation_name):
+        """
+        Record the operation and return its tracing extension, if detailed.
+        """
+        duration = time.perf_counter_ns() - self.start
+        operation = ("operations", operation_name, duration / 1e6)
+        trace_stats.observe_many(
+            [*self.fields, (*operation, self.sql_count, self.sql_time * 1000)]
+        )
+        sql_counts = Counter()
+        for _, field, _, sql_count, _ in self.fields:
+            sql_counts[field] += sql_count
+        for field, sql_count in sql_counts.items():
+            if sql_count:
+                metrics.inc("graphql_resolver_sql_queries_total", (("field", field),), sql_count)
+        if not self.detailed:
+            return {}
+        end_time = datetime.now(timezone.utc)
+        return {
+            "tracing": {
+                "version": 1,
+                "startTime": self.start_time.isoformat(),
+                "endTime": end_time.isoformat(),
+                "duration": duration,
+                "execution": {"resolvers": self.resolvers},
+            }
+        }
+
+
+def start_trace(request):
+    """
+    Trace for a request: detailed when it sends the tracing header, None
+    when tracing is disabled.
+    """
+    if not tracing_option("ENABLED", False):
+        return None
+    header = request.headers.get(tracing_option("HEADER", "X-GraphQL-Trace"), "")
+    return Trace(detailed=header.lower() in ("1", "true", "yes"))
+
+
+class TracingExecutionContext(ExecutionContext):
+    """
+    Times each root field, with everything resolved below it, and the SQL
+    it runs into the request's Trace.
+
+    Loaders resolve synchronously, so a root field's subtree accounts for
+    every query of the operation at the cost of one set of connection
+    wrappers per root field.
+    """
+
+    def execute_field(self, parent_type, source, field_nodes, path):
+        trace = getattr(self.context_value, "crm_trace", None)
+        if trace is None or path.prev is not None:
+            return super().execute_field(parent_type, source, field_nodes, path)
+        sql = SQLTimer()
+        start = time.perf_counter_ns()
+        try:
+            with timing_sql(sql):
+                return super().execute_field(parent_type, source, field_nodes, path)
+        finally:
+            field = f"{parent_type.name}.{field_nodes[0].name.value}"
+            trace.record_field(field, time.perf_counter_ns() - start, sql)
+
+
+class TracingMiddleware:
+    """
+    Times every resolver, and the SQL it runs, into detailed traces. Other
+    traces are left to TracingExecutionContext.
+    """
+
+    def resolve(self, next, root, info, **args):
+        trace = getattr(info.context, "crm_trace", None)
+        if trace is None or not trace.detailed:
+            return next(root, info, **args)
+
+        sql = SQLTimer()
+        start = time.perf_counter_ns()
+        try:
+            with timing_sql(sql):
+                return next(root, info, **args)
+        finally:
+            trace.record(info, start, time.perf_counter_ns() - start, sql)
+
+
+trace_stats = TraceStats(tracing_option("STATS_DIR"), tracing_option("FLUSH_INTERVAL", 10))
+atexit.register(trace_stats.flush)
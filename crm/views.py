@@ -1,3 +1,752 @@
-from django.shortcuts import render
+import asyncio
+import hashlib
+import json
+import math
+import time
+from inspect import isawaitable
 
-# Create your views here.
+from django.db import connection, transaction
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    HttpResponseNotAllowed,
+)
+from django.views.generic import View
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene.validation import depth_limit_validator
+from graphene_django.views import GraphQLView, HttpError, set_rollback
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    OperationType,
+    execute,
+    parse,
+    specified_rules,
+    validate,
+)
+from graphql.type import validate_schema
+from graphql.utilities import get_operation_ast
+
+from .conf import graphene_option
+from .cost import (
+    actual_cost,
+    cost_extensions,
+    cost_limit_validator,
+    cost_option,
+    get_fragments,
+    operation_key,
+    token_buckets,
+)
+from .documents import (
+    PersistedQueryError,
+    document_cache,
+    register_persisted_query,
+    resolve_persisted_query,
+)
+from .execution import ConcurrentExecutionContext, run_in_pool
+from .idempotency import (
+    CLAIMED,
+    DONE,
+    IN_PROGRESS,
+    IdempotencyConflict,
+    idempotency_option,
+    idempotency_store,
+)
+from .loaders import CRMLoaders
+from .metrics import metrics, metrics_option, render
+from .response_cache import document_tags, response_cache
+from .routers import (
+    is_sticky,
+    read_from_replica,
+    reading_from_replica,
+    replica_alias,
+    stick_to_primary,
+)
+from .tracing import TracingExecutionContext, start_trace
+
+
+class BatchEntryRequest:
+    """
+    Request seen by one operation of a batch.
+
+    Attributes set while executing the operation, such as its trace and
+    the mutation error flag, stay on the entry; everything else is read
+    from the shared request, including the loaders, which are created
+    there once so the whole batch shares them.
+    """
+
+    def __init__(self, request):
+        if getattr(request, "crm_loaders", None) is None:
+            request.crm_loaders = CRMLoaders()
+        self.request = request
+
+    def __getattr__(self, name):
+        return getattr(self.request, name)
+
+
+def operation_label(name):
+    """
+    Metric label for an operation name. Names past MAX_OPERATIONS share
+    "other" so arbitrary client names cannot grow the series without bound.
+    """
+    if not name:
+        return "anonymous"
+    if name not in known_operations:
+        if len(known_operations) >= metrics_option("MAX_OPERATIONS", 500):
+            return "other"
+        known_operations.add(name)
+    return name
+
+
+def cache_metrics():
+    counters = {
+        ("graphql_document_cache_hits_total", ()): document_cache.hits,
+        ("graphql_document_cache_misses_total", ()): document_cache.misses,
+    }
+    if response_cache is not None:
+        counters[("graphql_response_cache_hits_total", ())] = response_cache.hits
+        counters[("graphql_response_cache_misses_total", ())] = response_cache.misses
+    return counters
+
+
+known_operations = set()
+metrics.register_collector(cache_metrics)
+
+
+def metrics_view(request):
+    """
+    Prometheus metrics of every process sharing CRM_METRICS["DIR"].
+    """
+    token = metrics_option("TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render(metrics.collect()), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+class CRMGraphQLView(GraphQLView):
+    """
+    GraphQLView with automatic persisted queries, a cache of parsed and
+    validated documents, a tagged response cache for query operations,
+    query cost limits with per-client budgets, resolver tracing and
+    idempotency keys.
+    """
+
+    document_cache = document_cache
+    response_cache = response_cache
+    token_buckets = token_buckets
+    idempotency_store = idempotency_store
+    execution_context_class = TracingExecutionContext
+    max_cost = cost_option("MAX_COST")
+    validation_rules = (
+        (*specified_rules, depth_limit_validator(max_depth=cost_option("MAX_DEPTH")))
+        if cost_option("MAX_DEPTH")
+        else None
+    )
+
+    def dispatch(self, request, *args, **kwargs):
+        key = self.get_idempotency_key(request)
+        if key is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        deadline = time.monotonic() + idempotency_option("WAIT_TIMEOUT", 30)
+        try:
+            while (replay := self.claim_idempotency_key(key, fingerprint, deadline)) == IN_PROGRESS:
+                time.sleep(idempotency_option("POLL_INTERVAL", 0.05))
+        except HttpError as e:
+            return self.http_error_response(request, e)
+        if replay is not None:
+            return replay
+
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        except BaseException:
+            self.idempotency_store.release(key)
+            raise
+        self.store_idempotent_response(key, fingerprint, response)
+        return response
+
+    def parse_body(self, request):
+        """
+        Accept a JSON array of operations as well as a single operation.
+        Views are instantiated per request, so an array switches this
+        request to batch mode.
+        """
+        if self.get_content_type(request) != "application/json":
+            return super().parse_body(request)
+        try:
+            data = json.loads(request.body.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            raise HttpError(HttpResponseBadRequest("POST body sent invalid JSON."))
+
+        self.batch = isinstance(data, list)
+        if not self.batch:
+            if not isinstance(data, dict):
+                raise HttpError(
+                    HttpResponseBadRequest("The received data is not a valid JSON query.")
+                )
+            return data
+
+        max_size = graphene_option("MAX_BATCH_SIZE", 20)
+        if not data:
+            raise HttpError(HttpResponseBadRequest("Received an empty list in the batch request."))
+        if len(data) > max_size:
+            raise HttpError(
+                HttpResponseBadRequest(f"Batches are limited to {max_size} operations.")
+            )
+        if not all(isinstance(entry, dict) for entry in data):
+            raise HttpError(HttpResponseBadRequest("Every batch entry must be a JSON query."))
+        return data
+
+    def get_idempotency_key(self, request):
+        """
+        Idempotency key of a POST request, scoped to its client and user,
+        or None when it sent none.
+        """
+        if self.idempotency_store is None or request.method != "POST":
+            return None
+        key = request.headers.get(idempotency_option("HEADER", "Idempotency-Key"))
+        if not key:
+            return None
+        user = getattr(request, "user", None)
+        user_key = user.pk if user is not None and user.is_authenticated else None
+        return f"{self.get_client_name(request)}:{user_key}:{key}"
+
+    def claim_idempotency_key(self, key, fingerprint, deadline):
+        """
+        Return None when this request should run, the stored response when
+        an earlier one with the same key finished, or IN_PROGRESS while it
+        is still running and `deadline` has not passed.
+        """
+        try:
+            state, entry = self.idempotency_store.claim(key, fingerprint)
+        except IdempotencyConflict:
+            raise HttpError(
+                HttpResponse(status=422),
+                "Idempotency key was already used for a different request.",
+            )
+        if state == CLAIMED:
+            return None
+        if state == DONE:
+            response = HttpResponse(
+                entry["content"], status=entry["status"], content_type=entry["content_type"]
+            )
+            response["Idempotent-Replayed"] = "true"
+            return response
+        if time.monotonic() >= deadline:
+            raise HttpError(
+                HttpResponse(status=409),
+                "A request with this idempotency key is still in progress.",
+            )
+        return IN_PROGRESS
+
+    def store_idempotent_response(self, key, fingerprint, response):
+        # only complete responses are replayed; after errors such as a
+        # 429 the client may retry with the same key
+        if response.status_code == 200:
+            self.idempotency_store.finish(key, fingerprint, response)
+        else:
+            self.idempotency_store.release(key)
+
+    def http_error_response(self, request, error):
+        response = error.response
+        response["Content-Type"] = "application/json"
+        response.content = self.json_encode(request, {"errors": [self.format_error(error)]})
+        return response
+
+    def get_response_cache_key(
+        self, request, key, document, operation_ast, operation_name, variables
+    ):
+        """
+        Return the response cache key for a cacheable query, else None.
+        """
+        if (
+            self.response_cache is None
+            or operation_ast is None
+            or operation_ast.operation != OperationType.QUERY
+            or not self.response_cache.get_timeout(operation_ast, get_fragments(document))
+        ):
+            return None
+        user = getattr(request, "user", None)
+        user_key = user.pk if user is not None and user.is_authenticated else None
+        return self.response_cache.make_key(key, operation_name, variables, user_key)
+
+    def get_document(self, query, key):
+        """
+        Return `(document, errors)` for `query`, parsing and validating it
+        only on a cache miss. Documents with errors are not cached.
+        """
+        document = self.document_cache.get(key)
+        if document is not None:
+            return document, None
+
+        try:
+            document = parse(query)
+        except Exception as e:
+            return None, [e]
+
+        validation_errors = validate(
+            self.schema.graphql_schema,
+            document,
+            self.validation_rules,
+            graphene_settings.MAX_VALIDATION_ERRORS,
+        )
+        if validation_errors:
+            return None, validation_errors
+
+        self.document_cache.set(key, document)
+        return document, None
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        try:
+            extensions = request.GET.get("extensions") or data.get("extensions")
+            query, key, register = resolve_persisted_query(query, extensions)
+        except PersistedQueryError as e:
+            return ExecutionResult(errors=[GraphQLError(str(e), extensions={"code": e.code})])
+        except ValueError:
+            raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        document, errors = self.get_document(query, key)
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        cost, errors = self.check_cost(document, operation_ast, variables)
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+        if register:
+            register_persisted_query(key, query)
+
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+
+            cache_key = self.get_response_cache_key(
+                request, key, document, operation_ast, operation_name, variables
+            )
+            tag_versions = None
+            if cache_key is not None:
+                data, tag_versions, recently_invalidated = self.response_cache.get(
+                    cache_key, document_tags(schema, document)
+                )
+                if data is not None:
+                    return ExecutionResult(data=data, extensions=cost_extensions(cost, 0))
+                if recently_invalidated and reading_from_replica():
+                    # the replica may still lack the write that bumped the
+                    # versions; a result read from it must not be stored
+                    cache_key = None
+
+            client = self.charge_budget(request, cost)
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return self.complete_response(
+                    request, result, None, None, document, operation_ast, cost, client
+                )
+
+            result = execute(schema, document, **execute_options)
+            if isawaitable(result):
+                return self.complete_response_async(
+                    result, request, cache_key, tag_versions, document, operation_ast, cost, client
+                )
+            return self.complete_response(
+                request, result, cache_key, tag_versions, document, operation_ast, cost, client
+            )
+        except HttpError:
+            raise
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    def check_cost(self, document, operation_ast, variables):
+        """
+        Return `(estimated cost, errors)` for the selected operation, with
+        `first`, `last` and `limit` variables taken from this request.
+        """
+        if operation_ast is None:
+            return 0, None
+        costs = {}
+        errors = validate(
+            self.schema.graphql_schema,
+            document,
+            [cost_limit_validator(self.max_cost, variables, costs.update)],
+        )
+        errors = [e for e in errors if operation_ast in (e.nodes or [])]
+        return costs.get(operation_key(operation_ast), 0), errors or None
+
+    def get_context(self, request):
+        request.crm_trace = start_trace(request)
+        return request
+
+    def get_client_name(self, request):
+        """
+        Client named in the client header when it has a budget of its own,
+        else the remote address under the default budget.
+        """
+        name = request.headers.get(cost_option("CLIENT_HEADER", "X-GraphQL-Client"))
+        if name and self.token_buckets is not None and name in self.token_buckets.budgets:
+            return name
+        return "ip:" + request.META.get("REMOTE_ADDR", "unknown")
+
+    def charge_budget(self, request, cost):
+        """
+        Take the estimated cost from the client's token bucket, answering
+        429 once it is exhausted. Returns the client charged, if any.
+        """
+        if self.token_buckets is None or cost <= 0:
+            return None
+        client = self.get_client_name(request)
+        allowed, remaining, retry_after = self.token_buckets.consume(client, cost)
+        if not allowed:
+            response = HttpResponse(status=429)
+            if retry_after is not None:
+                response["Retry-After"] = str(math.ceil(retry_after))
+            raise HttpError(response, f"Query budget exhausted for client '{client}'.")
+        return client
+
+    def complete_response(
+        self, request, result, cache_key, tag_versions, document, operation_ast, cost, client
+    ):
+        """
+        Cache the result under the tag versions read before it was
+        computed, refund the client the part of the estimate the
+        result did not use and report both costs, and the trace when one
+        was asked for, in `extensions`.
+        """
+        schema = self.schema.graphql_schema
+        if cache_key is not None and not result.errors:
+            self.response_cache.set(
+                cache_key,
+                result.data,
+                tag_versions,
+                self.response_cache.get_timeout(operation_ast, get_fragments(document)),
+            )
+        actual = 0
+        if operation_ast is not None:
+            actual = actual_cost(
+                schema,
+                operation_ast.selection_set,
+                schema.get_root_type(operation_ast.operation),
+                get_fragments(document),
+                result.data,
+            )
+        if client is not None:
+            self.token_buckets.refund(client, cost - actual)
+        if operation_ast is not None and operation_ast.operation == OperationType.MUTATION:
+            self.reset_loaders(request)
+            stick_to_primary(self.get_client_name(request))
+        result.extensions = dict(result.extensions or {}, **cost_extensions(cost, actual))
+        trace = getattr(request, "crm_trace", None)
+        if trace is not None:
+            name = operation_key(operation_ast) if operation_ast is not None else "anonymous"
+            result.extensions.update(trace.finish(name))
+        return result
+
+    async def complete_response_async(self, result, request, *args):
+        try:
+            result = await result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+        return await run_in_pool(self.complete_response, request, result, *args)
+
+    def reset_loaders(self, request):
+        # later operations of a batch must not read what loaders cached
+        # before the mutation
+        shared = request.request if isinstance(request, BatchEntryRequest) else request
+        if getattr(shared, "crm_loaders", None) is not None:
+            shared.crm_loaders = CRMLoaders()
+
+    def get_operation_type(self, request, data):
+        """
+        Operation type of a batch entry, or None when it cannot be told
+        without executing it (invalid documents, unknown persisted queries).
+        """
+        try:
+            query, variables, operation_name, id = self.get_graphql_params(request, data)
+            extensions = request.GET.get("extensions") or data.get("extensions")
+            query, key, _ = resolve_persisted_query(query, extensions)
+            if not query:
+                return None
+            document, errors = self.get_document(query, key)
+        except (HttpError, PersistedQueryError, ValueError):
+            return None
+        if errors:
+            return None
+        operation_ast = get_operation_ast(document, operation_name)
+        return operation_ast.operation if operation_ast is not None else None
+
+    def get_response(self, request, data, show_graphiql=False):
+        """
+        GraphQLView.get_response, also returning the result's `extensions`.
+
+        Each operation of a batch runs with its own BatchEntryRequest and
+        gets HTTP errors, such as an exhausted budget, in its own entry
+        instead of failing the whole batch.
+        """
+        if not self.batch:
+            return self.get_operation_response(request, data, show_graphiql)
+        entry_request = BatchEntryRequest(request)
+        try:
+            return self.get_operation_response(entry_request, data)
+        except HttpError as e:
+            return self.encode_batch_error(entry_request, data, e)
+
+    def encode_batch_error(self, request, data, error):
+        status_code = error.response.status_code
+        response = {
+            "errors": [self.format_error(error)],
+            "id": data.get("id"),
+            "status": status_code,
+        }
+        return self.json_encode(request, response), status_code
+
+    def reads_from_replica(self, request, data):
+        """
+        Whether the operation's reads may go to the replica: it is a query
+        and its client has not run a mutation in the last STICKY_SECONDS.
+        """
+        return (
+            replica_alias() is not None
+            and self.get_operation_type(request, data) == OperationType.QUERY
+            and not is_sticky(self.get_client_name(request))
+        )
+
+    def get_operation_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        start = time.perf_counter()
+        with read_from_replica(self.reads_from_replica(request, data)):
+            execution_result = self.execute_graphql_request(
+                request, data, query, variables, operation_name, show_graphiql
+            )
+
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        if not execution_result:
+            return None, 200
+        self.record_metrics(request, operation_name, execution_result, time.perf_counter() - start)
+        if execution_result.errors:
+            set_rollback()
+        return self.encode_result(request, execution_result, id, pretty=show_graphiql)
+
+    def record_metrics(self, request, operation_name, execution_result, duration):
+        labels = (("operation", operation_label(operation_name)),)
+        metrics.observe("graphql_request_duration_seconds", labels, duration)
+        metrics.inc("graphql_requests_total", labels)
+        if execution_result.errors:
+            metrics.inc("graphql_errors_total", labels, len(execution_result.errors))
+        trace = getattr(request, "crm_trace", None)
+        if trace is not None and trace.sql_count:
+            metrics.inc("graphql_sql_queries_total", labels, trace.sql_count)
+
+    def encode_result(self, request, execution_result, id, pretty=False):
+        status_code = 200
+        response = {}
+
+        if execution_result.errors:
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+
+        if execution_result.errors and any(
+            not getattr(e, "path", None) for e in execution_result.errors
+        ):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+
+        if execution_result.extensions:
+            response["extensions"] = execution_result.extensions
+
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+
+        return self.json_encode(request, response, pretty=pretty), status_code
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """
+    CRMGraphQLView for ASGI deployments.
+
+    Requests are handled on the event loop and query root fields resolve
+    concurrently in the bounded resolver pool (see `crm.execution`), so a
+    slow query no longer holds a worker for its whole duration. Parsing,
+    validation and cache lookups run in the pool as well; mutations run
+    there serially, inside ATOMIC_MUTATIONS transactions as before.
+    """
+
+    execution_context_class = ConcurrentExecutionContext
+
+    def dispatch(self, request, *args, **kwargs):
+        return View.dispatch(self, request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        return await self.dispatch_async(request)
+
+    async def post(self, request, *args, **kwargs):
+        return await self.dispatch_async(request)
+
+    async def http_method_not_allowed(self, request, *args, **kwargs):
+        response = HttpResponseNotAllowed(
+            ["GET", "POST"], "GraphQL only supports GET and POST requests."
+        )
+        response["Content-Type"] = "application/json"
+        response.content = self.json_encode(
+            request, {"errors": [self.format_error(HttpError(response))]}
+        )
+        return response
+
+    def get_context(self, request):
+        # created up front: root fields share the loaders from several threads
+        if getattr(request, "crm_loaders", None) is None:
+            request.crm_loaders = CRMLoaders()
+        return super().get_context(request)
+
+    async def dispatch_async(self, request):
+        key = await run_in_pool(self.get_idempotency_key, request)
+        if key is None:
+            return await self.respond_async(request)
+
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        deadline = time.monotonic() + idempotency_option("WAIT_TIMEOUT", 30)
+        try:
+            while (
+                replay := await run_in_pool(
+                    self.claim_idempotency_key, key, fingerprint, deadline
+                )
+            ) == IN_PROGRESS:
+                await asyncio.sleep(idempotency_option("POLL_INTERVAL", 0.05))
+        except HttpError as e:
+            return self.http_error_response(request, e)
+        if replay is not None:
+            return replay
+
+        try:
+            response = await self.respond_async(request)
+        except BaseException:
+            await run_in_pool(self.idempotency_store.release, key)
+            raise
+        await run_in_pool(self.store_idempotent_response, key, fingerprint, response)
+        return response
+
+    async def respond_async(self, request):
+        try:
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return await run_in_pool(GraphQLView.dispatch, self, request)
+
+            if self.batch:
+                responses = await self.get_batch_responses_async(request, data)
+                result = "[{}]".format(",".join([response[0] for response in responses]))
+                status_code = (
+                    responses and max(responses, key=lambda response: response[1])[1] or 200
+                )
+            else:
+                result, status_code = await self.get_response_async(request, data)
+
+            return HttpResponse(status=status_code, content=result, content_type="application/json")
+
+        except HttpError as e:
+            return self.http_error_response(request, e)
+
+    async def get_batch_responses_async(self, request, data):
+        """
+        Responses for a batch, in order. Consecutive query operations run
+        concurrently; mutations, and entries whose type cannot be told,
+        run alone, after everything before them.
+        """
+        request.crm_loaders = CRMLoaders()
+        types = await asyncio.gather(
+            *[run_in_pool(self.get_operation_type, request, entry) for entry in data]
+        )
+        responses, reads = [], []
+        for entry, operation_type in zip(data, types):
+            if operation_type == OperationType.QUERY:
+                reads.append(self.get_response_async(request, entry))
+                continue
+            responses.extend(await asyncio.gather(*reads))
+            reads = []
+            responses.append(await self.get_response_async(request, entry))
+        responses.extend(await asyncio.gather(*reads))
+        return responses
+
+    async def get_response_async(self, request, data):
+        """
+        Async counterpart of `get_response`.
+        """
+        if not self.batch:
+            return await self.get_operation_response_async(request, data)
+        entry_request = BatchEntryRequest(request)
+        try:
+            return await self.get_operation_response_async(entry_request, data)
+        except HttpError as e:
+            return self.encode_batch_error(entry_request, data, e)
+
+    async def get_operation_response_async(self, request, data):
+        """
+        Async counterpart of `get_operation_response`. ATOMIC_REQUESTS
+        does not apply to async views, so there is no request rollback.
+        """
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        start = time.perf_counter()
+        # the resolver pool calls awaited below inherit the routing
+        with read_from_replica(await run_in_pool(self.reads_from_replica, request, data)):
+            execution_result = await run_in_pool(
+                self.execute_graphql_request, request, data, query, variables, operation_name
+            )
+            if isawaitable(execution_result):
+                execution_result = await execution_result
+        self.record_metrics(request, operation_name, execution_result, time.perf_counter() - start)
+        return self.encode_result(request, execution_result, id)